@@ -1,17 +1,181 @@
-from flask import Flask, render_template, request, redirect, url_for, flash
+import base64
+import hashlib
+import hmac
+import json
+import os
+import random
+import time
+
+from datetime import date, timedelta
+
+from flask import Blueprint, Flask, current_app, render_template, request, redirect, url_for, flash, session, Response, abort, g, make_response
 from flask_login import LoginManager, login_user, login_required, logout_user, UserMixin, current_user
-from werkzeug.security import generate_password_hash, check_password_hash
-from sqlalchemy import text
-from database import Session
+from database import DATABASE_URL, obter_sessao, init_app, repositorio
+from database.repositorio import ORDENACOES_LIVROS
+from database.cache import referencias, sugestoes, usuarios, versoes, descartar_apos_commit, marcar_alteracao
+from database.carga import seed
+from database.migracoes import db_cli
+from database.importacao import importar, importar_livros, abrir_leitor
+from database.exportacao import EXPORTACOES, gerar_exportacao
+from database.replicas import obter_roteador, em_replica, replicas_cli
+from database.tarefas import atrasos, configurar_agendador
+from database.auditoria import auditoria_cli, auditar, configurar_auditoria
+from database.metricas import metricas
+from database.contadores import contadores, contadores_cli
+from database.paralelo import consultar_em_paralelo
+from database.senhas import gerar_hash, verificar_hash, precisa_atualizar, SobrecargaSenhas
 from sqlalchemy.exc import OperationalError, IntegrityError, DBAPIError
 
 
-app = Flask(__name__)
-app.secret_key = "segredo_muito_seguro"
+# As rotas ficam no blueprint; create_app monta a aplicação (ver o final do arquivo)
+bp = Blueprint('biblioteca', __name__)
+
+# Usuários ficam em cache por ID; rotas que alterarem nome ou e-mail devem chamar
+# invalidar_tabelas(db, 'Usuarios'). Com LOGIN_SEM_ESTADO=1 o usuário é montado a partir dos
+# dados assinados no cookie de sessão, válidos enquanto a versão de Usuarios não mudar.
+# Configuração do Flask-Login; init_app em create_app
+login_manager = LoginManager()
+login_manager.login_view = 'biblioteca.login'
+
+
+# Instrumentação: os hooks do engine somam consultas e tempo de SQL em g; aqui a requisição
+# é medida, o resumo vai no cabeçalho Server-Timing e os totais para /metrics.
+@bp.before_app_request
+def iniciar_medicao():
+    g.inicio_requisicao = time.perf_counter()
+    g.consultas_sql = 0
+    g.tempo_sql = 0.0
+
+
+@bp.after_app_request
+def registrar_medicao(resposta):
+    inicio = g.pop('inicio_requisicao', None)
+    if inicio is None:
+        return resposta
+    duracao = time.perf_counter() - inicio
+    consultas = g.get('consultas_sql', 0)
+    tempo_sql = g.get('tempo_sql', 0.0)
+
+    resposta.headers.add('Server-Timing', f'db;dur={tempo_sql * 1000:.1f};desc="{consultas} consultas"')
+    resposta.headers.add('Server-Timing', f'app;dur={duracao * 1000:.1f}')
+    if request.endpoint != 'biblioteca.metricas_prometheus':
+        # Rótulo sem o nome do blueprint, o mesmo de antes da fábrica de aplicação
+        rota = request.endpoint and request.endpoint.rpartition('.')[2]
+        metricas.registrar(rota, request.method, resposta.status_code, duracao, consultas, tempo_sql)
+    return resposta
+
+
+# Com METRICAS_TOKEN, /metrics exige o cabeçalho `Authorization: Bearer <token>`; sem ele, só
+# responde a pedidos da própria máquina
+ENDERECOS_LOCAIS = ('127.0.0.1', '::1')
+
+
+@bp.route('/metrics')
+def metricas_prometheus():
+    token = current_app.config['METRICAS_TOKEN']
+    if token:
+        esquema, _, enviado = request.headers.get('Authorization', '').partition(' ')
+        if esquema.lower() != 'bearer' or not hmac.compare_digest(enviado.strip().encode(), token.encode()):
+            return Response("Token inválido.\n", 401, {'WWW-Authenticate': 'Bearer'}, mimetype='text/plain')
+    elif request.remote_addr not in ENDERECOS_LOCAIS:
+        abort(403)
+    return Response(metricas.exportar(), mimetype='text/plain; version=0.0.4')
+
+
+# Cache HTTP das páginas de listas: o ETag (fraco) combina as versões das tabelas exibidas
+# (Versoes_tabela), o usuário, a URL e a assinatura dos templates. Se o navegador já tem a
+# página, a resposta é 304 sem consultar as listas nem renderizar o template.
+def assinatura_arquivos(*pastas):
+    resumo = hashlib.sha1()
+    for pasta in pastas:
+        for raiz, _, arquivos in sorted(os.walk(pasta)):
+            for nome in sorted(arquivos):
+                with open(os.path.join(raiz, nome), 'rb') as arquivo:
+                    resumo.update(arquivo.read())
+    return resumo.hexdigest()[:12]
+
+
+# Calculada no primeiro ETag de cada aplicação e guardada em app.extensions: importar o módulo
+# ou criar a aplicação não lê os arquivos
+def assinatura_paginas():
+    assinatura = current_app.extensions.get('assinatura_paginas')
+    if assinatura is None:
+        assinatura = assinatura_arquivos(os.path.join(current_app.root_path, current_app.template_folder),
+                                         current_app.static_folder)
+        current_app.extensions['assinatura_paginas'] = assinatura
+    return assinatura
+
+
+def etag_pagina(db, *tabelas):
+    # Mensagens flash pendentes fazem parte da página: precisa renderizar
+    if session.get('_flashes'):
+        return None
+    return etag_versoes(db, *tabelas)
+
+
+def etag_versoes(db, *tabelas):
+    # Numa réplica, a versão vem da própria réplica: a versão compartilhada pode ser mais
+    # nova que os dados dela, e a página antiga ficaria guardada com o ETag novo
+    atuais = versoes.ler(db) if em_replica(db) else versoes.atuais(db)
+    partes = [assinatura_paginas(), str(current_user.id), request.full_path]
+    partes += [f"{tabela}:{atuais.get(tabela, 0)}" for tabela in tabelas]
+    return hashlib.sha1("|".join(partes).encode()).hexdigest()
+
+
+def cabecalhos_cache_pagina(resposta, etag):
+    if etag:
+        resposta.set_etag(etag, weak=True)
+        # Revalida a cada acesso; a página é de um usuário só
+        resposta.headers['Cache-Control'] = 'private, no-cache'
+        resposta.vary.add('Cookie')
+    return resposta
+
+
+def pagina_nao_modificada(etag):
+    if etag and request.if_none_match.contains_weak(etag):
+        return cabecalhos_cache_pagina(Response(status=304), etag)
+    return None
+
+
+def renderizar_com_etag(etag, template, **contexto):
+    return cabecalhos_cache_pagina(make_response(render_template(template, **contexto)), etag)
+
 
-# Configuração do Flask-Login
-login_manager = LoginManager(app)
-login_manager.login_view = 'login'
+# Arquivos estáticos recebem ?v=<hash do conteúdo> no url_for; com o hash correto, a
+# resposta pode ficar em cache por um ano, pois qualquer alteração muda a URL.
+CACHE_ESTATICOS_SEGUNDOS = 365 * 24 * 3600
+_hashes_estaticos = {}
+
+
+def hash_estatico(nome):
+    caminho = os.path.join(current_app.static_folder, nome)
+    try:
+        modificado = os.path.getmtime(caminho)
+    except OSError:
+        return None
+    guardado = _hashes_estaticos.get(nome)
+    if guardado is None or guardado[0] != modificado:
+        with open(caminho, 'rb') as arquivo:
+            guardado = (modificado, hashlib.sha1(arquivo.read()).hexdigest()[:12])
+        _hashes_estaticos[nome] = guardado
+    return guardado[1]
+
+
+@bp.app_url_defaults
+def versionar_estaticos(endpoint, valores):
+    if endpoint == 'static' and 'filename' in valores and 'v' not in valores:
+        versao = hash_estatico(valores['filename'])
+        if versao:
+            valores['v'] = versao
+
+
+@bp.after_app_request
+def cache_estaticos(resposta):
+    if request.endpoint == 'static' and resposta.status_code in (200, 304):
+        versao = request.args.get('v')
+        if versao and versao == hash_estatico(request.view_args.get('filename', '')):
+            resposta.headers['Cache-Control'] = f'public, max-age={CACHE_ESTATICOS_SEGUNDOS}, immutable'
+    return resposta
 
 
 # Classe compatível com Flask-Login
@@ -22,55 +186,79 @@ class User(UserMixin):
         self.email = email
 
 
+def buscar_usuario(db, user_id):
+    result = repositorio.buscar_usuario(db, user_id)
+
+    if result:
+        return User(id=result.ID_usuario, nome=result.Nome_usuario, email=result.Email)
+    return None
+
+
+def guardar_claims_usuario(db, user):
+    session['usuario'] = {
+        "id": user.id,
+        "nome": user.nome,
+        "email": user.email,
+        "versao": versoes.versao(db, 'Usuarios'),
+        "emitido_em": int(time.time()),
+    }
+
+
 @login_manager.user_loader
 def load_user(user_id):
-    db = Session()
     try:
-        query = text("SELECT ID_usuario, Nome_usuario, Email FROM Usuarios WHERE ID_usuario = :id")
-        result = db.execute(query, {"id": user_id}).fetchone()
-        
-        if result:
-            return User(id=result.ID_usuario, nome=result.Nome_usuario, email=result.Email)
+        user_id = int(user_id)
+    except ValueError:
         return None
-    finally:
-        db.close()
+
+    db = obter_sessao()
+
+    if current_app.config['LOGIN_SEM_ESTADO']:
+        claims = session.get('usuario')
+        if (claims and claims.get('id') == user_id
+                and claims.get('versao') == versoes.versao(db, 'Usuarios')
+                and time.time() - claims.get('emitido_em', 0) < current_app.config['LOGIN_CLAIMS_MAX_IDADE']):
+            return User(id=claims['id'], nome=claims['nome'], email=claims['email'])
+
+    user = usuarios.obter(db, 'Usuarios', user_id, lambda db: buscar_usuario(db, user_id))
+    if user is not None and current_app.config['LOGIN_SEM_ESTADO']:
+        guardar_claims_usuario(db, user)
+    return user
 
 
 
-@app.route('/')
+# Fila de hash de senha cheia: o cliente deve tentar de novo em instantes
+@bp.app_errorhandler(SobrecargaSenhas)
+def senhas_sobrecarregadas(erro):
+    return ("Muitos acessos simultâneos. Tente novamente em alguns segundos.", 503, {"Retry-After": "2"})
+
+
+@bp.route('/')
 def index():
     return render_template('index.html')
 
 
 
-@app.route('/cadastro', methods=['GET', 'POST'])
+@bp.route('/cadastro', methods=['GET', 'POST'])
 def cadastro():
     if request.method == 'POST':
         nome = request.form['nome']
         email = request.form['email']
         senha = request.form['senha']
 
-        db = Session()
+        db = obter_sessao()
         try:
-            verificar = db.execute(
-                text("SELECT * FROM Usuarios WHERE Email = :email"), 
-                {"email": email}
-            ).fetchone()
-
-            if verificar:
+            if repositorio.email_cadastrado(db, email):
                 flash('E-mail já cadastrado!')
-                return redirect(url_for('cadastro'))
-
-            hashed = generate_password_hash(senha)
-            inserir = text("""
-                INSERT INTO Usuarios (Nome_usuario, Email, Senha, Data_inscricao, Multa_atual)
-                VALUES (:nome, :email, :senha, CURDATE(), 0)
-            """)
-            db.execute(inserir, {"nome": nome, "email": email, "senha": hashed})
+                return redirect(url_for('biblioteca.cadastro'))
+
+            hashed = gerar_hash(senha)
+            usuario_id = repositorio.inserir_usuario(db, nome, email, hashed)
+            auditar(db, 'usuarios', 'INSERT', usuario_id, valor_novo=f"nome: {nome} | email: {email}")
             db.commit()
 
             flash('Usuário cadastrado com sucesso!')
-            return redirect(url_for('login'))
+            return redirect(url_for('biblioteca.login'))
         
         except DBAPIError as e:
             erro_mysql = str(e.orig).split(",")[-1].replace("'", "").strip()
@@ -80,125 +268,287 @@ def cadastro():
     return render_template('cadastro.html')
 
 
-@app.route('/login', methods=['GET', 'POST'])
+@bp.route('/login', methods=['GET', 'POST'])
 def login():
     if request.method == 'POST':
         email = request.form['email']
         senha = request.form['senha']
 
-        db = Session()
-        try:
-            query = text("""
-                SELECT ID_usuario, Nome_usuario, Email, Senha
-                FROM Usuarios
-                WHERE Email = :email
-            """)
-            user = db.execute(query, {"email": email}).fetchone()
-
-            if not user:
-                flash("E-mail não encontrado.")
-                return redirect(url_for('login'))
-
-            if not check_password_hash(user.Senha, senha):
-                flash("Senha incorreta.")
-                return redirect(url_for('login'))
-
-            login_user(User(user.ID_usuario, user.Nome_usuario, user.Email))
-            flash(f"Bem-vindo(a), {user.Nome_usuario}!")
-            return redirect(url_for('dashboard'))
-        finally:
-            db.close()
+        db = obter_sessao()
+        user = repositorio.buscar_usuario_por_email(db, email)
+
+        if not user:
+            flash("E-mail não encontrado.")
+            return redirect(url_for('biblioteca.login'))
+
+        if not verificar_hash(user.Senha, senha):
+            flash("Senha incorreta.")
+            return redirect(url_for('biblioteca.login'))
+
+        # Hash antigo (outro método ou custo): grava de novo com os parâmetros atuais
+        if precisa_atualizar(user.Senha):
+            try:
+                repositorio.atualizar_senha(db, user.ID_usuario, gerar_hash(senha))
+                auditar(db, 'usuarios', 'UPDATE', user.ID_usuario, valor_novo="senha: hash atualizado")
+                db.commit()
+            except SobrecargaSenhas:
+                pass
+
+        usuario = User(user.ID_usuario, user.Nome_usuario, user.Email)
+        login_user(usuario)
+        if current_app.config['LOGIN_SEM_ESTADO']:
+            guardar_claims_usuario(db, usuario)
+        flash(f"Bem-vindo(a), {user.Nome_usuario}!")
+        return redirect(url_for('biblioteca.dashboard'))
 
     return render_template('login.html')
 
 
-@app.route('/logout')   
+@bp.route('/logout')   
 @login_required
 def logout():
     logout_user()
+    session.pop('usuario', None)
     flash('Logout realizado com sucesso!')
-    return redirect(url_for('index'))
+    return redirect(url_for('biblioteca.index'))
 
 
 
-def inserir_livros_padrao():
-    db = Session()
+# Listas de referência compartilhadas pelos formulários; ficam em cache até uma escrita na tabela
+def listar_autores(db):
+    return referencias.obter(db, 'Autores', 'lista', repositorio.listar_autores)
+
+
+def listar_generos(db):
+    return referencias.obter(db, 'Generos', 'lista', repositorio.listar_generos)
+
+
+def listar_editoras(db):
+    return referencias.obter(db, 'Editoras', 'lista', repositorio.listar_editoras)
+
+
+# Seletores de autor, gênero e editora dos formulários: as sugestões chegam por /api/<tipo>
+# conforme o usuário digita, e a página leva só o nome do item já escolhido
+TABELAS_REFERENCIAS = {'autores': 'Autores', 'generos': 'Generos', 'editoras': 'Editoras'}
+SUGESTOES_POR_PEDIDO = 10
+SUGESTOES_MAXIMO = 50
+TAMANHO_MAXIMO_PREFIXO = 100
+# Segundos em que o navegador reaproveita as sugestões de um mesmo prefixo sem perguntar
+SUGESTOES_MAX_AGE = 10
+
+
+def nome_referencia(db, tipo, referencia_id):
+    if referencia_id is None:
+        return None
+    return sugestoes.obter(db, TABELAS_REFERENCIAS[tipo], ('nome', referencia_id),
+                           lambda db: repositorio.nome_referencia(db, tipo, referencia_id))
+
+
+def cabecalhos_cache_sugestoes(resposta, etag):
+    cabecalhos_cache_pagina(resposta, etag)
+    resposta.headers['Cache-Control'] = f'private, max-age={SUGESTOES_MAX_AGE}'
+    return resposta
+
+
+# Sugestões por prefixo do nome: {"itens": [{"id": ..., "nome": ...}]}, em ordem alfabética.
+# Ficam em cache no processo até a tabela mudar (Versoes_tabela) e, por alguns segundos,
+# no navegador.
+@bp.route('/api/<any(autores, generos, editoras):tipo>')
+@login_required
+def sugestoes_referencias(tipo):
+    prefixo = request.args.get('q', '').strip()[:TAMANHO_MAXIMO_PREFIXO]
+    limite = min(max(request.args.get('limite', SUGESTOES_POR_PEDIDO, type=int), 1), SUGESTOES_MAXIMO)
+    tabela = TABELAS_REFERENCIAS[tipo]
+
+    db = obter_sessao()
+    etag = etag_versoes(db, tabela)
+    if request.if_none_match.contains_weak(etag):
+        return cabecalhos_cache_sugestoes(Response(status=304), etag)
+
+    itens = sugestoes.obter(db, tabela, (prefixo, limite),
+                            lambda db: repositorio.sugerir_referencias(db, tipo, prefixo, limite))
+    resposta = make_response({"itens": [{"id": item.id, "nome": item.nome} for item in itens]})
+    return cabecalhos_cache_sugestoes(resposta, etag)
+
+
+LIVROS_POR_PAGINA = 20
+
+
+def codificar_cursor(valores):
+    dados = json.dumps(list(valores), separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(dados).decode('ascii').rstrip('=')
+
+
+# Cursor adulterado ou de outra ordenação: None, e a listagem volta à primeira página. Cada
+# valor precisa ter o tipo da sua coluna em Livros (str para Titulo, int para ID_livro, a última
+# da chave); None só em coluna que aceita nulo.
+def decodificar_cursor(cursor, colunas):
     try:
-        qtd = db.execute(text("SELECT COUNT(*) AS total FROM Livros")).fetchone().total
-        if qtd == 0:
-            livros_padrao = [
-                ("Dom Casmurro", "9788535914849", 1899, 2, "Romance clássico de Machado de Assis."),
-                ("1984", "9780451524935", 1949, 1, "Distopia política de George Orwell."),
-                ("O Pequeno Príncipe", "9788522005233", 1943, 1, "Obra filosófica de Antoine de Saint-Exupéry."),
-                ("O Alquimista", "9780061122415", 1988, 2, "Romance espiritual de Paulo Coelho."),
-                ("Capitães da Areia", "9788520921313", 1937, 1, "Clássico social de Jorge Amado.")
-            ]
-            for titulo, isbn, ano, qtd_livro, resumo in livros_padrao:
-                db.execute(text("""
-                    INSERT INTO Livros (Titulo, ISBN, Ano_publicacao, Quantidade_disponivel, Resumo)
-                    VALUES (:titulo, :isbn, :ano, :qtd, :resumo)
-                """), {"titulo": titulo, "isbn": isbn, "ano": ano, "qtd": qtd_livro, "resumo": resumo})
-            db.commit()
-    finally:
-        db.close()
+        dados = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        valores = json.loads(dados)
+    except ValueError:
+        return None
+    if not isinstance(valores, list) or len(valores) != len(colunas):
+        return None
+    for valor, nome in zip(valores, colunas):
+        coluna = repositorio.livros.c[nome]
+        if valor is None:
+            if not coluna.nullable:
+                return None
+        elif isinstance(valor, bool) or not isinstance(valor, coluna.type.python_type):
+            return None
+    return valores
+
+
+# Busca uma página do catálogo por keyset (cursor), sem OFFSET: o custo não cresce com o catálogo.
+# Retorna (livros, cursor_anterior, cursor_proximo); os cursores são None quando não há página naquela direção.
+def buscar_pagina_livros(db, ordem, filtros, cursor=None, voltar=False, por_pagina=LIVROS_POR_PAGINA):
+    colunas, descendente = ORDENACOES_LIVROS[ordem]
+    ativos = {nome: valor for nome, valor in filtros.items() if valor}
+
+    # Para voltar uma página, percorre o índice no sentido inverso e desfaz a inversão depois
+    decrescente = descendente != voltar
+    valores = decodificar_cursor(cursor, colunas) if cursor else None
+
+    livros = repositorio.pagina_livros(db, ordem, ativos, valores, decrescente, por_pagina + 1)
+
+    ha_mais = len(livros) > por_pagina
+    livros = livros[:por_pagina]
+    if voltar:
+        livros.reverse()
+
+    if not livros:
+        return livros, None, None
+
+    def chave(livro):
+        return codificar_cursor(getattr(livro, coluna) for coluna in colunas)
+
+    tem_anterior = ha_mais if voltar else valores is not None
+    tem_proximo = valores is not None if voltar else ha_mais
 
+    cursor_anterior = chave(livros[0]) if tem_anterior else None
+    cursor_proximo = chave(livros[-1]) if tem_proximo else None
+    return livros, cursor_anterior, cursor_proximo
 
 
-@app.route('/dashboard')
+@bp.route('/dashboard')
 @login_required
 def dashboard():
-    inserir_livros_padrao()
+    ordem = request.args.get('ordem', 'titulo')
+    if ordem not in ORDENACOES_LIVROS:
+        ordem = 'titulo'
+
+    filtros = {
+        'genero': request.args.get('genero', type=int),
+        'autor': request.args.get('autor', type=int),
+        'editora': request.args.get('editora', type=int),
+        'disponiveis': request.args.get('disponiveis') == '1',
+    }
+
+    cursor = request.args.get('antes') or request.args.get('apos')
+    voltar = bool(request.args.get('antes'))
+
+    db = obter_sessao()
+    etag = etag_pagina(db, 'Livros', 'Emprestimos', 'Autores', 'Generos', 'Editoras', 'Usuarios')
+    nao_modificada = pagina_nao_modificada(etag)
+    if nao_modificada:
+        return nao_modificada
+
+    # As leituras são independentes: rodam ao mesmo tempo, cada uma com sua conexão
+    usuario_id = current_user.id
+    dados = consultar_em_paralelo(db, {
+        'livros': lambda db: buscar_pagina_livros(db, ordem, filtros, cursor=cursor, voltar=voltar),
+        'emprestimos': lambda db: repositorio.emprestimos_do_usuario(db, usuario_id),
+    })
+    livros, cursor_anterior, cursor_proximo = dados['livros']
+    emprestimos = dados['emprestimos']
+    # Nomes exibidos nos seletores dos filtros ativos
+    nomes_filtros = {
+        'genero': nome_referencia(db, 'generos', filtros['genero']),
+        'autor': nome_referencia(db, 'autores', filtros['autor']),
+        'editora': nome_referencia(db, 'editoras', filtros['editora']),
+    }
+
+    # Parâmetros preservados nos links de página
+    parametros = {chave: valor for chave, valor in filtros.items() if valor}
+    if parametros.get('disponiveis'):
+        parametros['disponiveis'] = 1
+    parametros['ordem'] = ordem
+
+    return renderizar_com_etag(etag, 'dashboard.html',
+                     usuario=current_user.nome, 
+                     livros=livros, 
+                     emprestimos=emprestimos,
+                     filtros=filtros,
+                     nomes_filtros=nomes_filtros,
+                     ordem=ordem,
+                     parametros=parametros,
+                     cursor_anterior=cursor_anterior,
+                     cursor_proximo=cursor_proximo)
+
+
+
+RESULTADOS_POR_PAGINA = 20
+MAX_PAGINAS_BUSCA = 50
+# Código do MySQL quando a tabela não tem o índice FULLTEXT esperado
+ERRO_SEM_INDICE_FULLTEXT = 1191
+
+
+busca_fulltext_disponivel = True
+
+
+# Retorna (resultados, ha_proxima_pagina). Usa FULLTEXT no MySQL e LIKE nos demais bancos.
+def buscar_livros(db, termo, pagina, por_pagina=RESULTADOS_POR_PAGINA):
+    global busca_fulltext_disponivel
+    limite = por_pagina + 1
+    deslocamento = (pagina - 1) * por_pagina
+    # '!' é o caractere de escape dos LIKE (ESCAPE '!'), igual no MySQL e no SQLite
+    termo_like = termo.replace('!', '!!').replace('%', '!%').replace('_', '!_')
+
+    resultados = None
+    if busca_fulltext_disponivel and db.get_bind().dialect.name == 'mysql':
+        if len(termo) < 3:
+            resultados = repositorio.buscar_livros_prefixo(db, termo_like, limite, deslocamento)
+        else:
+            try:
+                resultados = repositorio.buscar_livros_fulltext(db, termo, limite, deslocamento)
+            except DBAPIError as e:
+                if not (e.orig.args and e.orig.args[0] == ERRO_SEM_INDICE_FULLTEXT):
+                    raise
+                db.rollback()
+                busca_fulltext_disponivel = False
+                current_app.logger.warning("Índices FULLTEXT ausentes; busca usando LIKE. Execute 'flask db upgrade'.")
+
+    if resultados is None:
+        resultados = repositorio.buscar_livros_like(db, termo_like, limite, deslocamento)
+
+    return resultados[:por_pagina], len(resultados) > por_pagina
+
+
+@bp.route('/buscar')
+@login_required
+def buscar():
+    termo = request.args.get('q', '').strip()
+    pagina = min(max(request.args.get('pagina', 1, type=int), 1), MAX_PAGINAS_BUSCA)
 
-    db = Session()
-    try:
-        livros = db.execute(text("""
-            SELECT ID_livro, Titulo, Ano_publicacao, Quantidade_disponivel
-            FROM Livros
-        """)).fetchall()
-
-        emprestimos = db.execute(text("""
-            SELECT e.ID_emprestimo, l.Titulo, e.Data_emprestimo, 
-                   e.Data_devolucao_prevista, e.Status_emprestimo
-            FROM Emprestimos e
-            JOIN Livros l ON e.Livro_id = l.ID_livro
-            WHERE e.Usuario_id = :uid
-            ORDER BY e.Data_emprestimo DESC
-        """), {"uid": current_user.id}).fetchall()
-
-        autores = db.execute(text("""
-            SELECT ID_autor, Nome_autor
-            FROM Autores
-            ORDER BY Nome_autor
-        """)).fetchall()
-
-        generos = db.execute(text("""
-            SELECT ID_genero, Nome_genero
-            FROM Generos
-            ORDER BY Nome_genero
-        """)).fetchall()
-
-        editoras = db.execute(text("""
-            SELECT ID_editora, Nome_editora
-            FROM Editoras
-            ORDER BY Nome_editora
-        """)).fetchall()
-
-        return render_template('dashboard.html', 
-                         usuario=current_user.nome, 
-                         livros=livros, 
-                         emprestimos=emprestimos,
-                         autores=autores,
-                         generos=generos,
-                         editoras=editoras)
-    finally:
-        db.close()
-
-
-
-@app.route('/add_livro', methods=['POST'])
+    resultados, ha_proxima = [], False
+    if termo:
+        db = obter_sessao()
+        resultados, ha_proxima = buscar_livros(db, termo[:100], pagina)
+
+    return render_template('busca.html',
+                           usuario=current_user.nome,
+                           termo=termo,
+                           resultados=resultados,
+                           pagina=pagina,
+                           ha_proxima=ha_proxima and pagina < MAX_PAGINAS_BUSCA)
+
+
+
+@bp.route('/add_livro', methods=['POST'])
 @login_required
 def add_livro():
-    db = Session()
+    db = obter_sessao()
     try:
         titulo = request.form['titulo']
         isbn = request.form['isbn']
@@ -208,47 +558,64 @@ def add_livro():
         genero_id = request.form.get('genero_id')
         editora_id = request.form.get('editora_id')
 
-        existe = db.execute(
-            text("SELECT ID_livro FROM Livros WHERE ISBN = :isbn"),
-            {"isbn": isbn}
-        ).fetchone()
-
-        if existe:
+        if repositorio.isbn_cadastrado(db, isbn):
             flash('ISBN já cadastrado!')
-            return redirect(url_for('dashboard'))
-
-        query = text("""
-            INSERT INTO Livros (Titulo, ISBN, Ano_publicacao, Quantidade_disponivel, Autor_id, Genero_id, Editora_id, Resumo, Usuario_id)
-            VALUES (:titulo, :isbn, :ano, :qtd, :autor_id, :genero_id, :editora_id, :resumo, :uid)
-        """)
-        db.execute(query, {
-            "titulo": titulo,
-            "isbn": isbn,
-            "ano": int(ano) if ano else None,
-            "qtd": int(qtd) if qtd else 0,
-            "resumo": request.form.get('resumo', None),
-            "autor_id": int(autor_id) if autor_id else None,
-            "genero_id": int(genero_id) if genero_id else None,
-            "editora_id": int(editora_id) if editora_id else None,
-            "uid": current_user.id
-        })
-
+            return redirect(url_for('biblioteca.dashboard'))
+
+        repositorio.inserir_livro(
+            db,
+            titulo=titulo,
+            isbn=isbn,
+            ano=int(ano) if ano else None,
+            quantidade=int(qtd) if qtd else 0,
+            resumo=request.form.get('resumo', None),
+            autor_id=int(autor_id) if autor_id else None,
+            genero_id=int(genero_id) if genero_id else None,
+            editora_id=int(editora_id) if editora_id else None,
+            usuario_id=current_user.id,
+        )
+
+        marcar_alteracao(db, 'Livros')
         db.commit()
         flash('Livro adicionado com sucesso!')
     except DBAPIError as e:
         erro_mysql = str(e.orig).split(",")[-1].replace("'", "").strip()
         db.rollback()
         flash(erro_mysql)
-    finally:
-        db.close()
     
-    return redirect(url_for('dashboard'))
+    return redirect(url_for('biblioteca.dashboard'))
+
+
+ERROS_IMPORTACAO_EXIBIDOS = 200
+
+
+@bp.route('/importar', methods=['GET', 'POST'])
+@login_required
+def importar_catalogo():
+    relatorio = None
+
+    if request.method == 'POST':
+        arquivo = request.files.get('arquivo')
+        if not arquivo or not arquivo.filename:
+            flash('Selecione um arquivo CSV ou JSON Lines.')
+            return redirect(url_for('biblioteca.importar_catalogo'))
+
+        formato = request.form.get('formato') or (
+            'jsonl' if arquivo.filename.lower().endswith(('.jsonl', '.json')) else 'csv'
+        )
+        db = obter_sessao()
+        relatorio = importar_livros(db, abrir_leitor(arquivo.stream, formato), usuario_id=current_user.id)
+
+    return render_template('importar.html',
+                           usuario=current_user.nome,
+                           relatorio=relatorio,
+                           limite_erros=ERROS_IMPORTACAO_EXIBIDOS)
 
 
-@app.route('/editar_livro/<int:id_livro>', methods=['GET', 'POST'])
+@bp.route('/editar_livro/<int:id_livro>', methods=['GET', 'POST'])
 @login_required
 def editar_livro(id_livro):
-    db = Session()
+    db = obter_sessao()
     
     try:
         if request.method == 'POST':
@@ -261,48 +628,37 @@ def editar_livro(id_livro):
             novo_autor = request.form.get('autor_id')
             novo_editora = request.form.get('editora_id')
 
-            db.execute(text("""
-                UPDATE Livros
-                SET Titulo = :titulo,
-                    ISBN = :isbn,
-                    Ano_publicacao = :ano,
-                    Quantidade_disponivel = :qtd,
-                    Resumo = :resumo,
-                    Genero_id = :genero,
-                    Autor_id = :autor,
-                    Editora_id = :editora
-                WHERE ID_livro = :id
-            """), {
-                "titulo": novo_titulo,
-                "isbn": novo_isbn,
-                "ano": int(novo_ano) if novo_ano else None,
-                "qtd": int(nova_qtd) if nova_qtd else 0,
-                "resumo": novo_resumo,
-                "genero": int(novo_genero) if novo_genero else None,
-                "autor": int(novo_autor) if novo_autor else None,
-                "editora": int(novo_editora) if novo_editora else None,
-                "id": id_livro
-            })
-
+            repositorio.atualizar_livro(
+                db, id_livro,
+                titulo=novo_titulo,
+                isbn=novo_isbn,
+                ano=int(novo_ano) if novo_ano else None,
+                quantidade=int(nova_qtd) if nova_qtd else 0,
+                resumo=novo_resumo,
+                genero_id=int(novo_genero) if novo_genero else None,
+                autor_id=int(novo_autor) if novo_autor else None,
+                editora_id=int(novo_editora) if novo_editora else None,
+            )
+
+            marcar_alteracao(db, 'Livros')
             db.commit()
             flash('Livro atualizado com sucesso!')
-            return redirect(url_for('dashboard'))
+            return redirect(url_for('biblioteca.dashboard'))
 
-        livro = db.execute(
-            text("SELECT * FROM Livros WHERE ID_livro = :id"), 
-            {"id": id_livro}
-        ).fetchone()
+        livro = repositorio.buscar_livro(db, id_livro)
 
         if not livro:
             flash('Livro não encontrado.')
-            return redirect(url_for('dashboard'))
+            return redirect(url_for('biblioteca.dashboard'))
 
-        # opcional: enviar lista de generos/autores/editoras para o form de edição
-        generos = db.execute(text("SELECT ID_genero, Nome_genero FROM Generos ORDER BY Nome_genero")).fetchall()
-        autores = db.execute(text("SELECT ID_autor, Nome_autor FROM Autores ORDER BY Nome_autor")).fetchall()
-        editoras = db.execute(text("SELECT ID_editora, Nome_editora FROM Editoras ORDER BY Nome_editora")).fetchall()
+        # Nomes exibidos nos seletores de gênero, autor e editora do formulário
+        nomes = {
+            'genero': nome_referencia(db, 'generos', livro.Genero_id),
+            'autor': nome_referencia(db, 'autores', livro.Autor_id),
+            'editora': nome_referencia(db, 'editoras', livro.Editora_id),
+        }
 
-        return render_template('editar.html', livro=livro, generos=generos, autores=autores, editoras=editoras)
+        return render_template('editar.html', livro=livro, nomes=nomes)
     
     except DBAPIError as e:
         db.rollback()
@@ -310,490 +666,601 @@ def editar_livro(id_livro):
         flash(erro_mysql, 'sucess')
 
 
-    finally:
-        db.close()
 
 
-@app.route('/remover_livro/<int:id_livro>', methods=['POST'])
+@bp.route('/remover_livro/<int:id_livro>', methods=['POST'])
 @login_required
 def remover_livro(id_livro):
-    db = Session()
+    db = obter_sessao()
     try:
-        livro = db.execute(text("""
-            SELECT Usuario_id FROM Livros WHERE ID_livro = :id
-        """), {"id": id_livro}).fetchone()
+        livro = repositorio.buscar_dono_livro(db, id_livro)
 
         if not livro:
             flash("Livro não encontrado.")
-            return redirect(url_for('dashboard'))
+            return redirect(url_for('biblioteca.dashboard'))
 
         if livro.Usuario_id and livro.Usuario_id != current_user.id:
             flash("Você só pode remover livros que você mesmo adicionou.")
-            return redirect(url_for('dashboard'))
+            return redirect(url_for('biblioteca.dashboard'))
 
         # Impedir remoção se houver qualquer empréstimo (histórico ou ativo)
-        emprestimos_total = db.execute(text("""
-            SELECT COUNT(*) AS total
-            FROM Emprestimos
-            WHERE Livro_id = :id
-        """), {"id": id_livro}).fetchone()
+        totais = contadores(db, id_livro, 'emprestimos_livro')
 
-        if emprestimos_total.total > 0:
+        if totais['emprestimos_livro'] > 0:
             flash("Não é possível remover este livro, pois existem registros de empréstimos associados. Para preservar o histórico, remova ou ajuste os empréstimos antes.")
-            return redirect(url_for('dashboard'))
+            return redirect(url_for('biblioteca.dashboard'))
 
-        db.execute(text("DELETE FROM Livros WHERE ID_livro = :id"), {"id": id_livro})
+        repositorio.remover_livro(db, id_livro)
+        auditar(db, 'livros', 'DELETE', id_livro, valor_antigo=f"titulo: {livro.Titulo} | isbn: {livro.ISBN}")
+        marcar_alteracao(db, 'Livros')
         db.commit()
 
         flash("Livro removido com sucesso!", "sucess")
     except Exception as e:
         flash(f"Erro ao remover livro pois existem registros de empréstimos associados")
-    finally:
-        db.close()
     
-    return redirect(url_for('dashboard'))
+    return redirect(url_for('biblioteca.dashboard'))
 
-@app.route('/add_genero', methods=['GET', 'POST'])
+@bp.route('/add_genero', methods=['GET', 'POST'])
 @login_required
 def add_genero():
-    db = Session()
+    db = obter_sessao()
     
-    try:
-        if request.method == 'POST':
-            nome = request.form['nome_genero']
+    if request.method == 'POST':
+        nome = request.form['nome_genero']
 
-            db.execute(text("""
-                INSERT INTO Generos (Nome_genero)
-                VALUES (:nome)
-            """), {
-                "nome": nome,
-                "uid": current_user.id
-            })
+        repositorio.inserir_genero(db, nome)
 
-            db.commit()
-            flash('Gênero adicionado com sucesso!')
-            return redirect(url_for('add_genero'))
+        descartar_apos_commit(db, 'Generos')
+        db.commit()
+        flash('Gênero adicionado com sucesso!')
+        return redirect(url_for('biblioteca.add_genero'))
+
+    etag = etag_pagina(db, 'Generos', 'Usuarios')
+    nao_modificada = pagina_nao_modificada(etag)
+    if nao_modificada:
+        return nao_modificada
 
-        generos = db.execute(text("""
-            SELECT ID_genero, Nome_genero
-            FROM Generos
-            ORDER BY Nome_genero
-        """)).fetchall()
+    generos = listar_generos(db)
 
-        return render_template('add_genero.html', usuario=current_user.nome, generos=generos)
-    finally:
-        db.close()
+    return renderizar_com_etag(etag, 'add_genero.html', usuario=current_user.nome, generos=generos)
 
 
-@app.route('/editar_genero/<int:id_genero>', methods=['GET', 'POST'])
+@bp.route('/editar_genero/<int:id_genero>', methods=['GET', 'POST'])
 @login_required
 def editar_genero(id_genero):
-    db = Session()
-    try:
-        genero = db.execute(
-            text("SELECT * FROM Generos WHERE ID_genero = :id"),
-            {"id": id_genero}
-        ).fetchone()
+    db = obter_sessao()
+    genero = repositorio.buscar_genero(db, id_genero)
 
-        if not genero:
-            flash("Gênero não encontrado.")
-            return redirect(url_for('add_genero'))
+    if not genero:
+        flash("Gênero não encontrado.")
+        return redirect(url_for('biblioteca.add_genero'))
 
-        if request.method == 'POST':
-            nome = request.form.get('nome_genero', '').strip()
-            db.execute(text("""
-                UPDATE Generos
-                SET Nome_genero = :nome
-                WHERE ID_genero = :id
-            """), {"nome": nome, "id": id_genero})
-            db.commit()
-            flash("Gênero atualizado com sucesso!")
-            return redirect(url_for('add_genero'))
+    if request.method == 'POST':
+        nome = request.form.get('nome_genero', '').strip()
+        repositorio.atualizar_genero(db, id_genero, nome)
+        descartar_apos_commit(db, 'Generos')
+        db.commit()
+        flash("Gênero atualizado com sucesso!")
+        return redirect(url_for('biblioteca.add_genero'))
 
-        return render_template('editar_genero.html', usuario=current_user.nome, genero=genero)
-    finally:
-        db.close()
+    return render_template('editar_genero.html', usuario=current_user.nome, genero=genero)
 
-@app.route('/remover_genero/<int:id_genero>', methods=['POST'])
+@bp.route('/remover_genero/<int:id_genero>', methods=['POST'])
 @login_required
 def remover_genero(id_genero):
-    db = Session()
+    db = obter_sessao()
     try:
-        genero = db.execute(text("""
-            SELECT * FROM Generos WHERE ID_genero = :id
-        """), {"id": id_genero}).fetchone()
+        genero = repositorio.buscar_genero(db, id_genero)
 
         if not genero:
             flash("Gênero não encontrado.")
-            return redirect(url_for('add_genero'))
+            return redirect(url_for('biblioteca.add_genero'))
 
-        # Verifica livros vinculados ao gênero (ligações atuais)
-        livros_vinculados = db.execute(text("""
-            SELECT COUNT(*) AS total FROM Livros WHERE Genero_id = :id
-        """), {"id": id_genero}).fetchone()
+        # Livros vinculados ao gênero (ligações atuais) e empréstimos pelo snapshot salvo no
+        # momento do empréstimo. Sem livros no gênero, não há empréstimos de livros dele a checar.
+        totais = contadores(db, id_genero, 'livros_genero', 'emprestimos_genero')
 
-        if livros_vinculados.total > 0:
+        if totais['livros_genero'] > 0:
             flash("Não é possível remover este gênero, pois há livros associados a ele.")
-            return redirect(url_for('add_genero'))
+            return redirect(url_for('biblioteca.add_genero'))
 
-        # Verifica empréstimos vinculados a livros desse gênero pelo snapshot salvo no momento do empréstimo
-        emprestimos_snapshot = db.execute(text("""
-            SELECT COUNT(*) AS total FROM Emprestimos WHERE Livro_genero_id = :id
-        """), {"id": id_genero}).fetchone()
-
-        if emprestimos_snapshot.total > 0:
+        if totais['emprestimos_genero'] > 0:
             flash("Não é possível remover este gênero; existem empréstimos históricos vinculados a ele.")
-            return redirect(url_for('add_genero'))
-
-        # Verifica empréstimos que referenciam livros cujo gênero atual é o que será removido
-        emprestimos_vinculados = db.execute(text("""
-            SELECT COUNT(*) AS total
-            FROM Emprestimos e
-            JOIN Livros l ON e.Livro_id = l.ID_livro
-            WHERE l.Genero_id = :id
-        """), {"id": id_genero}).fetchone()
-
-        if emprestimos_vinculados.total > 0:
-            flash("Não é possível remover este gênero, pois existem empréstimos relacionados a livros deste gênero.")
-            return redirect(url_for('add_genero'))
+            return redirect(url_for('biblioteca.add_genero'))
 
-        db.execute(text("DELETE FROM Generos WHERE ID_genero = :id"), {"id": id_genero})
+        repositorio.remover_genero(db, id_genero)
+        descartar_apos_commit(db, 'Generos')
         db.commit()
 
         flash("Gênero removido com sucesso!")
     except Exception as e:
         flash(f"Erro ao remover gênero: {str(e)}")
-    finally:
-        db.close()
 
-    return redirect(url_for('add_genero'))
+    return redirect(url_for('biblioteca.add_genero'))
 
 
 
-@app.route('/add_autor', methods=['GET', 'POST'])
+@bp.route('/add_autor', methods=['GET', 'POST'])
 @login_required
 def add_autor():
-    db = Session()
+    db = obter_sessao()
     
-    try:
-        if request.method == 'POST':
-            nome = request.form['nome_autor']
-            nacionalidade = request.form.get('nacionalidade', '')
-            data_nascimento = request.form.get('data_nascimento', None)
-            biografia = request.form.get('biografia', '')
-
-            db.execute(text("""
-                INSERT INTO Autores (Nome_autor, Nacionalidade, Data_nascimento, Biografia, Usuario_id)
-                VALUES (:nome, :nacionalidade, :data_nasc, :bio, :uid)
-            """), {
-                "nome": nome,
-                "nacionalidade": nacionalidade if nacionalidade else None,
-                "data_nasc": data_nascimento if data_nascimento else None,
-                "bio": biografia if biografia else None,
-                "uid": current_user.id
-            })
+    if request.method == 'POST':
+        nome = request.form['nome_autor']
+        nacionalidade = request.form.get('nacionalidade', '')
+        data_nascimento = request.form.get('data_nascimento', None)
+        biografia = request.form.get('biografia', '')
+
+        autor_id = repositorio.inserir_autor(
+            db,
+            nome=nome,
+            nacionalidade=nacionalidade if nacionalidade else None,
+            data_nascimento=data_nascimento if data_nascimento else None,
+            biografia=biografia if biografia else None,
+            usuario_id=current_user.id,
+        )
+        auditar(db, 'autores', 'INSERT', autor_id, valor_novo=f"nome: {nome}")
+
+        descartar_apos_commit(db, 'Autores')
+        db.commit()
+        flash('Autor adicionado com sucesso!')
+        return redirect(url_for('biblioteca.add_autor'))
 
-            db.commit()
-            flash('Autor adicionado com sucesso!')
-            return redirect(url_for('add_autor'))
+    etag = etag_pagina(db, 'Autores', 'Usuarios')
+    nao_modificada = pagina_nao_modificada(etag)
+    if nao_modificada:
+        return nao_modificada
 
-        autores = db.execute(text("""
-            SELECT ID_autor, Nome_autor, Nacionalidade, Usuario_id
-            FROM Autores
-            ORDER BY Nome_autor
-        """)).fetchall()
+    autores = listar_autores(db)
 
-        return render_template('add_autor.html', usuario=current_user.nome, autores=autores)
-    finally:
-        db.close()
+    return renderizar_com_etag(etag, 'add_autor.html', usuario=current_user.nome, autores=autores)
 
 
-@app.route('/remover_autor/<int:id_autor>', methods=['POST'])
+@bp.route('/remover_autor/<int:id_autor>', methods=['POST'])
 @login_required
 def remover_autor(id_autor):
-    db = Session()
+    db = obter_sessao()
     try:
-        autor = db.execute(text("""
-            SELECT Usuario_id FROM Autores WHERE ID_autor = :id
-        """), {"id": id_autor}).fetchone()
+        autor = repositorio.buscar_autor(db, id_autor)
 
         if not autor:
             flash("Autor não encontrado.")
-            return redirect(url_for('add_autor'))
+            return redirect(url_for('biblioteca.add_autor'))
 
         if autor.Usuario_id != current_user.id:
             flash("Você só pode remover autores que você mesmo adicionou.")
-            return redirect(url_for('add_autor'))
+            return redirect(url_for('biblioteca.add_autor'))
 
-        # Verifica livros do autor
-        livros = db.execute(text("""
-            SELECT COUNT(*) AS total FROM Livros WHERE Autor_id = :id
-        """), {"id": id_autor}).fetchone()
+        # Verifica livros do autor e empréstimos pelo snapshot do autor
+        totais = contadores(db, id_autor, 'livros_autor', 'emprestimos_autor')
 
-        if livros.total > 0:
+        if totais['livros_autor'] > 0:
             flash("Não é possível remover este autor, pois há livros associados.")
-            return redirect(url_for('add_autor'))
-
-        # Verifica empréstimos vinculados a livros desse autor (caso haja inconsistências)
-        emprestimos_vinculados = db.execute(text("""
-            SELECT COUNT(*) AS total
-            FROM Emprestimos e
-            JOIN Livros l ON e.Livro_id = l.ID_livro
-            WHERE l.Autor_id = :id
-        """), {"id": id_autor}).fetchone()
+            return redirect(url_for('biblioteca.add_autor'))
 
-        if emprestimos_vinculados.total > 0:
+        if totais['emprestimos_autor'] > 0:
             flash("Não é possível remover este autor, pois existem empréstimos relacionados a livros deste autor.")
-            return redirect(url_for('add_autor'))
+            return redirect(url_for('biblioteca.add_autor'))
 
-        db.execute(text("DELETE FROM Autores WHERE ID_autor = :id"), {"id": id_autor})
+        repositorio.remover_autor(db, id_autor)
+        auditar(db, 'autores', 'DELETE', id_autor, valor_antigo=f"nome: {autor.Nome_autor}")
+        descartar_apos_commit(db, 'Autores')
         db.commit()
 
         flash("Autor removido com sucesso!")
     except Exception as e:
         flash(f"Erro ao remover autor: {str(e)}")
-    finally:
-        db.close()
     
-    return redirect(url_for('add_autor'))
+    return redirect(url_for('biblioteca.add_autor'))
 
 
 
-@app.route('/editar_autor/<int:id_autor>', methods=['GET', 'POST'])
+@bp.route('/editar_autor/<int:id_autor>', methods=['GET', 'POST'])
 @login_required
 def editar_autor(id_autor):
-    db = Session()
-    try:
-        autor = db.execute(
-            text("SELECT * FROM Autores WHERE ID_autor = :id"),
-            {"id": id_autor}
-        ).fetchone()
+    db = obter_sessao()
+    autor = repositorio.buscar_autor(db, id_autor)
 
-        if not autor:
-            flash("Autor não encontrado.")
-            return redirect(url_for('add_autor'))
+    if not autor:
+        flash("Autor não encontrado.")
+        return redirect(url_for('biblioteca.add_autor'))
 
-        if autor.Usuario_id != current_user.id:
-            flash("Você só pode editar autores que você mesmo adicionou.")
-            return redirect(url_for('add_autor'))
+    if autor.Usuario_id != current_user.id:
+        flash("Você só pode editar autores que você mesmo adicionou.")
+        return redirect(url_for('biblioteca.add_autor'))
 
-        if request.method == 'POST':
-            nome = request.form.get('nome_autor', '').strip()
-            nacionalidade = request.form.get('nacionalidade', '').strip()
-            data_nascimento = request.form.get('data_nascimento', None)
-            biografia = request.form.get('biografia', '').strip()
-
-            db.execute(text("""
-                UPDATE Autores
-                SET Nome_autor = :nome,
-                    Nacionalidade = :nacionalidade,
-                    Data_nascimento = :data_nasc,
-                    Biografia = :bio
-                WHERE ID_autor = :id
-            """), {
-                "nome": nome,
-                "nacionalidade": nacionalidade if nacionalidade else None,
-                "data_nasc": data_nascimento if data_nascimento else None,
-                "bio": biografia if biografia else None,
-                "id": id_autor
-            })
-            db.commit()
-            flash("Autor atualizado com sucesso!")
-            return redirect(url_for('add_autor'))
+    if request.method == 'POST':
+        nome = request.form.get('nome_autor', '').strip()
+        nacionalidade = request.form.get('nacionalidade', '').strip()
+        data_nascimento = request.form.get('data_nascimento', None)
+        biografia = request.form.get('biografia', '').strip()
+
+        repositorio.atualizar_autor(
+            db, id_autor,
+            nome=nome,
+            nacionalidade=nacionalidade if nacionalidade else None,
+            data_nascimento=data_nascimento if data_nascimento else None,
+            biografia=biografia if biografia else None,
+        )
+        descartar_apos_commit(db, 'Autores')
+        db.commit()
+        flash("Autor atualizado com sucesso!")
+        return redirect(url_for('biblioteca.add_autor'))
 
-        autores = db.execute(text("""
-            SELECT ID_autor, Nome_autor, Nacionalidade, Usuario_id
-            FROM Autores
-            ORDER BY Nome_autor
-        """)).fetchall()
+    autores = listar_autores(db)
 
-        return render_template('edit_autor.html', usuario=current_user.nome, autor=autor, autores=autores)
-    finally:
-        db.close()
+    return render_template('edit_autor.html', usuario=current_user.nome, autor=autor, autores=autores)
 
 
-@app.route('/emprestar/<int:id_livro>', methods=['POST'])
-@login_required
-def emprestar_livro(id_livro):
-    db = Session()
-    try:
-        # pega quantidade e snapshot de autor/gênero
-        livro = db.execute(text("""
-            SELECT Quantidade_disponivel, Autor_id, Genero_id
-            FROM Livros
-            WHERE ID_livro = :id
-        """), {"id": id_livro}).fetchone()
+# Códigos do MySQL para deadlock e timeout de espera por lock: a transação pode ser repetida.
+# No SQLite, o equivalente é esgotar o busy_timeout esperando outra escrita.
+ERROS_LOCK_REPETIVEIS = (1213, 1205)
+TENTATIVAS_EMPRESTIMO = 4
 
-        if not livro:
-            flash("Livro não encontrado.")
-            return redirect(url_for('dashboard'))
 
-        if livro.Quantidade_disponivel <= 0:
-            flash("Livro indisponível para empréstimo.")
-            return redirect(url_for('dashboard'))
+def erro_de_lock(e):
+    if not e.orig.args:
+        return False
+    return e.orig.args[0] in ERROS_LOCK_REPETIVEIS or e.orig.args[0] == 'database is locked'
+
+
+# Itens aceitos por pedido de empréstimo ou devolução em lote
+ITENS_POR_PEDIDO = 30
+
+MENSAGEM_NAO_ENCONTRADO = "Livro não encontrado."
+MENSAGEM_INDISPONIVEL = "Livro indisponível para empréstimo."
+MENSAGEM_EMPRESTADO = "Empréstimo realizado com sucesso!"
+MENSAGEM_DEVOLUCAO_INVALIDA = "Empréstimo inválido ou já devolvido."
+MENSAGEM_DEVOLVIDO = "Livro devolvido com sucesso!"
 
-        # Cria o empréstimo salvando snapshot de autor e gênero
-        db.execute(text("""
-            INSERT INTO Emprestimos (Usuario_id, Livro_id, Data_emprestimo, 
-                                     Data_devolucao_prevista, Status_emprestimo, Livro_genero_id, Livro_autor_id)
-            VALUES (:uid, :lid, CURDATE(), DATE_ADD(CURDATE(), INTERVAL 7 DAY), 'pendente', :gen_id, :aut_id)
-        """), {
-            "uid": current_user.id,
-            "lid": id_livro,
-            "gen_id": livro.Genero_id,
-            "aut_id": livro.Autor_id
-        })
 
+# Resultado de um item do pedido, na ordem em que foi pedido
+def resultado_item(item_id, ok, mensagem, titulo=None):
+    return {"id": item_id, "ok": ok, "mensagem": mensagem, "titulo": titulo}
 
+
+# Empresta os livros de `livros_ids` (um ID repetido pede mais de um exemplar) em uma única
+# transação curta: o estoque de todos sai de uma consulta que trava as linhas (FOR UPDATE) até
+# o commit, e os empréstimos possíveis entram num só INSERT de várias linhas. Assim a baixa
+# feita pelo gatilho trg_emprestimo_reduz_quantidade nunca passa do disponível, mesmo com
+# vários pedidos simultâneos do mesmo livro. O SQLite ignora FOR UPDATE; lá o gatilho
+# trg_livros_quantidade_valida recusa a baixa que deixaria o estoque negativo e o pedido é desfeito.
+# Livros inexistentes ou sem estoque não impedem os demais: cada item volta com o seu resultado.
+# Deadlocks e timeouts de lock são repetidos com espera aleatória crescente.
+def realizar_emprestimos(db, usuario_id, livros_ids):
+    for tentativa in range(1, TENTATIVAS_EMPRESTIMO + 1):
+        try:
+            estoque = {livro.ID_livro: livro for livro in repositorio.livros_para_emprestimo(db, set(livros_ids))}
+            restantes = {livro_id: livro.Quantidade_disponivel or 0 for livro_id, livro in estoque.items()}
+
+            resultados = []
+            emprestados = []
+            for livro_id in livros_ids:
+                livro = estoque.get(livro_id)
+                if livro is None:
+                    resultados.append(resultado_item(livro_id, False, MENSAGEM_NAO_ENCONTRADO))
+                elif restantes[livro_id] <= 0:
+                    resultados.append(resultado_item(livro_id, False, MENSAGEM_INDISPONIVEL, livro.Titulo))
+                else:
+                    restantes[livro_id] -= 1
+                    emprestados.append(livro)
+                    resultados.append(resultado_item(livro_id, True, MENSAGEM_EMPRESTADO, livro.Titulo))
+
+            if not emprestados:
+                db.rollback()
+                return resultados
+
+            # Cria os empréstimos salvando snapshot de autor e gênero
+            repositorio.inserir_emprestimos(db, usuario_id, emprestados)
+
+            marcar_alteracao(db, 'Livros', 'Emprestimos')
+            db.commit()
+            return resultados
+        except OperationalError as e:
+            db.rollback()
+            if not erro_de_lock(e) or tentativa == TENTATIVAS_EMPRESTIMO:
+                raise
+            time.sleep(random.uniform(0, 0.01 * 2 ** tentativa))
+
+
+def realizar_emprestimo(db, usuario_id, livro_id):
+    resultado = realizar_emprestimos(db, usuario_id, [livro_id])[0]
+    return resultado["ok"], resultado["mensagem"]
+
+
+# Devolve os empréstimos de `emprestimos_ids` que são do usuário e estão em aberto, com um
+# único UPDATE; os demais voltam com o motivo. O gatilho trg_emprestimo_devolvido repõe o estoque.
+def realizar_devolucoes(db, usuario_id, emprestimos_ids):
+    emprestimos_ids = list(dict.fromkeys(emprestimos_ids))
+    em_aberto = repositorio.emprestimos_em_aberto(db, emprestimos_ids, usuario_id)
+    if not em_aberto:
+        db.rollback()
+    else:
+        repositorio.marcar_devolvidos(db, em_aberto)
+        marcar_alteracao(db, 'Livros', 'Emprestimos')
         db.commit()
-        flash("Empréstimo realizado com sucesso!")
+    return [resultado_item(emprestimo_id, True, MENSAGEM_DEVOLVIDO) if emprestimo_id in em_aberto
+            else resultado_item(emprestimo_id, False, MENSAGEM_DEVOLUCAO_INVALIDA)
+            for emprestimo_id in emprestimos_ids]
+
+
+# IDs de um pedido em lote: campo repetido do formulário (checkboxes) ou lista no corpo JSON
+def ids_do_pedido(campo):
+    if request.is_json:
+        valores = (request.get_json(silent=True) or {}).get(campo) or []
+    else:
+        valores = request.form.getlist(campo)
+    try:
+        ids = [int(valor) for valor in valores]
+    except (TypeError, ValueError):
+        abort(400, f"'{campo}' deve ser uma lista de IDs.")
+    if len(ids) > ITENS_POR_PEDIDO:
+        abort(400, f"No máximo {ITENS_POR_PEDIDO} itens por pedido.")
+    if not ids and request.is_json:
+        abort(400, f"'{campo}' está vazio.")
+    return ids
+
+
+# Pedido JSON recebe os resultados por item; formulário recebe um resumo e os itens que falharam
+def responder_lote(resultados, acao):
+    if request.is_json:
+        return {"resultados": resultados, "sucesso": sum(item["ok"] for item in resultados)}
+    sucesso = sum(item["ok"] for item in resultados)
+    flash(f"{sucesso} de {len(resultados)} {acao}.")
+    for item in resultados:
+        if not item["ok"]:
+            flash(f"{item['titulo'] or '#' + str(item['id'])}: {item['mensagem']}")
+    return redirect(url_for('biblioteca.dashboard'))
+
+
+@bp.route('/emprestar/<int:id_livro>', methods=['POST'])
+@login_required
+def emprestar_livro(id_livro):
+    db = obter_sessao()
+    try:
+        _, mensagem = realizar_emprestimo(db, current_user.id, id_livro)
+        flash(mensagem)
     except Exception as e:
+        db.rollback()
         flash(f"Erro ao realizar empréstimo: {str(e)}")
-    finally:
-        db.close()
     
-    return redirect(url_for('dashboard'))
+    return redirect(url_for('biblioteca.dashboard'))
 
 
-@app.route('/devolver/<int:id_emprestimo>', methods=['POST'])
+# Vários livros no mesmo pedido (carrinho do balcão): campo `livros` repetido no formulário
+# ou {"livros": [1, 2, 2]} em JSON
+@bp.route('/emprestar', methods=['POST'])
 @login_required
-def devolver_livro(id_emprestimo):
-    db = Session()
+def emprestar_livros():
+    livros_ids = ids_do_pedido('livros')
+    if not livros_ids:
+        flash("Selecione ao menos um livro.")
+        return redirect(url_for('biblioteca.dashboard'))
+    db = obter_sessao()
     try:
-        emprestimo = db.execute(text("""
-            SELECT Livro_id FROM Emprestimos
-            WHERE ID_emprestimo = :eid 
-              AND Usuario_id = :uid 
-              AND Status_emprestimo = 'pendente'
-        """), {"eid": id_emprestimo, "uid": current_user.id}).fetchone()
-
-        if not emprestimo:
-            flash("Empréstimo inválido ou já devolvido.")
-            return redirect(url_for('dashboard'))
-
-        db.execute(text("""
-            UPDATE Emprestimos
-            SET Status_emprestimo = 'devolvido', Data_devolucao_real = CURDATE()
-            WHERE ID_emprestimo = :eid
-        """), {"eid": id_emprestimo})
+        resultados = realizar_emprestimos(db, current_user.id, livros_ids)
+    except Exception as e:
+        db.rollback()
+        if request.is_json:
+            abort(500, f"Erro ao realizar empréstimos: {str(e)}")
+        flash(f"Erro ao realizar empréstimos: {str(e)}")
+        return redirect(url_for('biblioteca.dashboard'))
+    return responder_lote(resultados, "empréstimo(s) realizado(s)")
 
 
-        db.commit()
-        flash("Livro devolvido com sucesso!")
+@bp.route('/devolver/<int:id_emprestimo>', methods=['POST'])
+@login_required
+def devolver_livro(id_emprestimo):
+    db = obter_sessao()
+    try:
+        resultado = realizar_devolucoes(db, current_user.id, [id_emprestimo])[0]
+        flash(resultado["mensagem"])
     except Exception as e:
+        db.rollback()
         flash(f"Erro ao devolver livro: {str(e)}")
-    finally:
-        db.close()
     
-    return redirect(url_for('dashboard'))
+    return redirect(url_for('biblioteca.dashboard'))
+
+
+# Devolução em lote: campo `emprestimos` repetido no formulário ou {"emprestimos": [...]} em JSON
+@bp.route('/devolver', methods=['POST'])
+@login_required
+def devolver_livros():
+    emprestimos_ids = ids_do_pedido('emprestimos')
+    if not emprestimos_ids:
+        flash("Selecione ao menos um empréstimo.")
+        return redirect(url_for('biblioteca.dashboard'))
+    db = obter_sessao()
+    try:
+        resultados = realizar_devolucoes(db, current_user.id, emprestimos_ids)
+    except Exception as e:
+        db.rollback()
+        if request.is_json:
+            abort(500, f"Erro ao devolver livros: {str(e)}")
+        flash(f"Erro ao devolver livros: {str(e)}")
+        return redirect(url_for('biblioteca.dashboard'))
+    return responder_lote(resultados, "livro(s) devolvido(s)")
+
 
+FORMATOS_EXPORTACAO = {
+    'csv': 'text/csv; charset=utf-8',
+    'jsonl': 'application/x-ndjson; charset=utf-8',
+}
 
-@app.route('/add_editora', methods=['GET', 'POST'])
+
+def data_do_filtro(nome):
+    valor = request.args.get(nome)
+    if not valor:
+        return None
+    try:
+        return date.fromisoformat(valor)
+    except ValueError:
+        abort(400, f"Data inválida em '{nome}': use AAAA-MM-DD.")
+
+
+# Administradores: IDs ou e-mails listados em ADMINS
+def eh_admin(usuario):
+    admins = current_app.config['ADMINS']
+    return str(usuario.id) in admins or (usuario.email or '').lower() in admins
+
+
+# Exporta empréstimos ou auditoria em CSV/JSON Lines, com filtros ?inicio=&fim=&usuario=.
+# A resposta é gerada em streaming: o arquivo não é montado na memória. Quem não é
+# administrador só exporta os próprios empréstimos.
+@bp.route('/exportar/<tipo>.<formato>')
+@login_required
+def exportar(tipo, formato):
+    if tipo not in EXPORTACOES or formato not in FORMATOS_EXPORTACAO:
+        abort(404)
+
+    admin = eh_admin(current_user)
+    if EXPORTACOES[tipo].get('somente_admin') and not admin:
+        abort(403)
+    inicio = data_do_filtro('inicio')
+    fim = data_do_filtro('fim')
+    usuario = request.args.get('usuario', type=int)
+    if not admin:
+        if usuario not in (None, current_user.id):
+            abort(403)
+        usuario = current_user.id
+
+    gerador = gerar_exportacao(
+        tipo, formato,
+        inicio=inicio,
+        fim=fim + timedelta(days=1) if fim else None,
+        usuario=usuario,
+        origem=obter_roteador().engine_leitura(),
+    )
+    return Response(gerador, mimetype=FORMATOS_EXPORTACAO[formato], headers={
+        "Content-Disposition": f"attachment; filename={tipo}.{formato}",
+        "X-Accel-Buffering": "no",
+    })
+
+
+@bp.route('/add_editora', methods=['GET', 'POST'])
 @login_required
 def add_editora():
-    db = Session()
+    db = obter_sessao()
     
-    try:
-        if request.method == 'POST':
-            nome = request.form['nome_editora']
-            endereco = request.form.get('endereco_editora', None)
-
-            db.execute(text("""
-                INSERT INTO Editoras (Nome_editora, Endereco_editora, Usuario_id)
-                VALUES (:nome, :endereco, :uid)
-            """), {
-                "nome": nome,
-                "endereco": endereco if endereco else None,
-                "uid": current_user.id
-            })
+    if request.method == 'POST':
+        nome = request.form['nome_editora']
+        endereco = request.form.get('endereco_editora', None)
 
-            db.commit()
-            flash('Editora adicionada com sucesso!')
-            return redirect(url_for('add_editora'))
+        repositorio.inserir_editora(db, nome, endereco if endereco else None, current_user.id)
+
+        descartar_apos_commit(db, 'Editoras')
+        db.commit()
+        flash('Editora adicionada com sucesso!')
+        return redirect(url_for('biblioteca.add_editora'))
 
-        editoras = db.execute(text("""
-            SELECT ID_editora, Nome_editora, Endereco_editora, Usuario_id
-            FROM Editoras
-            ORDER BY Nome_editora
-        """)).fetchall()
+    etag = etag_pagina(db, 'Editoras', 'Usuarios')
+    nao_modificada = pagina_nao_modificada(etag)
+    if nao_modificada:
+        return nao_modificada
 
-        return render_template('add_editora.html', usuario=current_user.nome, editoras=editoras)
-    finally:
-        db.close()
+    editoras = listar_editoras(db)
 
+    return renderizar_com_etag(etag, 'add_editora.html', usuario=current_user.nome, editoras=editoras)
 
-@app.route('/editar_editora/<int:id_editora>', methods=['GET', 'POST'])
+
+@bp.route('/editar_editora/<int:id_editora>', methods=['GET', 'POST'])
 @login_required
 def editar_editora(id_editora):
-    db = Session()
-    try:
-        editora = db.execute(
-            text("SELECT * FROM Editoras WHERE ID_editora = :id"),
-            {"id": id_editora}
-        ).fetchone()
+    db = obter_sessao()
+    editora = repositorio.buscar_editora(db, id_editora)
 
-        if not editora:
-            flash("Editora não encontrada.")
-            return redirect(url_for('add_editora'))
+    if not editora:
+        flash("Editora não encontrada.")
+        return redirect(url_for('biblioteca.add_editora'))
 
-        if request.method == 'POST':
-            nome = request.form.get('nome_editora', '').strip()
-            endereco = request.form.get('endereco_editora', '').strip()
-            db.execute(text("""
-                UPDATE Editoras
-                SET Nome_editora = :nome,
-                    Endereco_editora = :end
-                WHERE ID_editora = :id
-            """), {"nome": nome, "end": endereco if endereco else None, "id": id_editora})
-            db.commit()
-            flash("Editora atualizada com sucesso!")
-            return redirect(url_for('add_editora'))
+    if request.method == 'POST':
+        nome = request.form.get('nome_editora', '').strip()
+        endereco = request.form.get('endereco_editora', '').strip()
+        repositorio.atualizar_editora(db, id_editora, nome, endereco if endereco else None)
+        descartar_apos_commit(db, 'Editoras')
+        db.commit()
+        flash("Editora atualizada com sucesso!")
+        return redirect(url_for('biblioteca.add_editora'))
 
-        # Buscar todas as editoras para exibir na lista
-        editoras = db.execute(text("""
-            SELECT ID_editora, Nome_editora, Endereco_editora, Usuario_id
-            FROM Editoras
-            ORDER BY Nome_editora
-        """)).fetchall()
+    # Buscar todas as editoras para exibir na lista
+    editoras = listar_editoras(db)
 
-        return render_template('editar_editora.html', usuario=current_user.nome, editora=editora, editoras=editoras)
-    finally:
-        db.close()
+    return render_template('editar_editora.html', usuario=current_user.nome, editora=editora, editoras=editoras)
 
 
-@app.route('/remover_editora/<int:id_editora>', methods=['POST'])
+@bp.route('/remover_editora/<int:id_editora>', methods=['POST'])
 @login_required
 def remover_editora(id_editora):
-    db = Session()
+    db = obter_sessao()
     try:
-        editora = db.execute(text("""
-            SELECT * FROM Editoras WHERE ID_editora = :id
-        """), {"id": id_editora}).fetchone()
+        editora = repositorio.buscar_editora(db, id_editora)
 
         if not editora:
             flash("Editora não encontrada.")
-            return redirect(url_for('add_editora'))
+            return redirect(url_for('biblioteca.add_editora'))
 
         # Verifica se a editora está vinculada a algum livro
-        livros_vinculados = db.execute(text("""
-            SELECT COUNT(*) AS total FROM Livros WHERE Editora_id = :id
-        """), {"id": id_editora}).fetchone()
+        totais = contadores(db, id_editora, 'livros_editora')
 
-        if livros_vinculados.total > 0:
+        if totais['livros_editora'] > 0:
             flash("Não é possível remover esta editora, pois há livros associados a ela.")
-            return redirect(url_for('add_editora'))
+            return redirect(url_for('biblioteca.add_editora'))
 
-        db.execute(text("DELETE FROM Editoras WHERE ID_editora = :id"), {"id": id_editora})
+        repositorio.remover_editora(db, id_editora)
+        descartar_apos_commit(db, 'Editoras')
         db.commit()
 
         flash("Editora removida com sucesso!")
     except Exception as e:
         flash(f"Erro ao remover editora: {str(e)}")
-    finally:
-        db.close()
 
-    return redirect(url_for('add_editora'))
+    return redirect(url_for('biblioteca.add_editora'))
+
+
+# Fábrica da aplicação: `flask --app app` e `gunicorn 'app:create_app()'` a chamam uma vez por
+# processo (no mestre, com --preload). Nada aqui conecta ao banco: o engine é criado no primeiro
+# uso e descartado nos processos filhos após o fork (ver database/__init__.py). A configuração
+# vem do ambiente; `config` sobrepõe (testes, benchmarks).
+def create_app(config=None):
+    app = Flask(__name__)
+    app.config.from_mapping(
+        SECRET_KEY=os.environ.get('SECRET_KEY'),
+        DATABASE_URL=DATABASE_URL,
+        LOGIN_SEM_ESTADO=os.environ.get('LOGIN_SEM_ESTADO', '0') == '1',
+        LOGIN_CLAIMS_MAX_IDADE=int(os.environ.get('LOGIN_CLAIMS_MAX_IDADE', 3600)),
+        METRICAS_TOKEN=os.environ.get('METRICAS_TOKEN'),
+        ADMINS=os.environ.get('ADMINS', '').split(','),
+    )
+    if config:
+        app.config.from_mapping(config)
+    # IDs e e-mails (sem diferença de maiúsculas) dos administradores
+    app.config['ADMINS'] = {str(admin).strip().lower() for admin in app.config['ADMINS'] if str(admin).strip()}
+    if not app.config['SECRET_KEY']:
+        # Chave só deste processo: as sessões não valem em outros workers nem após reiniciar
+        app.logger.warning("SECRET_KEY não definida; usando uma chave temporária.")
+        app.config['SECRET_KEY'] = os.urandom(32).hex()
+
+    # Sessão de banco por requisição, encerrada no teardown
+    init_app(app)
+    login_manager.init_app(app)
+    app.register_blueprint(bp)
+
+    # Comandos de linha de comando (flask seed, flask db ..., flask importar, flask atrasos, ...)
+    app.cli.add_command(seed)
+    app.cli.add_command(db_cli)
+    app.cli.add_command(importar)
+    app.cli.add_command(atrasos)
+    app.cli.add_command(auditoria_cli)
+    app.cli.add_command(contadores_cli)
+    app.cli.add_command(replicas_cli)
+
+    # Varredura periódica de empréstimos atrasados (AGENDAR_ATRASOS_SEGUNDOS > 0)
+    configurar_agendador(app)
+    # Auditoria pela aplicação (AUDITORIA_MODO=aplicacao): gravação do spool em segundo plano
+    configurar_auditoria(app)
+    return app
 
 
 if __name__ == '__main__':
-    app.run(debug=True)
\ No newline at end of file
+    create_app().run(debug=True)
\ No newline at end of file
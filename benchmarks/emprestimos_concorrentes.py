@@ -0,0 +1,100 @@
+# Dispara centenas de empréstimos simultâneos do mesmo livro e confere que o estoque
+# nunca fica negativo e que o número de empréstimos criados é igual ao estoque inicial.
+#
+#   python benchmarks/emprestimos_concorrentes.py --pedidos 300 --estoque 50 --threads 32
+#
+# Usa o banco configurado em DATABASE_URL (MySQL com o schema e os gatilhos de database/database.sql,
+# ou um arquivo SQLite preparado com `flask db upgrade`).
+import argparse
+import os
+import sys
+import time
+from datetime import date
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import text
+
+from app import create_app
+from database import Session
+
+app = create_app()
+
+
+def preparar(estoque):
+    db = Session()
+    try:
+        marca = f"{int(time.time() * 1000) % 10**9:09d}"
+        usuario_id = db.execute(text("""
+            INSERT INTO Usuarios (Nome_usuario, Email, Data_inscricao, Multa_atual)
+            VALUES ('Teste de concorrência', :email, :hoje, 0)
+        """), {"email": f"concorrencia-{marca}@exemplo.com", "hoje": date.today()}).lastrowid
+        livro_id = db.execute(text("""
+            INSERT INTO Livros (Titulo, ISBN, Ano_publicacao, Quantidade_disponivel, Resumo)
+            VALUES ('Livro disputado', :isbn, 2000, :qtd, 'Teste de concorrência')
+        """), {"isbn": f"9999{marca}", "qtd": estoque}).lastrowid
+        db.commit()
+        return usuario_id, livro_id
+    finally:
+        db.close()
+
+
+def limpar(usuario_id, livro_id):
+    db = Session()
+    try:
+        db.execute(text("DELETE FROM Emprestimos WHERE Livro_id = :id"), {"id": livro_id})
+        db.execute(text("DELETE FROM Livros WHERE ID_livro = :id"), {"id": livro_id})
+        db.execute(text("DELETE FROM Usuarios WHERE ID_usuario = :id"), {"id": usuario_id})
+        db.commit()
+    finally:
+        db.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Empréstimos simultâneos do mesmo livro.')
+    parser.add_argument('--pedidos', type=int, default=300)
+    parser.add_argument('--estoque', type=int, default=50)
+    parser.add_argument('--threads', type=int, default=32)
+    parser.add_argument('--manter', action='store_true', help='não remove os dados de teste')
+    args = parser.parse_args()
+
+    usuario_id, livro_id = preparar(args.estoque)
+
+    def emprestar(_):
+        with app.test_client() as cliente:
+            with cliente.session_transaction() as sessao:
+                sessao['_user_id'] = str(usuario_id)
+            inicio = time.perf_counter()
+            resposta = cliente.post(f'/emprestar/{livro_id}')
+            return resposta.status_code, time.perf_counter() - inicio
+
+    inicio = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.threads) as executor:
+        resultados = list(executor.map(emprestar, range(args.pedidos)))
+    duracao = time.perf_counter() - inicio
+
+    db = Session()
+    try:
+        estoque = db.execute(text("SELECT Quantidade_disponivel FROM Livros WHERE ID_livro = :id"),
+                             {"id": livro_id}).scalar()
+        criados = db.execute(text("SELECT COUNT(*) FROM Emprestimos WHERE Livro_id = :id"),
+                             {"id": livro_id}).scalar()
+    finally:
+        db.close()
+
+    latencias = sorted(t for _, t in resultados)
+    print(f"{args.pedidos} pedidos em {duracao:.2f}s ({args.pedidos / duracao:.0f} req/s), "
+          f"p50 {latencias[len(latencias) // 2] * 1000:.1f} ms, p99 {latencias[int(len(latencias) * 0.99) - 1] * 1000:.1f} ms")
+    print(f"Empréstimos criados: {criados} (esperado {min(args.estoque, args.pedidos)}), estoque final: {estoque}")
+
+    if not args.manter:
+        limpar(usuario_id, livro_id)
+
+    ok = estoque >= 0 and criados == min(args.estoque, args.pedidos) and estoque == args.estoque - criados
+    print("OK" if ok else "FALHOU: estoque vendido além do disponível")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == '__main__':
+    main()
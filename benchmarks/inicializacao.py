@@ -0,0 +1,154 @@
+# Inicialização de um worker e isolamento das conexões após fork (gunicorn --preload).
+#
+#   python benchmarks/inicializacao.py --execucoes 5 --workers 4
+#
+# Em processos novos, mede o tempo de importar app.py, de create_app(), da primeira requisição
+# (GET /, sem banco) e da primeira consulta, e confere que create_app() não cria engines (nem o
+# do primário nem os das réplicas).
+# Depois simula o prefork: o processo pai cria a aplicação e usa o banco, faz fork de
+# --workers filhos e cada filho faz uma consulta. Nenhum filho pode usar a conexão herdada do
+# pai (nem, no MySQL, a de outro filho), e a do pai precisa continuar funcionando.
+#
+# Usa o banco configurado em DATABASE_URL; só executa SELECTs.
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+
+from sqlalchemy import text
+
+# app e database são importados dentro das funções: o tempo de importação faz parte da medição
+
+ETAPAS = ['importar', 'create_app', 'primeira_requisicao', 'primeira_consulta']
+
+
+# ID da conexão no servidor (MySQL); no SQLite cada processo abre o próprio arquivo e não há ID
+def identificar(db):
+    if db.get_bind().dialect.name != 'mysql':
+        return None
+    return db.execute(text("SELECT CONNECTION_ID()")).scalar()
+
+
+# Executado num processo novo (--medir-processo): imprime os tempos em JSON
+def medir_processo():
+    inicio = time.perf_counter()
+    import app as modulo_app
+    import database
+    from database import replicas
+    importado = time.perf_counter()
+    aplicacao = modulo_app.create_app()
+    criado = time.perf_counter()
+    engine_na_criacao = database._engine is not None or replicas._roteador is not None
+    aplicacao.test_client().get('/').close()
+    requisitado = time.perf_counter()
+    with aplicacao.app_context():
+        database.obter_sessao().execute(text("SELECT 1"))
+    consultado = time.perf_counter()
+    print(json.dumps({
+        "importar": importado - inicio,
+        "create_app": criado - importado,
+        "primeira_requisicao": requisitado - criado,
+        "primeira_consulta": consultado - requisitado,
+        "engine_na_criacao": engine_na_criacao,
+    }))
+
+
+def medir_processos_novos(execucoes):
+    medicoes = []
+    for _ in range(execucoes):
+        saida = subprocess.run([sys.executable, os.path.abspath(__file__), '--medir-processo'],
+                               capture_output=True, text=True, check=True, cwd=RAIZ)
+        medicoes.append(json.loads(saida.stdout.strip().splitlines()[-1]))
+
+    print(f"Processo novo (mediana de {execucoes} execuções):")
+    for etapa in ETAPAS:
+        valores = [medicao[etapa] * 1000 for medicao in medicoes]
+        print(f"  {etapa:<20} {statistics.median(valores):8.1f} ms  (máx. {max(valores):.1f} ms)")
+    criou = sum(medicao["engine_na_criacao"] for medicao in medicoes)
+    print(f"  engine criado por create_app(): {criou} de {execucoes} execuções")
+    return criou == 0
+
+
+def medir_prefork(workers):
+    from app import create_app
+    from database import obter_sessao
+
+    aplicacao = create_app()
+    with aplicacao.app_context():
+        db = obter_sessao()
+        id_pai = identificar(db)
+        # Referência mantida até o fim: os filhos comparam a própria conexão com esta
+        conexao_pai = db.connection().connection.driver_connection
+
+    filhos = []
+    for _ in range(workers):
+        leitura, escrita = os.pipe()
+        inicio = time.perf_counter()
+        pid = os.fork()
+        if pid == 0:
+            os.close(leitura)
+            try:
+                with aplicacao.app_context():
+                    db = obter_sessao()
+                    resultado = {
+                        "id": identificar(db),
+                        "herdada": db.connection().connection.driver_connection is conexao_pai,
+                        "primeira_consulta": time.perf_counter() - inicio,
+                    }
+            except Exception as erro:
+                resultado = {"erro": repr(erro)}
+            os.write(escrita, json.dumps(resultado).encode())
+            os._exit(0)
+        os.close(escrita)
+        filhos.append((pid, leitura))
+
+    ok = True
+    ids_vistos = {id_pai} if id_pai is not None else set()
+    print(f"Prefork: {workers} filho(s) do processo {os.getpid()} (conexão do pai: {id_pai or 'local'})")
+    for pid, leitura in filhos:
+        with os.fdopen(leitura) as canal:
+            resultado = json.loads(canal.read())
+        os.waitpid(pid, 0)
+        if "erro" in resultado:
+            ok = False
+            print(f"  filho {pid}: FALHOU {resultado['erro']}")
+            continue
+        repetida = resultado["id"] is not None and resultado["id"] in ids_vistos
+        ids_vistos.add(resultado["id"])
+        problema = resultado["herdada"] or repetida
+        ok = ok and not problema
+        print(f"  filho {pid}: conexão {resultado['id'] or 'própria'}, primeira consulta "
+              f"{resultado['primeira_consulta'] * 1000:.1f} ms  {'COMPARTILHADA' if problema else 'ok'}")
+
+    # Os filhos não podem ter fechado a conexão do pai ao descartar os pools herdados
+    with aplicacao.app_context():
+        db = obter_sessao()
+        mesma = db.connection().connection.driver_connection is conexao_pai
+        db.execute(text("SELECT 1"))
+    print(f"  pai continua consultando {'na mesma conexão' if mesma else 'numa conexão nova'}: ok")
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Inicialização de workers e conexões após fork.')
+    parser.add_argument('--execucoes', type=int, default=5, help='processos novos medidos')
+    parser.add_argument('--workers', type=int, default=4, help='filhos criados por fork')
+    parser.add_argument('--medir-processo', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.medir_processo:
+        medir_processo()
+        return
+    ok = medir_processos_novos(args.execucoes)
+    ok = medir_prefork(args.workers) and ok
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,117 @@
+# Vazão de login junto com tráfego normal de páginas: compara o hash de senha calculado na
+# thread da requisição (--processos 0) com o pool de processos de database/senhas.py.
+#
+#   python benchmarks/login_misto.py --duracao 10 --logins 8 --paginas 8 --processos 0,4
+#
+# Usa o banco configurado em DATABASE_URL; cria um usuário de teste e o remove no final.
+import argparse
+import os
+import sys
+import threading
+import time
+from datetime import date
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import text
+from werkzeug.security import generate_password_hash
+
+from app import create_app
+from database import Session
+from database import senhas
+
+app = create_app()
+
+SENHA = "senha-benchmark"
+
+
+def preparar():
+    db = Session()
+    try:
+        email = f"login-misto-{int(time.time() * 1000) % 10**9}@exemplo.com"
+        db.execute(text("""
+            INSERT INTO Usuarios (Nome_usuario, Email, Senha, Data_inscricao, Multa_atual)
+            VALUES ('Teste de login', :email, :senha, :hoje, 0)
+        """), {"email": email, "senha": generate_password_hash(SENHA, senhas.METODO_SENHA), "hoje": date.today()})
+        usuario_id = db.execute(text("SELECT ID_usuario FROM Usuarios WHERE Email = :email"),
+                                {"email": email}).scalar()
+        db.commit()
+        return usuario_id, email
+    finally:
+        db.close()
+
+
+def limpar(usuario_id):
+    db = Session()
+    try:
+        db.execute(text("DELETE FROM Usuarios WHERE ID_usuario = :id"), {"id": usuario_id})
+        db.commit()
+    finally:
+        db.close()
+
+
+def medir(processos, args, usuario_id, email):
+    senhas.pool_senhas.encerrar()
+    senhas.pool_senhas = senhas.PoolSenhas(processos=processos)
+    # Aquece o pool (inicia os processos) fora da medição
+    senhas.verificar_hash(generate_password_hash(SENHA, senhas.METODO_SENHA), SENHA)
+
+    prazo = time.perf_counter() + args.duracao
+    logins = {"ok": 0, "recusados": 0}
+    latencias_paginas = []
+    lock = threading.Lock()
+
+    def logar():
+        cliente = app.test_client()
+        while time.perf_counter() < prazo:
+            resposta = cliente.post('/login', data={"email": email, "senha": SENHA})
+            with lock:
+                logins["recusados" if resposta.status_code == 503 else "ok"] += 1
+
+    def navegar():
+        cliente = app.test_client()
+        with cliente.session_transaction() as sessao:
+            sessao['_user_id'] = str(usuario_id)
+        while time.perf_counter() < prazo:
+            inicio = time.perf_counter()
+            cliente.get(args.pagina)
+            with lock:
+                latencias_paginas.append(time.perf_counter() - inicio)
+
+    threads = [threading.Thread(target=logar) for _ in range(args.logins)]
+    threads += [threading.Thread(target=navegar) for _ in range(args.paginas)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    latencias_paginas.sort()
+    n = len(latencias_paginas)
+    p50 = latencias_paginas[n // 2] * 1000 if n else 0.0
+    p99 = latencias_paginas[max(0, int(n * 0.99) - 1)] * 1000 if n else 0.0
+    print(f"processos={processos:<2}  logins {logins['ok'] / args.duracao:7.1f}/s (503: {logins['recusados']})  "
+          f"{args.pagina} {n / args.duracao:7.1f} req/s  p50 {p50:7.1f} ms  p99 {p99:7.1f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Login concorrente com tráfego normal de páginas.')
+    parser.add_argument('--duracao', type=float, default=10, help='segundos por modo')
+    parser.add_argument('--logins', type=int, default=8, help='threads fazendo login')
+    parser.add_argument('--paginas', type=int, default=8, help='threads navegando')
+    parser.add_argument('--pagina', default='/dashboard')
+    parser.add_argument('--processos', default=f"0,{senhas.SENHA_PROCESSOS or 4}",
+                        help='modos a comparar: processos do pool (0 = na thread da requisição)')
+    args = parser.parse_args()
+
+    usuario_id, email = preparar()
+    try:
+        print(f"Método: {senhas.METODO_SENHA}, fila máxima: {senhas.SENHA_FILA_MAXIMA}")
+        for processos in [int(p) for p in args.processos.split(',')]:
+            medir(processos, args, usuario_id, email)
+    finally:
+        senhas.pool_senhas.encerrar()
+        limpar(usuario_id)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,340 @@
+# Benchmark das rotas principais com dados sintéticos: mede p50/p95/p99 e vazão de cada
+# cenário e compara com um baseline salvo.
+#
+#   python benchmarks/rotas.py --preparar --livros 100000 --usuarios 10000 --emprestimos 1000000
+#   python benchmarks/rotas.py --requisicoes 500 --concorrencia 16 --salvar-baseline benchmarks/baseline.json
+#   python benchmarks/rotas.py --baseline benchmarks/baseline.json
+#   python benchmarks/rotas.py --http --baseline benchmarks/baseline.json
+#
+# Sem --http as requisições passam pelo test client do Flask (sem rede). Com --http sobe um
+# servidor local com threads (ou usa --url) e dispara requisições HTTP reais em paralelo.
+# Usa o banco de DATABASE_URL; prefira um banco dedicado, pois os cenários gravam dados
+# (empréstimos, devoluções e livros adicionados, estes removidos ao final).
+import argparse
+import http.cookiejar
+import itertools
+import json
+import logging
+import math
+import os
+import random
+import sys
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import text, bindparam
+
+from app import create_app
+from database import Session
+from database.carga import gerar_catalogo_sintetico, SENHA_USUARIOS_SINTETICOS
+
+app = create_app()
+
+
+CENARIOS = ['dashboard', 'login', 'add_livro', 'emprestar', 'devolver',
+            'remover_genero', 'remover_autor', 'remover_editora']
+AMOSTRA_IDS = 1000
+
+
+class ClienteTeste:
+    def __init__(self, usuario_id):
+        self.cliente = app.test_client()
+        with self.cliente.session_transaction() as sessao:
+            sessao['_user_id'] = str(usuario_id)
+            sessao['_fresh'] = True
+
+    def requisitar(self, metodo, caminho, dados=None):
+        resposta = self.cliente.open(caminho, method=metodo, data=dados)
+        resposta.close()
+        return resposta.status_code
+
+
+class SemRedirecionar(urllib.request.HTTPRedirectHandler):
+    def redirect_request(self, *args, **kwargs):
+        return None
+
+
+class ClienteHttp:
+    def __init__(self, url, email):
+        self.url = url.rstrip('/')
+        self.abridor = urllib.request.build_opener(
+            urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()), SemRedirecionar)
+        self.requisitar('POST', '/login', {"email": email, "senha": SENHA_USUARIOS_SINTETICOS})
+
+    def requisitar(self, metodo, caminho, dados=None):
+        corpo = urllib.parse.urlencode(dados).encode() if dados is not None else None
+        pedido = urllib.request.Request(self.url + caminho, data=corpo, method=metodo)
+        try:
+            with self.abridor.open(pedido, timeout=30) as resposta:
+                resposta.read()
+                return resposta.status
+        except urllib.error.HTTPError as e:
+            e.read()
+            return e.code
+
+
+def consultar_ids(db, sql, **params):
+    return [linha[0] for linha in db.execute(text(sql), params)]
+
+
+# Ids usados pelos cenários: usuários sintéticos (um por worker), livros com estoque e
+# gêneros/autores/editoras com livros vinculados (a remoção é recusada, medindo só as verificações)
+def carregar_contexto(concorrencia):
+    db = Session()
+    try:
+        usuarios = db.execute(text("""
+            SELECT ID_usuario, Email FROM Usuarios
+            WHERE Email LIKE 'usuario%@exemplo.com'
+            ORDER BY ID_usuario
+            LIMIT :n
+        """), {"n": concorrencia}).fetchall()
+        if not usuarios:
+            raise SystemExit("Nenhum usuário sintético encontrado: rode com --preparar antes.")
+        contexto = {
+            "usuarios": [(linha.ID_usuario, linha.Email) for linha in usuarios],
+            "livros": consultar_ids(db, """
+                SELECT ID_livro FROM Livros WHERE Quantidade_disponivel > 0 ORDER BY ID_livro LIMIT :n
+            """, n=AMOSTRA_IDS),
+            "generos": consultar_ids(db, """
+                SELECT DISTINCT Genero_id FROM Livros WHERE Genero_id IS NOT NULL LIMIT :n
+            """, n=AMOSTRA_IDS),
+            "autores": consultar_ids(db, """
+                SELECT DISTINCT Autor_id FROM Livros WHERE Autor_id IS NOT NULL LIMIT :n
+            """, n=AMOSTRA_IDS),
+            "editoras": consultar_ids(db, """
+                SELECT DISTINCT Editora_id FROM Livros WHERE Editora_id IS NOT NULL LIMIT :n
+            """, n=AMOSTRA_IDS),
+            "maior_emprestimo": db.execute(text("SELECT COALESCE(MAX(ID_emprestimo), 0) FROM Emprestimos")).scalar(),
+            "marca": f"{int(time.time()) % 10**7:07d}",
+            "isbns": itertools.count(),
+        }
+        return contexto
+    finally:
+        db.close()
+
+
+# Empréstimos pendentes criados pelo cenário 'emprestar', agrupados pelo usuário dono
+def emprestimos_criados(contexto):
+    ids_usuarios = [usuario_id for usuario_id, _ in contexto["usuarios"]]
+    db = Session()
+    try:
+        linhas = db.execute(text("""
+            SELECT ID_emprestimo, Usuario_id FROM Emprestimos
+            WHERE ID_emprestimo > :maior AND Usuario_id IN :usuarios AND Status_emprestimo = 'pendente'
+        """).bindparams(bindparam("usuarios", expanding=True)),
+            {"maior": contexto["maior_emprestimo"], "usuarios": ids_usuarios}).fetchall()
+    finally:
+        db.close()
+    por_usuario = {}
+    for linha in linhas:
+        por_usuario.setdefault(linha.Usuario_id, []).append(linha.ID_emprestimo)
+    return por_usuario
+
+
+# Cada cenário devolve as requisições (método, caminho, dados) de um worker
+def montar_requisicoes(cenario, contexto, worker, quantidade, rng):
+    usuario_id, email = contexto["usuarios"][worker % len(contexto["usuarios"])]
+    requisicoes = []
+    for i in range(quantidade):
+        if cenario == 'dashboard':
+            requisicoes.append(('GET', '/dashboard', None))
+        elif cenario == 'login':
+            requisicoes.append(('POST', '/login', {"email": email, "senha": SENHA_USUARIOS_SINTETICOS}))
+        elif cenario == 'add_livro':
+            requisicoes.append(('POST', '/add_livro', {
+                "titulo": f"Livro de benchmark {worker}-{i}",
+                "isbn": f"7{contexto['marca']}{next(contexto['isbns']):05d}",
+                "ano": "2020",
+                "qtd": "3",
+                "resumo": "Livro criado pelo benchmark.",
+                "autor_id": rng.choice(contexto["autores"]),
+                "genero_id": rng.choice(contexto["generos"]),
+                "editora_id": rng.choice(contexto["editoras"]),
+            }))
+        elif cenario == 'emprestar':
+            requisicoes.append(('POST', f'/emprestar/{rng.choice(contexto["livros"])}', None))
+        elif cenario == 'devolver':
+            pendentes = contexto["pendentes"].get(usuario_id, [])
+            if i < len(pendentes):
+                requisicoes.append(('POST', f'/devolver/{pendentes[i]}', None))
+        elif cenario == 'remover_genero':
+            requisicoes.append(('POST', f'/remover_genero/{rng.choice(contexto["generos"])}', None))
+        elif cenario == 'remover_autor':
+            requisicoes.append(('POST', f'/remover_autor/{rng.choice(contexto["autores"])}', None))
+        elif cenario == 'remover_editora':
+            requisicoes.append(('POST', f'/remover_editora/{rng.choice(contexto["editoras"])}', None))
+    return requisicoes
+
+
+def percentil(valores, p):
+    if not valores:
+        return 0.0
+    return valores[max(0, math.ceil(p * len(valores)) - 1)]
+
+
+def executar_cenario(cenario, clientes, contexto, requisicoes, aquecimento, semente):
+    concorrencia = len(clientes)
+    por_worker = math.ceil(requisicoes / concorrencia)
+    latencias = [[] for _ in clientes]
+    erros = [0] * concorrencia
+
+    def worker(indice):
+        rng = random.Random(semente + indice)
+        cliente = clientes[indice]
+        # A quota de aquecimento vem antes e não é medida (exceto em 'devolver', em que cada
+        # empréstimo só pode ser devolvido uma vez)
+        lista = montar_requisicoes(cenario, contexto, indice, aquecimento + por_worker, rng)
+        for n, (metodo, caminho, dados) in enumerate(lista):
+            inicio = time.perf_counter()
+            status = cliente.requisitar(metodo, caminho, dados)
+            duracao = time.perf_counter() - inicio
+            if n < aquecimento and cenario != 'devolver':
+                continue
+            latencias[indice].append(duracao)
+            if status >= 400:
+                erros[indice] += 1
+
+    inicio = time.perf_counter()
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(concorrencia)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    duracao = time.perf_counter() - inicio
+
+    todas = sorted(t for lista in latencias for t in lista)
+    return {
+        "requisicoes": len(todas),
+        "erros": sum(erros),
+        "p50_ms": round(percentil(todas, 0.50) * 1000, 2),
+        "p95_ms": round(percentil(todas, 0.95) * 1000, 2),
+        "p99_ms": round(percentil(todas, 0.99) * 1000, 2),
+        "req_s": round(len(todas) / duracao, 1) if duracao else 0.0,
+    }
+
+
+def limpar(contexto):
+    db = Session()
+    try:
+        db.execute(text("DELETE FROM Livros WHERE ISBN LIKE :prefixo"), {"prefixo": f"7{contexto['marca']}%"})
+        db.commit()
+    finally:
+        db.close()
+
+
+def iniciar_servidor():
+    from werkzeug.serving import make_server
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+    servidor = make_server('127.0.0.1', 0, app, threaded=True)
+    threading.Thread(target=servidor.serve_forever, daemon=True).start()
+    return f"http://127.0.0.1:{servidor.server_port}"
+
+
+# Regressão: p95 acima ou vazão abaixo do baseline além da tolerância
+def comparar(resultados, baseline, tolerancia):
+    regressoes = []
+    for cenario, atual in resultados.items():
+        anterior = baseline.get("cenarios", {}).get(cenario)
+        if not anterior:
+            continue
+        p95 = atual["p95_ms"] / anterior["p95_ms"] - 1 if anterior["p95_ms"] else 0.0
+        vazao = atual["req_s"] / anterior["req_s"] - 1 if anterior["req_s"] else 0.0
+        marca = ""
+        if p95 > tolerancia or vazao < -tolerancia:
+            regressoes.append(cenario)
+            marca = "  <- REGRESSÃO"
+        print(f"{cenario:16} p95 {p95:+7.1%}  req/s {vazao:+7.1%}{marca}")
+    return regressoes
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark das rotas principais com dados sintéticos.')
+    parser.add_argument('--preparar', action='store_true', help='gera o catálogo sintético antes de medir')
+    parser.add_argument('--autores', type=int, default=1000)
+    parser.add_argument('--generos', type=int, default=50)
+    parser.add_argument('--editoras', type=int, default=200)
+    parser.add_argument('--livros', type=int, default=100000)
+    parser.add_argument('--usuarios', type=int, default=10000)
+    parser.add_argument('--emprestimos', type=int, default=1000000)
+    parser.add_argument('--cenarios', default=','.join(CENARIOS), help='lista separada por vírgulas')
+    parser.add_argument('--requisicoes', type=int, default=500, help='requisições medidas por cenário')
+    parser.add_argument('--concorrencia', type=int, default=8)
+    parser.add_argument('--aquecimento', type=int, default=5, help='requisições por worker não medidas')
+    parser.add_argument('--http', action='store_true', help='usa HTTP real em vez do test client')
+    parser.add_argument('--url', help='servidor já em execução (implica --http)')
+    parser.add_argument('--semente', type=int, default=42)
+    parser.add_argument('--saida', help='grava os resultados em JSON')
+    parser.add_argument('--baseline', help='compara com um resultado salvo')
+    parser.add_argument('--salvar-baseline', help='grava os resultados como novo baseline')
+    parser.add_argument('--tolerancia', type=float, default=0.2, help='variação aceita (0.2 = 20%%)')
+    parser.add_argument('--manter', action='store_true', help='não remove os livros criados')
+    args = parser.parse_args()
+
+    cenarios = [c.strip() for c in args.cenarios.split(',') if c.strip()]
+    desconhecidos = set(cenarios) - set(CENARIOS)
+    if desconhecidos:
+        parser.error(f"cenários desconhecidos: {', '.join(sorted(desconhecidos))}")
+
+    if args.preparar:
+        db = Session()
+        try:
+            gerar_catalogo_sintetico(db, args.autores, args.generos, args.editoras, args.livros,
+                                     args.usuarios, args.emprestimos, semente=args.semente)
+        finally:
+            db.close()
+
+    contexto = carregar_contexto(args.concorrencia)
+    usar_http = args.http or args.url
+    if usar_http:
+        url = args.url or iniciar_servidor()
+        clientes = [ClienteHttp(url, contexto["usuarios"][i % len(contexto["usuarios"])][1])
+                    for i in range(args.concorrencia)]
+    else:
+        clientes = [ClienteTeste(contexto["usuarios"][i % len(contexto["usuarios"])][0])
+                    for i in range(args.concorrencia)]
+
+    resultados = {}
+    try:
+        for cenario in cenarios:
+            if cenario == 'devolver':
+                contexto["pendentes"] = emprestimos_criados(contexto)
+            resultados[cenario] = executar_cenario(cenario, clientes, contexto, args.requisicoes,
+                                                   args.aquecimento, args.semente)
+            r = resultados[cenario]
+            print(f"{cenario:16} {r['requisicoes']:6} req  p50 {r['p50_ms']:8.2f} ms  p95 {r['p95_ms']:8.2f} ms  "
+                  f"p99 {r['p99_ms']:8.2f} ms  {r['req_s']:8.1f} req/s  erros {r['erros']}")
+    finally:
+        if not args.manter:
+            limpar(contexto)
+
+    relatorio = {
+        "modo": "http" if usar_http else "test_client",
+        "concorrencia": args.concorrencia,
+        "requisicoes": args.requisicoes,
+        "gerado_em": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "cenarios": resultados,
+    }
+    for destino in (args.saida, args.salvar_baseline):
+        if destino:
+            with open(destino, 'w', encoding='utf-8') as arquivo:
+                json.dump(relatorio, arquivo, indent=2, ensure_ascii=False)
+
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as arquivo:
+            baseline = json.load(arquivo)
+        if baseline.get("modo") != relatorio["modo"] or baseline.get("concorrencia") != args.concorrencia:
+            print("Aviso: baseline medido com outro modo/concorrência.")
+        regressoes = comparar(resultados, baseline, args.tolerancia)
+        if regressoes:
+            print(f"FALHOU: regressão em {', '.join(regressoes)}")
+            sys.exit(1)
+        print("OK")
+
+
+if __name__ == '__main__':
+    main()
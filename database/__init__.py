@@ -1,5 +1,277 @@
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
+import logging
+import os
+import threading
+import time
+import weakref
 
-engine = create_engine('mysql+pymysql://root:@localhost/db_trabalho3b')
-Session = sessionmaker(bind=engine)
\ No newline at end of file
+from flask import g, has_app_context
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import make_url
+from sqlalchemy.orm import Session as SessaoORM, sessionmaker
+from sqlalchemy.pool import StaticPool
+
+logger = logging.getLogger(__name__)
+
+
+def _env_bool(nome, padrao):
+    valor = os.environ.get(nome)
+    if valor is None:
+        return padrao
+    return valor.strip().lower() in ('1', 'true', 'sim', 'yes', 'on')
+
+
+# MySQL por padrão; com uma URL sqlite:///caminho.db o banco é um arquivo local (ver criar_engine).
+# create_app(config) pode trocar a URL com DATABASE_URL na configuração (ver configurar_banco).
+DATABASE_URL = os.environ.get('DATABASE_URL', 'mysql+pymysql://root:@localhost/db_trabalho3b')
+
+# Configuração do pool de conexões (variáveis de ambiente DB_POOL_*)
+POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', 10))
+POOL_MAX_OVERFLOW = int(os.environ.get('DB_POOL_MAX_OVERFLOW', 20))
+POOL_RECYCLE = int(os.environ.get('DB_POOL_RECYCLE', 1800))
+POOL_PRE_PING = _env_bool('DB_POOL_PRE_PING', True)
+POOL_TIMEOUT = float(os.environ.get('DB_POOL_TIMEOUT', 10))
+# Esperas por conexão acima deste limite (ms) são registradas no log
+POOL_ALERTA_ESPERA_MS = float(os.environ.get('DB_POOL_ALERTA_ESPERA_MS', 50))
+# Consultas acima deste limite (ms) vão para o log de consultas lentas, com SQL e parâmetros
+CONSULTA_LENTA_MS = float(os.environ.get('DB_CONSULTA_LENTA_MS', 200))
+# Os parâmetros podem conter dados pessoais (e-mails, hashes de senha): desligue com 0
+CONSULTA_LENTA_PARAMETROS = _env_bool('DB_CONSULTA_LENTA_PARAMETROS', True)
+TAMANHO_MAXIMO_LOG_PARAMETROS = 500
+# SQLite: tempo (ms) que uma escrita espera outra terminar antes de falhar com "database is locked"
+SQLITE_BUSY_TIMEOUT_MS = int(os.environ.get('DB_SQLITE_BUSY_TIMEOUT_MS', 5000))
+
+
+# Cada conexão SQLite usa WAL (leitores não bloqueiam a escrita nem são bloqueados por ela),
+# fsync só nos checkpoints e chaves estrangeiras verificadas, como no InnoDB
+def configurar_sqlite(conexao_dbapi, registro_conexao):
+    cursor = conexao_dbapi.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute("PRAGMA foreign_keys=ON")
+    cursor.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}")
+    cursor.close()
+
+
+# Engines criados pelo processo (primário e réplicas), para descartar os pools após um fork
+_engines = weakref.WeakSet()
+
+
+def criar_engine(url):
+    url = make_url(url)
+    if url.get_backend_name() != 'sqlite':
+        novo_engine = create_engine(
+            url,
+            pool_size=POOL_SIZE,
+            max_overflow=POOL_MAX_OVERFLOW,
+            pool_recycle=POOL_RECYCLE,
+            pool_pre_ping=POOL_PRE_PING,
+            pool_timeout=POOL_TIMEOUT,
+        )
+        _engines.add(novo_engine)
+        return novo_engine
+    # Arquivo local: sem servidor, reciclagem ou pre-ping; as conexões circulam entre as
+    # threads das requisições, por isso check_same_thread=False. Um banco em memória
+    # (sqlite://) só existe dentro da conexão, então todas as threads compartilham a mesma.
+    connect_args = {'check_same_thread': False, 'timeout': SQLITE_BUSY_TIMEOUT_MS / 1000}
+    if url.database in (None, '', ':memory:'):
+        novo_engine = create_engine(url, connect_args=connect_args, poolclass=StaticPool)
+    else:
+        novo_engine = create_engine(
+            url,
+            pool_size=POOL_SIZE,
+            max_overflow=POOL_MAX_OVERFLOW,
+            pool_timeout=POOL_TIMEOUT,
+            connect_args=connect_args,
+        )
+    event.listen(novo_engine, 'connect', configurar_sqlite)
+    _engines.add(novo_engine)
+    return novo_engine
+
+
+# Processo filho de um fork (gunicorn --preload, multiprocessing) herda os pools do pai com
+# os sockets abertos; dois processos usando a mesma conexão corrompem o protocolo. O filho
+# descarta os pools herdados sem fechar as conexões (que continuam sendo do pai) e abre as suas.
+# No Windows não há fork nem os.register_at_fork.
+def _descartar_pools_herdados():
+    for engine_herdado in list(_engines):
+        engine_herdado.dispose(close=False)
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_descartar_pools_herdados)
+
+
+# Engine do primário, criado no primeiro uso (primeira requisição, comando ou tarefa), e não
+# na importação: o processo que só monta a aplicação (mestre do gunicorn) não conecta nem
+# carrega o driver do banco.
+_engine = None
+_url_engine = DATABASE_URL
+_lock_engine = threading.Lock()
+
+
+def configurar_banco(url):
+    global _engine, _url_engine
+    with _lock_engine:
+        if url == _url_engine:
+            return
+        if _engine is not None:
+            _engine.dispose()
+            _engine = None
+        _url_engine = url
+
+
+def obter_engine():
+    global _engine
+    if _engine is None:
+        with _lock_engine:
+            if _engine is None:
+                novo_engine = criar_engine(_url_engine)
+                instrumentar(novo_engine)
+                _engine = novo_engine
+    return _engine
+
+
+# Sessões sem bind explícito usam o primário
+class SessaoPrimario(SessaoORM):
+    def __init__(self, bind=None, **kwargs):
+        super().__init__(bind=bind if bind is not None else obter_engine(), **kwargs)
+
+
+Session = sessionmaker(class_=SessaoPrimario)
+
+
+# Tempo de espera para obter uma conexão do pool, acumulado por processo
+class EsperaPool:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.checkouts = 0
+        self.total_segundos = 0.0
+        self.maior_segundos = 0.0
+
+    def registrar(self, segundos):
+        with self._lock:
+            self.checkouts += 1
+            self.total_segundos += segundos
+            self.maior_segundos = max(self.maior_segundos, segundos)
+        if segundos * 1000 >= POOL_ALERTA_ESPERA_MS:
+            logger.warning("Espera de %.1f ms por conexão do pool (%s)", segundos * 1000, obter_engine().pool.status())
+
+    def resumo(self):
+        with self._lock:
+            media = self.total_segundos / self.checkouts if self.checkouts else 0.0
+            return {
+                "checkouts": self.checkouts,
+                "espera_media_ms": media * 1000,
+                "espera_maxima_ms": self.maior_segundos * 1000,
+                "pool": obter_engine().pool.status(),
+            }
+
+
+espera_pool = EsperaPool()
+
+
+# Totais de consultas SQL do processo; os totais por requisição ficam em g
+class EstatisticasConsultas:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.consultas = 0
+        self.lentas = 0
+        self.total_segundos = 0.0
+
+    def registrar(self, segundos, lenta):
+        with self._lock:
+            self.consultas += 1
+            self.total_segundos += segundos
+            if lenta:
+                self.lentas += 1
+
+
+estatisticas_consultas = EstatisticasConsultas()
+# Threads sem contexto da aplicação (consultas paralelas) acumulam aqui, quando ativado
+medicao_thread = threading.local()
+logger_consultas_lentas = logging.getLogger(__name__ + '.consultas_lentas')
+
+
+def _iniciar_consulta(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('inicio_consultas', []).append(time.perf_counter())
+
+
+def _finalizar_consulta(conn, cursor, statement, parameters, context, executemany):
+    duracao = time.perf_counter() - conn.info['inicio_consultas'].pop()
+    lenta = duracao * 1000 >= CONSULTA_LENTA_MS
+    estatisticas_consultas.registrar(duracao, lenta)
+    if has_app_context():
+        g.consultas_sql = g.get('consultas_sql', 0) + 1
+        g.tempo_sql = g.get('tempo_sql', 0.0) + duracao
+    elif getattr(medicao_thread, 'consultas', None) is not None:
+        medicao_thread.consultas += 1
+        medicao_thread.tempo += duracao
+    if lenta:
+        parametros = repr(parameters) if CONSULTA_LENTA_PARAMETROS else '(omitidos)'
+        if len(parametros) > TAMANHO_MAXIMO_LOG_PARAMETROS:
+            parametros = parametros[:TAMANHO_MAXIMO_LOG_PARAMETROS] + '...'
+        logger_consultas_lentas.warning("Consulta lenta (%.1f ms): %s | parâmetros: %s",
+                                        duracao * 1000, ' '.join(statement.split()), parametros)
+
+
+# Consulta que falhou não passa por after_cursor_execute: descarta o início registrado
+def _descartar_consulta_com_erro(contexto):
+    conexao = contexto.connection
+    if conexao is not None and conexao.info.get('inicio_consultas'):
+        conexao.info['inicio_consultas'].pop()
+
+
+# Medição de tempo e consultas lentas; aplicada também aos engines das réplicas
+def instrumentar(engine_alvo):
+    event.listen(engine_alvo, 'before_cursor_execute', _iniciar_consulta)
+    event.listen(engine_alvo, 'after_cursor_execute', _finalizar_consulta)
+    event.listen(engine_alvo, 'handle_error', _descartar_consulta_com_erro)
+
+
+# Sessão única por requisição: criada no primeiro uso (load_user ou view) e
+# encerrada no teardown_appcontext. Requisições de leitura usam uma réplica saudável,
+# quando configurada (ver database/replicas.py).
+def obter_sessao():
+    if 'db' not in g:
+        from .replicas import obter_roteador
+        replica = obter_roteador().replica_para_requisicao()
+        sessao = Session(bind=replica.engine) if replica else Session()
+        sessao.info['requisicao'] = True
+        sessao.info['replica'] = replica
+        inicio = time.perf_counter()
+        sessao.connection()
+        espera_pool.registrar(time.perf_counter() - inicio)
+        g.db = sessao
+    return g.db
+
+
+def encerrar_sessao(erro=None):
+    sessao = g.pop('db', None)
+    if sessao is None:
+        return
+    try:
+        if erro is not None:
+            sessao.rollback()
+    finally:
+        sessao.close()
+
+
+# Commit da sessão da requisição no primário: o usuário passa a ler do primário por
+# alguns segundos (ver fixar_primario), para ver as próprias alterações.
+@event.listens_for(SessaoORM, 'after_commit')
+def _registrar_escrita(sessao):
+    if sessao.info.get('requisicao') and sessao.info.get('replica') is None and has_app_context():
+        g.escreveu_no_primario = True
+
+
+def fixar_primario(resposta):
+    if g.get('escreveu_no_primario'):
+        from .replicas import fixar_no_primario
+        fixar_no_primario()
+    return resposta
+
+
+def init_app(app):
+    configurar_banco(app.config.get('DATABASE_URL', DATABASE_URL))
+    app.after_request(fixar_primario)
+    app.teardown_appcontext(encerrar_sessao)
@@ -0,0 +1,637 @@
+import atexit
+import gzip
+import json
+import logging
+import os
+import socket
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta
+
+import click
+from sqlalchemy import event, select, text, bindparam
+from sqlalchemy.orm import Session as SessaoORM
+
+from . import obter_engine
+from .repositorio import emprestimos, usuarios
+
+logger = logging.getLogger(__name__)
+
+DESTINO_ARQUIVO = os.environ.get('AUDITORIA_ARQUIVO_DIR', 'arquivo/auditoria')
+RETER_MESES = int(os.environ.get('AUDITORIA_RETER_MESES', 12))
+MESES_FUTUROS = 3
+LINHAS_POR_LOTE = 5000
+
+COLUNAS = ["id_log", "tabela_afetada", "operacao", "id_registro_afetado", "valor_antigo", "valor_novo", "data_hora"]
+
+
+# Auditoria_Log é particionada por mês (RANGE em UNIX_TIMESTAMP(data_hora), migração 0004).
+# Cada partição pAAAAMM guarda um mês; pmax recebe o que estiver além da última partição.
+
+def somar_meses(dia, meses):
+    total = dia.year * 12 + dia.month - 1 + meses
+    return date(total // 12, total % 12 + 1, 1)
+
+
+def nome_particao(mes):
+    return f"p{mes.year:04d}{mes.month:02d}"
+
+
+def definicao_particao(mes):
+    fim = somar_meses(mes, 1)
+    return f"PARTITION {nome_particao(mes)} VALUES LESS THAN (UNIX_TIMESTAMP('{fim.isoformat()} 00:00:00'))"
+
+
+def tabela_particionada(conn):
+    if conn.dialect.name != 'mysql':
+        return False
+    return conn.execute(text("""
+        SELECT COUNT(*) FROM information_schema.PARTITIONS
+        WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'Auditoria_Log' AND PARTITION_NAME IS NOT NULL
+    """)).scalar() > 0
+
+
+# Partições mensais existentes, em ordem: [(nome, primeiro dia do mês, linhas estimadas)]
+def listar_particoes(conn):
+    linhas = conn.execute(text("""
+        SELECT PARTITION_NAME, TABLE_ROWS
+        FROM information_schema.PARTITIONS
+        WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'Auditoria_Log' AND PARTITION_NAME IS NOT NULL
+        ORDER BY PARTITION_ORDINAL_POSITION
+    """)).fetchall()
+    particoes = []
+    for linha in linhas:
+        if linha.PARTITION_NAME == 'pmax':
+            continue
+        mes = date(int(linha.PARTITION_NAME[1:5]), int(linha.PARTITION_NAME[5:7]), 1)
+        particoes.append((linha.PARTITION_NAME, mes, linha.TABLE_ROWS))
+    return particoes
+
+
+# Garante partições até `meses` à frente, dividindo pmax (que fica vazia enquanto houver folga)
+def criar_particoes_futuras(conn, meses=MESES_FUTUROS, hoje=None):
+    hoje = hoje or date.today()
+    particoes = listar_particoes(conn)
+    ultimo = particoes[-1][1] if particoes else somar_meses(hoje, -1)
+    alvo = somar_meses(date(hoje.year, hoje.month, 1), meses)
+
+    novas = []
+    mes = somar_meses(ultimo, 1)
+    while mes <= alvo:
+        novas.append(definicao_particao(mes))
+        mes = somar_meses(mes, 1)
+    if novas:
+        conn.execute(text(
+            f"ALTER TABLE Auditoria_Log REORGANIZE PARTITION pmax INTO "
+            f"({', '.join(novas)}, PARTITION pmax VALUES LESS THAN MAXVALUE)"
+        ))
+    return len(novas)
+
+
+def caminho_arquivo(destino, mes):
+    return os.path.join(destino, f"{mes.year:04d}", f"{mes.month:02d}.jsonl.gz")
+
+
+# Grava as linhas do mês em um arquivo JSON Lines compactado (gzip), com escrita atômica:
+# o arquivo final só aparece depois de completo e sincronizado em disco.
+def arquivar_mes(conn, mes, destino, particao=None):
+    caminho = caminho_arquivo(destino, mes)
+    os.makedirs(os.path.dirname(caminho), exist_ok=True)
+    temporario = caminho + ".tmp"
+
+    origem = f"Auditoria_Log PARTITION ({particao})" if particao else "Auditoria_Log"
+    resultado = conn.execution_options(stream_results=True, yield_per=LINHAS_POR_LOTE).execute(text(f"""
+        SELECT {', '.join(COLUNAS)}
+        FROM {origem}
+        WHERE data_hora >= :inicio AND data_hora < :fim
+        ORDER BY id_log
+    """), {"inicio": datetime.combine(mes, datetime.min.time()),
+           "fim": datetime.combine(somar_meses(mes, 1), datetime.min.time())})
+
+    total = 0
+    with open(temporario, 'wb') as bruto:
+        with gzip.GzipFile(fileobj=bruto, mode='wb') as arquivo:
+            for lote in resultado.partitions():
+                for linha in lote:
+                    registro = json.dumps(dict(zip(COLUNAS, linha)), default=str, ensure_ascii=False)
+                    arquivo.write(registro.encode('utf-8') + b"\n")
+                    total += 1
+        bruto.flush()
+        os.fsync(bruto.fileno())
+    os.replace(temporario, caminho)
+    return caminho, total
+
+
+def contar_mes(conn, mes):
+    return conn.execute(text("""
+        SELECT COUNT(*) FROM Auditoria_Log WHERE data_hora >= :inicio AND data_hora < :fim
+    """), {"inicio": datetime.combine(mes, datetime.min.time()),
+           "fim": datetime.combine(somar_meses(mes, 1), datetime.min.time())}).scalar()
+
+
+# Arquiva e remove os meses anteriores à janela de retenção. Com partições, a remoção é um
+# DROP PARTITION (O(1)); sem elas (tabela ainda não migrada), apaga em lotes por id_log.
+def aplicar_retencao(reter_meses=RETER_MESES, destino=DESTINO_ARQUIVO, hoje=None, log=logger.info):
+    hoje = hoje or date.today()
+    limite = somar_meses(date(hoje.year, hoje.month, 1), -reter_meses)
+    arquivados = []
+
+    with obter_engine().connect() as conn:
+        if tabela_particionada(conn):
+            for particao, mes, _ in listar_particoes(conn):
+                if mes >= limite:
+                    break
+                caminho, total = arquivar_mes(conn, mes, destino, particao=particao)
+                conn.commit()
+                conn.execute(text(f"ALTER TABLE Auditoria_Log DROP PARTITION {particao}"))
+                log(f"{particao}: {total} registro(s) arquivados em {caminho} e partição removida")
+                arquivados.append((mes, total, caminho))
+            criadas = criar_particoes_futuras(conn, hoje=hoje)
+            if criadas:
+                log(f"{criadas} partição(ões) futura(s) criada(s)")
+            return arquivados
+
+        mais_antigo = conn.execute(text("SELECT MIN(data_hora) FROM Auditoria_Log")).scalar()
+        if mais_antigo is None:
+            return arquivados
+        if isinstance(mais_antigo, str):
+            mais_antigo = datetime.fromisoformat(mais_antigo)
+        mes = date(mais_antigo.year, mais_antigo.month, 1)
+        while mes < limite:
+            if contar_mes(conn, mes):
+                caminho, total = arquivar_mes(conn, mes, destino)
+                conn.commit()
+                apagar_mes(conn, mes)
+                log(f"{mes:%Y-%m}: {total} registro(s) arquivados em {caminho} e removidos")
+                arquivados.append((mes, total, caminho))
+            mes = somar_meses(mes, 1)
+    return arquivados
+
+
+def apagar_mes(conn, mes):
+    selecionar = text("""
+        SELECT id_log FROM Auditoria_Log
+        WHERE data_hora >= :inicio AND data_hora < :fim
+        ORDER BY id_log
+        LIMIT :lote
+    """)
+    apagar = text("DELETE FROM Auditoria_Log WHERE id_log IN :ids").bindparams(bindparam("ids", expanding=True))
+    params = {"inicio": datetime.combine(mes, datetime.min.time()),
+              "fim": datetime.combine(somar_meses(mes, 1), datetime.min.time()),
+              "lote": LINHAS_POR_LOTE}
+    while True:
+        ids = [linha[0] for linha in conn.execute(selecionar, params)]
+        if not ids:
+            break
+        conn.execute(apagar, {"ids": ids})
+        conn.commit()
+
+
+# Auditoria pela aplicação (AUDITORIA_MODO=aplicacao)
+#
+# No lugar dos gatilhos tr_auditoria_*, as rotas e comandos de escrita registram o que
+# alteraram com auditar(). Os registros de cada transação vão para um segmento de spool local
+# antes do commit, com fsync: uma queda do processo depois do commit não perde nada (uma queda
+# entre o fsync e o commit pode deixar um registro de uma alteração que não aconteceu). Se o
+# commit falhar, o lote é cancelado no próprio segmento. Uma thread por processo grava os
+# segmentos em Auditoria_Log com INSERTs de várias linhas quando o spool chega a AUDITORIA_LOTE
+# registros ou a cada AUDITORIA_INTERVALO segundos. O nome do segmento entra em
+# Auditoria_segmentos na mesma transação das linhas, então nenhum segmento é gravado duas vezes.
+#
+# Cada processo escreve no próprio segmento, travado com flock enquanto está aberto. Segmentos
+# sem trava (fechados, ou de um processo que caiu) são gravados por qualquer processo.
+
+MODOS = ('gatilhos', 'aplicacao')
+AUDITORIA_MODO = os.environ.get('AUDITORIA_MODO', 'gatilhos')
+AUDITORIA_SPOOL_DIR = os.environ.get('AUDITORIA_SPOOL_DIR', 'spool/auditoria')
+AUDITORIA_LOTE = int(os.environ.get('AUDITORIA_LOTE', 500))
+AUDITORIA_INTERVALO = float(os.environ.get('AUDITORIA_INTERVALO', 2))
+# Mesmo valor do gatilho trg_emprestimo_multa_atraso
+MULTA_POR_ATRASO = 10
+
+
+def auditoria_na_aplicacao():
+    return AUDITORIA_MODO == 'aplicacao'
+
+
+def registro_auditoria(tabela, operacao, registro_id, valor_antigo=None, valor_novo=None):
+    return {"tabela_afetada": tabela, "operacao": operacao, "id_registro_afetado": registro_id,
+            "valor_antigo": valor_antigo, "valor_novo": valor_novo,
+            "data_hora": datetime.now().strftime('%Y-%m-%d %H:%M:%S')}
+
+
+# Lotes de um segmento que não foram cancelados, na ordem em que foram escritos. Uma linha
+# incompleta no fim (queda durante a escrita, antes do fsync e portanto do commit) é ignorada.
+def ler_segmento(arquivo):
+    lotes = {}
+    for linha in arquivo:
+        try:
+            entrada = json.loads(linha)
+        except ValueError:
+            continue
+        if 'cancelar' in entrada:
+            lotes.pop(entrada['cancelar'], None)
+        else:
+            lotes[entrada['lote']] = entrada['registros']
+    return [registro for registros in lotes.values() for registro in registros]
+
+
+def gravar_segmento(nome, registros):
+    with obter_engine().begin() as conn:
+        ja_gravado = conn.execute(text("SELECT 1 FROM Auditoria_segmentos WHERE Segmento = :segmento"),
+                                  {"segmento": nome}).first()
+        if ja_gravado:
+            return 0
+        inserir = text("""
+            INSERT INTO Auditoria_Log (tabela_afetada, operacao, id_registro_afetado, valor_antigo, valor_novo, data_hora)
+            VALUES (:tabela_afetada, :operacao, :id_registro_afetado, :valor_antigo, :valor_novo, :data_hora)
+        """)
+        for inicio in range(0, len(registros), LINHAS_POR_LOTE):
+            conn.execute(inserir, registros[inicio:inicio + LINHAS_POR_LOTE])
+        conn.execute(text("INSERT INTO Auditoria_segmentos (Segmento, Registros) VALUES (:segmento, :registros)"),
+                     {"segmento": nome, "registros": len(registros)})
+    return len(registros)
+
+
+# Trava exclusiva do segmento, sem esperar: BlockingIOError se outro processo a tiver. fcntl
+# só existe em POSIX e só é importado quando o spool é usado (AUDITORIA_MODO=aplicacao), para
+# que o modo gatilhos funcione também no Windows.
+def travar_segmento(arquivo):
+    import fcntl
+    fcntl.flock(arquivo, fcntl.LOCK_EX | fcntl.LOCK_NB)
+
+
+class SpoolAuditoria:
+    def __init__(self, diretorio=AUDITORIA_SPOOL_DIR, lote=AUDITORIA_LOTE, intervalo=AUDITORIA_INTERVALO):
+        self.diretorio = diretorio
+        self.lote = lote
+        self.intervalo = intervalo
+        self._arquivo = None
+        self._pid = None
+        self._registros = 0
+        # Lotes escritos cujo commit ainda não terminou: o segmento só fecha sem nenhum, para
+        # que um cancelamento caia no mesmo segmento do lote
+        self._em_andamento = set()
+        self._fechando = False
+        self._condicao = threading.Condition()
+        self._acordar = threading.Event()
+
+    # Thread de gravação deste processo. Num processo filho após fork, o segmento herdado
+    # continua sendo do processo pai: o filho abre o seu e inicia a própria thread.
+    def iniciar(self):
+        with self._condicao:
+            if self._pid == os.getpid():
+                return
+            self._arquivo, self._registros, self._em_andamento = None, 0, set()
+            self._pid = os.getpid()
+            threading.Thread(target=self._gravar_sempre, name='spool-auditoria', daemon=True).start()
+
+    def _segmento(self):
+        self.iniciar()
+        if self._arquivo is None:
+            os.makedirs(self.diretorio, exist_ok=True)
+            nome = f"{socket.gethostname()}-{os.getpid()}-{time.time_ns()}.jsonl"
+            self._arquivo = open(os.path.join(self.diretorio, nome), 'ab')
+            travar_segmento(self._arquivo)
+        return self._arquivo
+
+    def _escrever(self, entrada):
+        arquivo = self._segmento()
+        arquivo.write(json.dumps(entrada, ensure_ascii=False, default=str).encode('utf-8') + b"\n")
+        arquivo.flush()
+        os.fsync(arquivo.fileno())
+
+    # Chamado antes do commit; devolve o identificador do lote para confirmar() ou cancelar()
+    def gravar(self, registros):
+        lote = uuid.uuid4().hex
+        with self._condicao:
+            while self._fechando:
+                self._condicao.wait()
+            self._escrever({"lote": lote, "registros": registros})
+            self._em_andamento.add(lote)
+            self._registros += len(registros)
+            cheio = self._registros >= self.lote
+        if cheio:
+            self._acordar.set()
+        return lote
+
+    def confirmar(self, lote):
+        with self._condicao:
+            self._em_andamento.discard(lote)
+            self._condicao.notify_all()
+
+    def cancelar(self, lote):
+        with self._condicao:
+            if lote in self._em_andamento:
+                self._escrever({"cancelar": lote})
+                self._em_andamento.discard(lote)
+            self._condicao.notify_all()
+
+    # Fecha o segmento atual (liberando a trava) para que ele possa ser gravado no banco
+    def _fechar_segmento(self):
+        with self._condicao:
+            if self._arquivo is None or self._pid != os.getpid():
+                return
+            self._fechando = True
+            try:
+                while self._em_andamento:
+                    self._condicao.wait()
+                self._arquivo.close()
+                self._arquivo, self._registros = None, 0
+            finally:
+                self._fechando = False
+                self._condicao.notify_all()
+
+    def _gravar_arquivo(self, caminho):
+        try:
+            arquivo = open(caminho, 'rb')
+        except FileNotFoundError:
+            return 0
+        with arquivo:
+            try:
+                travar_segmento(arquivo)
+            except BlockingIOError:
+                return 0
+            # Outro processo gravou e removeu o segmento enquanto esperávamos a trava
+            if os.fstat(arquivo.fileno()).st_nlink == 0:
+                return 0
+            registros = ler_segmento(arquivo)
+            total = gravar_segmento(os.path.basename(caminho), registros) if registros else 0
+            os.remove(caminho)
+        return total
+
+    # Grava no banco todos os segmentos disponíveis, inclusive o atual; devolve os registros gravados
+    def descarregar(self):
+        self._fechar_segmento()
+        if not os.path.isdir(self.diretorio):
+            return 0
+        total = 0
+        for nome in sorted(os.listdir(self.diretorio)):
+            if nome.endswith('.jsonl'):
+                total += self._gravar_arquivo(os.path.join(self.diretorio, nome))
+        return total
+
+    def _gravar_sempre(self):
+        while True:
+            self._acordar.wait(self.intervalo)
+            self._acordar.clear()
+            try:
+                self.descarregar()
+            except Exception:
+                logger.exception("Falha ao gravar o spool de auditoria")
+
+    def pendentes(self):
+        if not os.path.isdir(self.diretorio):
+            return 0, 0
+        segmentos = [nome for nome in os.listdir(self.diretorio) if nome.endswith('.jsonl')]
+        registros = 0
+        for nome in segmentos:
+            try:
+                with open(os.path.join(self.diretorio, nome), 'rb') as arquivo:
+                    registros += len(ler_segmento(arquivo))
+            except FileNotFoundError:
+                pass
+        return len(segmentos), registros
+
+
+spool = SpoolAuditoria()
+
+
+@atexit.register
+def _descarregar_ao_sair():
+    if spool._pid == os.getpid():
+        try:
+            spool.descarregar()
+        except Exception:
+            logger.exception("Falha ao gravar o spool de auditoria no encerramento")
+
+
+# Com AUDITORIA_MODO=aplicacao a thread começa na primeira requisição de cada processo (não
+# no mestre do gunicorn --preload, que só cria a aplicação), gravando também os segmentos
+# deixados por processos que caíram
+def _garantir_spool():
+    if spool._pid != os.getpid():
+        spool.iniciar()
+
+
+def configurar_auditoria(app):
+    if auditoria_na_aplicacao() and not app.config.get('TESTING'):
+        app.before_request(_garantir_spool)
+
+
+# Registra uma alteração feita pela sessão `db`; vai para o spool no commit e é descartada
+# no rollback. No modo de gatilhos não faz nada (o banco já registra).
+def auditar(db, tabela, operacao, registro_id, valor_antigo=None, valor_novo=None):
+    if auditoria_na_aplicacao():
+        db.info.setdefault('auditoria', []).append(
+            registro_auditoria(tabela, operacao, registro_id, valor_antigo, valor_novo))
+
+
+@event.listens_for(SessaoORM, 'before_commit')
+def _gravar_no_spool(sessao):
+    registros = sessao.info.pop('auditoria', None)
+    if registros:
+        sessao.info['auditoria_lote'] = spool.gravar(registros)
+
+
+@event.listens_for(SessaoORM, 'after_commit')
+def _confirmar_no_spool(sessao):
+    lote = sessao.info.pop('auditoria_lote', None)
+    if lote:
+        spool.confirmar(lote)
+
+
+@event.listens_for(SessaoORM, 'after_soft_rollback')
+def _descartar_auditoria(sessao, transacao_anterior):
+    sessao.info.pop('auditoria', None)
+    lote = sessao.info.pop('auditoria_lote', None)
+    if lote:
+        spool.cancelar(lote)
+
+
+# Transação num Connection (comandos e tarefas fora das rotas): os registros acrescentados à
+# lista entregue junto com a conexão vão para o spool antes do commit, como nas sessões.
+@contextmanager
+def transacao_auditada():
+    registros = []
+    with obter_engine().connect() as conn:
+        transacao = conn.begin()
+        try:
+            yield conn, registros
+            lote = spool.gravar(registros) if registros and auditoria_na_aplicacao() else None
+        except BaseException:
+            transacao.rollback()
+            raise
+        try:
+            transacao.commit()
+        except BaseException:
+            if lote:
+                spool.cancelar(lote)
+            raise
+        if lote:
+            spool.confirmar(lote)
+
+
+def _valor_multa(prefixo, multa):
+    return None if multa is None else f"{prefixo}{multa:.2f}"
+
+
+# Registros que o gatilho tr_auditoria_usuario_update gravaria pelas multas que
+# trg_emprestimo_multa_atraso aplica ao marcar `ids` como atrasados: um por empréstimo,
+# com a multa acumulando a cada um do mesmo usuário. Trava os empréstimos até o commit.
+def registros_multas_atraso(conn, ids):
+    linhas = conn.execute(
+        select(emprestimos.c.Usuario_id, usuarios.c.Multa_atual)
+        .select_from(emprestimos.join(usuarios, usuarios.c.ID_usuario == emprestimos.c.Usuario_id))
+        .where(emprestimos.c.ID_emprestimo.in_(ids), emprestimos.c.Status_emprestimo == 'pendente')
+        .order_by(emprestimos.c.ID_emprestimo)
+        .with_for_update()
+    )
+    multas = {}
+    registros = []
+    for usuario_id, multa in linhas:
+        anterior = multas.get(usuario_id, multa)
+        nova = (anterior or 0) + MULTA_POR_ATRASO
+        multas[usuario_id] = nova
+        registros.append(registro_auditoria('usuarios', 'UPDATE', usuario_id,
+                                            _valor_multa('multa anterior: ', anterior),
+                                            _valor_multa('multa nova: ', nova)))
+    return registros
+
+
+# Gatilhos de auditoria de database.sql (e database_sqlite.sql), para alternar entre os modos
+GATILHOS_AUDITORIA = {
+    'tr_auditoria_usuario_insert': (
+        "AFTER INSERT ON Usuarios",
+        "INSERT INTO Auditoria_Log (tabela_afetada, operacao, id_registro_afetado, valor_novo) "
+        "VALUES ('usuarios', 'INSERT', NEW.ID_usuario, CONCAT('nome: ', NEW.Nome_usuario, ' | email: ', NEW.Email));",
+        "INSERT INTO Auditoria_Log (tabela_afetada, operacao, id_registro_afetado, valor_novo) "
+        "VALUES ('usuarios', 'INSERT', NEW.ID_usuario, 'nome: ' || NEW.Nome_usuario || ' | email: ' || NEW.Email);",
+    ),
+    'tr_auditoria_usuario_update': (
+        "AFTER UPDATE ON Usuarios",
+        "INSERT INTO Auditoria_Log (tabela_afetada, operacao, id_registro_afetado, valor_antigo, valor_novo) "
+        "VALUES ('usuarios', 'UPDATE', OLD.ID_usuario, CONCAT('multa anterior: ', OLD.Multa_atual), "
+        "CONCAT('multa nova: ', NEW.Multa_atual));",
+        "INSERT INTO Auditoria_Log (tabela_afetada, operacao, id_registro_afetado, valor_antigo, valor_novo) "
+        "VALUES ('usuarios', 'UPDATE', OLD.ID_usuario, "
+        "'multa anterior: ' || CASE WHEN OLD.Multa_atual IS NOT NULL THEN printf('%.2f', OLD.Multa_atual) END, "
+        "'multa nova: ' || CASE WHEN NEW.Multa_atual IS NOT NULL THEN printf('%.2f', NEW.Multa_atual) END);",
+    ),
+    'tr_auditoria_livros_delete': (
+        "AFTER DELETE ON Livros",
+        "INSERT INTO Auditoria_Log (tabela_afetada, operacao, id_registro_afetado, valor_antigo) "
+        "VALUES ('livros', 'DELETE', OLD.ID_livro, CONCAT('titulo: ', OLD.Titulo, ' | isbn: ', OLD.ISBN));",
+        "INSERT INTO Auditoria_Log (tabela_afetada, operacao, id_registro_afetado, valor_antigo) "
+        "VALUES ('livros', 'DELETE', OLD.ID_livro, 'titulo: ' || OLD.Titulo || ' | isbn: ' || OLD.ISBN);",
+    ),
+    'tr_auditoria_autores_insert': (
+        "AFTER INSERT ON Autores",
+        "INSERT INTO Auditoria_Log (tabela_afetada, operacao, id_registro_afetado, valor_novo) "
+        "VALUES ('autores', 'INSERT', NEW.ID_autor, CONCAT('nome: ', NEW.Nome_autor));",
+        "INSERT INTO Auditoria_Log (tabela_afetada, operacao, id_registro_afetado, valor_novo) "
+        "VALUES ('autores', 'INSERT', NEW.ID_autor, 'nome: ' || NEW.Nome_autor);",
+    ),
+    'tr_auditoria_autores_delete': (
+        "AFTER DELETE ON Autores",
+        "INSERT INTO Auditoria_Log (tabela_afetada, operacao, id_registro_afetado, valor_antigo) "
+        "VALUES ('autores', 'DELETE', OLD.ID_autor, CONCAT('nome: ', OLD.Nome_autor));",
+        "INSERT INTO Auditoria_Log (tabela_afetada, operacao, id_registro_afetado, valor_antigo) "
+        "VALUES ('autores', 'DELETE', OLD.ID_autor, 'nome: ' || OLD.Nome_autor);",
+    ),
+}
+# No SQLite o gatilho de Usuarios ignora os UPDATE que só preenchem Data_inscricao
+EVENTO_SQLITE = {'tr_auditoria_usuario_update':
+                 "AFTER UPDATE OF Nome_usuario, Email, Numero_telefone, Multa_atual, Senha ON Usuarios"}
+
+
+def gatilhos_instalados(conn):
+    if conn.dialect.name == 'sqlite':
+        consulta = "SELECT name FROM sqlite_master WHERE type = 'trigger' AND name IN :nomes"
+    else:
+        consulta = ("SELECT TRIGGER_NAME FROM information_schema.TRIGGERS "
+                    "WHERE TRIGGER_SCHEMA = DATABASE() AND TRIGGER_NAME IN :nomes")
+    nomes = list(GATILHOS_AUDITORIA)
+    return {linha[0] for linha in conn.execute(
+        text(consulta).bindparams(bindparam("nomes", expanding=True)), {"nomes": nomes})}
+
+
+def definir_gatilhos(conn, instalar):
+    sqlite = conn.dialect.name == 'sqlite'
+    for nome, (evento, corpo_mysql, corpo_sqlite) in GATILHOS_AUDITORIA.items():
+        conn.execute(text(f"DROP TRIGGER IF EXISTS {nome}"))
+        if instalar:
+            evento = EVENTO_SQLITE.get(nome, evento) if sqlite else evento
+            corpo = corpo_sqlite if sqlite else corpo_mysql
+            conn.execute(text(f"CREATE TRIGGER {nome} {evento} FOR EACH ROW BEGIN {corpo} END"))
+
+
+# Segmentos já gravados só precisam ser lembrados enquanto um arquivo deles ainda pode
+# reaparecer (queda entre o commit e a remoção do arquivo): um dia é folga de sobra
+def limpar_segmentos(conn, hoje=None):
+    limite = datetime.combine(hoje or date.today(), datetime.min.time()) - timedelta(days=1)
+    return conn.execute(text("DELETE FROM Auditoria_segmentos WHERE Gravado_em < :limite"),
+                        {"limite": limite}).rowcount
+
+
+
+@click.group('auditoria')
+def auditoria_cli():
+    """Retenção e arquivamento de Auditoria_Log."""
+
+
+@auditoria_cli.command('particoes')
+def particoes():
+    """Lista as partições mensais de Auditoria_Log."""
+    with obter_engine().connect() as conn:
+        if not tabela_particionada(conn):
+            raise click.ClickException("Auditoria_Log não está particionada; execute 'flask db upgrade'.")
+        for nome, mes, linhas in listar_particoes(conn):
+            click.echo(f"{nome}  {mes:%Y-%m}  ~{linhas} linha(s)")
+
+
+@auditoria_cli.command('reter')
+@click.option('--meses', default=RETER_MESES, show_default=True, help='Meses mantidos no banco.')
+@click.option('--destino', default=DESTINO_ARQUIVO, show_default=True, help='Diretório dos arquivos .jsonl.gz.')
+def reter(meses, destino):
+    """Arquiva (gzip por mês) e remove registros fora da janela de retenção."""
+    arquivados = aplicar_retencao(reter_meses=meses, destino=destino, log=click.echo)
+    click.echo(f"{len(arquivados)} mês(es) arquivado(s).")
+    with obter_engine().begin() as conn:
+        limpar_segmentos(conn)
+
+
+@auditoria_cli.command('modo')
+@click.argument('modo', type=click.Choice(MODOS))
+def modo(modo):
+    """Instala (gatilhos) ou remove (aplicacao) os gatilhos tr_auditoria_* do banco."""
+    if modo == 'gatilhos':
+        # O que ainda está no spool foi capturado pela aplicação: grava antes de trocar
+        click.echo(f"{spool.descarregar()} registro(s) do spool gravados.")
+    with obter_engine().begin() as conn:
+        definir_gatilhos(conn, instalar=modo == 'gatilhos')
+    click.echo(f"Gatilhos de auditoria {'instalados' if modo == 'gatilhos' else 'removidos'}. "
+               f"Defina AUDITORIA_MODO={modo} na aplicação.")
+
+
+@auditoria_cli.command('status')
+def status():
+    """Mostra o modo configurado, os gatilhos instalados e o que aguarda no spool."""
+    with obter_engine().connect() as conn:
+        instalados = gatilhos_instalados(conn)
+    segmentos, registros = spool.pendentes()
+    click.echo(f"AUDITORIA_MODO={AUDITORIA_MODO}; gatilhos instalados: {len(instalados)}/{len(GATILHOS_AUDITORIA)}; "
+               f"spool: {registros} registro(s) em {segmentos} segmento(s) ({spool.diretorio})")
+    if auditoria_na_aplicacao() and instalados:
+        click.echo("Aviso: com os gatilhos instalados, cada alteração é auditada duas vezes. "
+                   "Execute 'flask auditoria modo aplicacao'.")
+    elif not auditoria_na_aplicacao() and len(instalados) < len(GATILHOS_AUDITORIA):
+        click.echo("Aviso: faltam gatilhos de auditoria. Execute 'flask auditoria modo gatilhos'.")
+
+
+@auditoria_cli.command('descarregar')
+def descarregar():
+    """Grava agora em Auditoria_Log os registros que estão no spool."""
+    click.echo(f"{spool.descarregar()} registro(s) gravados.")
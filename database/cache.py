@@ -0,0 +1,221 @@
+import logging
+import os
+import random
+import threading
+import time
+from collections import OrderedDict
+
+from sqlalchemy import event, text, bindparam
+from sqlalchemy.orm import Session as SessaoORM
+
+logger = logging.getLogger(__name__)
+
+
+# Cache LRU com expiração por tempo, seguro para uso entre threads do mesmo processo
+class CacheTTL:
+    def __init__(self, ttl, max_itens):
+        self.ttl = ttl
+        self.max_itens = max_itens
+        self._itens = OrderedDict()
+        self._lock = threading.Lock()
+
+    def obter(self, chave):
+        with self._lock:
+            entrada = self._itens.get(chave)
+            if entrada is None:
+                return None
+            valor, expira_em = entrada
+            if expira_em <= time.monotonic():
+                del self._itens[chave]
+                return None
+            self._itens.move_to_end(chave)
+            return valor
+
+    def guardar(self, chave, valor):
+        with self._lock:
+            self._itens[chave] = (valor, time.monotonic() + self.ttl)
+            self._itens.move_to_end(chave)
+            while len(self._itens) > self.max_itens:
+                self._itens.popitem(last=False)
+
+    def remover(self, chave):
+        with self._lock:
+            self._itens.pop(chave, None)
+
+    def remover_se(self, condicao):
+        with self._lock:
+            for chave in [c for c in self._itens if condicao(c)]:
+                del self._itens[chave]
+
+    def limpar(self):
+        with self._lock:
+            self._itens.clear()
+
+
+# Versões das tabelas guardadas em Versoes_tabela, relidas do banco no máximo a cada
+# `intervalo` segundos e compartilhadas por todos os caches do processo.
+class VersoesTabelas:
+    def __init__(self, intervalo=2.0):
+        self.intervalo = intervalo
+        self._versoes = {}
+        self._lidas_em = None
+        self._lock = threading.Lock()
+
+    def atuais(self, db):
+        with self._lock:
+            if self._lidas_em is not None and time.monotonic() - self._lidas_em < self.intervalo:
+                return self._versoes
+
+        lidas = self.ler(db)
+
+        # Versões só aumentam: uma leitura vinda de réplica atrasada não faz a versão
+        # compartilhada voltar para trás
+        with self._lock:
+            versoes = dict(self._versoes)
+            for tabela, versao in lidas.items():
+                versoes[tabela] = max(versao, versoes.get(tabela, 0))
+            self._versoes = versoes
+            self._lidas_em = time.monotonic()
+        return versoes
+
+    # Versões vistas pela sessão `db`, sem passar pelo valor compartilhado. A versão de uma
+    # tabela fatiada é a soma das fatias (ver FATIAS_VERSAO).
+    def ler(self, db):
+        versoes = {}
+        for linha in db.execute(text("SELECT Tabela, Versao FROM Versoes_tabela")):
+            tabela = linha.Tabela.partition('#')[0]
+            versoes[tabela] = versoes.get(tabela, 0) + linha.Versao
+        return versoes
+
+    def versao(self, db, tabela):
+        return self.atuais(db).get(tabela, 0)
+
+    def forcar_releitura(self):
+        with self._lock:
+            self._lidas_em = None
+
+
+versoes = VersoesTabelas(intervalo=float(os.environ.get('CACHE_INTERVALO_VERSAO', 2)))
+_caches = []
+
+
+# Cache cujas entradas guardam a versão da tabela no momento da carga. As rotas de escrita
+# incrementam a versão em Versoes_tabela, o que invalida o cache também nos outros processos.
+# A versão guardada é lida na mesma sessão que carrega os dados: numa réplica atrasada, os
+# dados antigos ficam com a versão antiga e não com a versão compartilhada, mais nova.
+class CacheVersionado:
+    def __init__(self, ttl=300, max_itens=256):
+        self._itens = CacheTTL(ttl, max_itens)
+        _caches.append(self)
+
+    def obter(self, db, tabela, chave, carregar):
+        versao = versoes.versao(db, tabela)
+        entrada = self._itens.obter((tabela, chave))
+        if entrada is not None and entrada[0] >= versao:
+            return entrada[1]
+
+        versao_carga = versoes.ler(db).get(tabela, 0)
+        valor = carregar(db)
+        self._itens.guardar((tabela, chave), (versao_carga, valor))
+        return valor
+
+    def remover(self, tabela, chave):
+        self._itens.remover((tabela, chave))
+
+    def descartar(self, *tabelas):
+        self._itens.remover_se(lambda chave: chave[0] in tabelas)
+
+    def limpar(self):
+        self._itens.limpar()
+
+
+INCREMENTAR_VERSOES = text(
+    "UPDATE Versoes_tabela SET Versao = Versao + 1 WHERE Tabela IN :tabelas"
+).bindparams(bindparam("tabelas", expanding=True))
+
+
+def incrementar_versoes(conn, *tabelas):
+    conn.execute(INCREMENTAR_VERSOES, {"tabelas": list(tabelas)})
+
+
+# Autores, Generos e Editoras já têm a versão incrementada pelos gatilhos da migração 0006,
+# na mesma transação de qualquer escrita: depois de alterá-las, a aplicação só marca os
+# caches locais para descarte quando a sessão fizer commit (ver _descartar_apos_commit).
+def descartar_apos_commit(db, *tabelas):
+    db.info.setdefault('tabelas_invalidadas', set()).update(tabelas)
+
+
+# Tabelas sem gatilho de versão (ex.: Usuarios): incrementa a versão na mesma transação da
+# escrita e descarta os caches locais após o commit
+def invalidar_tabelas(db, *tabelas):
+    incrementar_versoes(db, *tabelas)
+    descartar_apos_commit(db, *tabelas)
+
+
+# Livros e Emprestimos mudam a cada empréstimo: incrementar a versão dentro da transação
+# prenderia a linha de Versoes_tabela até o commit e enfileiraria os empréstimos. Para
+# essas tabelas a versão sobe logo depois do commit, numa transação curta separada, e é
+# dividida em FATIAS_VERSAO linhas ('Livros', 'Livros#1', ...; migração 0009), como os
+# Contadores: cada incremento escolhe uma ao acaso e empréstimos simultâneos não disputam o
+# lock da mesma linha. Só a soma importa, e ela só aumenta.
+FATIAS_VERSAO = 8
+TABELAS_FATIADAS = ('Livros', 'Emprestimos')
+
+
+def linha_versao(tabela, fatia):
+    return tabela if fatia == 0 else f"{tabela}#{fatia}"
+
+
+def fatia_ao_acaso(tabela):
+    if tabela not in TABELAS_FATIADAS:
+        return tabela
+    return linha_versao(tabela, random.randrange(FATIAS_VERSAO))
+
+
+def marcar_alteracao(db, *tabelas):
+    db.info.setdefault('tabelas_alteradas', set()).update(tabelas)
+
+
+# Listas de Autores, Generos e Editoras das páginas de cadastro
+referencias = CacheVersionado(
+    ttl=float(os.environ.get('CACHE_REFERENCIAS_TTL', 300)),
+    max_itens=int(os.environ.get('CACHE_REFERENCIAS_MAX_ITENS', 256)),
+)
+
+# Sugestões dos seletores (prefixo e limite) e nomes dos itens escolhidos nos formulários
+sugestoes = CacheVersionado(
+    ttl=float(os.environ.get('CACHE_SUGESTOES_TTL', 60)),
+    max_itens=int(os.environ.get('CACHE_SUGESTOES_MAX_ITENS', 4096)),
+)
+
+# Usuários carregados pelo Flask-Login, por ID
+usuarios = CacheVersionado(
+    ttl=float(os.environ.get('CACHE_USUARIOS_TTL', 60)),
+    max_itens=int(os.environ.get('CACHE_USUARIOS_MAX_ITENS', 10000)),
+)
+
+
+@event.listens_for(SessaoORM, 'after_commit')
+def _descartar_apos_commit(sessao):
+    tabelas = sessao.info.pop('tabelas_invalidadas', None)
+    if tabelas:
+        for cache in _caches:
+            cache.descartar(*tabelas)
+        versoes.forcar_releitura()
+
+    alteradas = sessao.info.pop('tabelas_alteradas', None)
+    if alteradas:
+        try:
+            with sessao.get_bind().begin() as conn:
+                incrementar_versoes(conn, *[fatia_ao_acaso(tabela) for tabela in alteradas])
+        except Exception:
+            # A escrita já foi confirmada; sem o incremento, as páginas em cache só
+            # se atualizam na próxima alteração da tabela
+            logger.exception("Falha ao incrementar a versão de %s", ", ".join(sorted(alteradas)))
+        versoes.forcar_releitura()
+
+
+@event.listens_for(SessaoORM, 'after_rollback')
+def _esquecer_apos_rollback(sessao):
+    sessao.info.pop('tabelas_invalidadas', None)
+    sessao.info.pop('tabelas_alteradas', None)
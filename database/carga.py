@@ -0,0 +1,206 @@
+import json
+import os
+import random
+import time
+from collections import Counter
+from datetime import date, timedelta
+
+import click
+from sqlalchemy import text, bindparam
+from werkzeug.security import generate_password_hash
+
+from . import Session
+from .cache import descartar_apos_commit, incrementar_versoes
+from .senhas import METODO_SENHA
+
+
+ARQUIVO_LIVROS_PADRAO = os.path.join(os.path.dirname(__file__), 'dados', 'livros_padrao.json')
+# Senha de todos os usuários do catálogo sintético (usada também pelos benchmarks)
+SENHA_USUARIOS_SINTETICOS = "senha123"
+
+PALAVRAS = (
+    "sombra", "mar", "cidade", "tempo", "memória", "silêncio", "vento", "noite", "jardim", "rio",
+    "estrela", "caminho", "segredo", "fogo", "ilha", "espelho", "sertão", "luz", "casa", "viagem",
+)
+NOMES = ("Ana", "Bruno", "Carla", "Diego", "Elisa", "Fábio", "Gabriela", "Heitor", "Isabel", "João")
+SOBRENOMES = ("Almeida", "Barbosa", "Costa", "Dias", "Esteves", "Ferreira", "Gomes", "Lima", "Moura", "Souza")
+
+
+# Executa o INSERT com uma lista de parâmetros por lote; o PyMySQL reescreve o executemany
+# de um INSERT ... VALUES em um único INSERT com várias linhas.
+def inserir_em_lotes(db, sql, linhas, tamanho_lote):
+    total = 0
+    for inicio in range(0, len(linhas), tamanho_lote):
+        lote = linhas[inicio:inicio + tamanho_lote]
+        db.execute(text(sql), lote)
+        db.commit()
+        total += len(lote)
+    return total
+
+
+def ids_inseridos(db, tabela, coluna, maior_antes):
+    return [linha[0] for linha in db.execute(
+        text(f"SELECT {coluna} FROM {tabela} WHERE {coluna} > :maior ORDER BY {coluna}"),
+        {"maior": maior_antes}
+    )]
+
+
+def maior_id(db, tabela, coluna):
+    return db.execute(text(f"SELECT COALESCE(MAX({coluna}), 0) FROM {tabela}")).scalar()
+
+
+def carregar_livros_padrao(db, caminho=ARQUIVO_LIVROS_PADRAO, tamanho_lote=1000):
+    with open(caminho, encoding='utf-8') as arquivo:
+        livros = json.load(arquivo)
+
+    # Ignora ISBNs já cadastrados, para que o comando possa ser executado mais de uma vez
+    existentes = {linha.ISBN for linha in db.execute(
+        text("SELECT ISBN FROM Livros WHERE ISBN IN :isbns").bindparams(bindparam("isbns", expanding=True)),
+        {"isbns": [livro['isbn'] for livro in livros]}
+    )} if livros else set()
+
+    novos = [{
+        "titulo": livro['titulo'],
+        "isbn": livro['isbn'],
+        "ano": livro.get('ano'),
+        "qtd": livro.get('quantidade', 1),
+        "resumo": livro.get('resumo'),
+    } for livro in livros if livro['isbn'] not in existentes]
+
+    return inserir_em_lotes(db, """
+        INSERT INTO Livros (Titulo, ISBN, Ano_publicacao, Quantidade_disponivel, Resumo)
+        VALUES (:titulo, :isbn, :ano, :qtd, :resumo)
+    """, novos, tamanho_lote)
+
+
+# Gera um catálogo sintético para testes de carga. A quantidade inicial de cada livro já inclui
+# os empréstimos gerados para ele, pois o gatilho trg_emprestimo_reduz_quantidade desconta cada um.
+def gerar_catalogo_sintetico(db, autores, generos, editoras, livros, usuarios, emprestimos,
+                             tamanho_lote=5000, semente=42, log=print):
+    rng = random.Random(semente)
+    hoje = date.today()
+    prefixo = f"{int(time.time()) % 100000:05d}"
+
+    def nome_pessoa():
+        return f"{rng.choice(NOMES)} {rng.choice(SOBRENOMES)} {rng.choice(SOBRENOMES)}"
+
+    def titulo():
+        return " ".join(rng.choice(PALAVRAS) for _ in range(rng.randint(2, 4))).capitalize()
+
+    def etapa(nome, tabela, coluna, sql, linhas):
+        inicio = time.perf_counter()
+        maior = maior_id(db, tabela, coluna)
+        inserir_em_lotes(db, sql, linhas, tamanho_lote)
+        ids = ids_inseridos(db, tabela, coluna, maior)
+        log(f"{nome}: {len(ids)} linhas em {time.perf_counter() - inicio:.1f}s")
+        return ids
+
+    ids_generos = etapa("Gêneros", "Generos", "ID_genero", """
+        INSERT INTO Generos (Nome_genero) VALUES (:nome)
+    """, [{"nome": f"Gênero {prefixo}-{i}"} for i in range(generos)])
+
+    ids_autores = etapa("Autores", "Autores", "ID_autor", """
+        INSERT INTO Autores (Nome_autor, Nacionalidade) VALUES (:nome, :nacionalidade)
+    """, [{"nome": nome_pessoa(), "nacionalidade": "Brasileira"} for _ in range(autores)])
+
+    ids_editoras = etapa("Editoras", "Editoras", "ID_editora", """
+        INSERT INTO Editoras (Nome_editora) VALUES (:nome)
+    """, [{"nome": f"Editora {prefixo}-{i}"} for i in range(editoras)])
+
+    descartar_apos_commit(db, 'Autores', 'Generos', 'Editoras')
+    db.commit()
+
+    # Um único hash para todos os usuários sintéticos
+    senha = generate_password_hash(SENHA_USUARIOS_SINTETICOS, METODO_SENHA)
+    ids_usuarios = etapa("Usuários", "Usuarios", "ID_usuario", """
+        INSERT INTO Usuarios (Nome_usuario, Email, Senha, Data_inscricao, Multa_atual)
+        VALUES (:nome, :email, :senha, :data, 0)
+    """, [{
+        "nome": nome_pessoa(),
+        "email": f"usuario{prefixo}-{i}@exemplo.com",
+        "senha": senha,
+        "data": hoje - timedelta(days=rng.randint(0, 3650)),
+    } for i in range(usuarios)])
+
+    emprestimos_por_livro = Counter(rng.randrange(livros) for _ in range(emprestimos)) if livros else Counter()
+    dados_livros = [{
+        "titulo": titulo(),
+        "isbn": f"9{prefixo}{i:07d}",
+        "ano": rng.randint(1850, hoje.year),
+        "qtd": rng.randint(1, 5) + emprestimos_por_livro[i],
+        "resumo": "Livro gerado para testes de carga.",
+        "autor": rng.choice(ids_autores) if ids_autores else None,
+        "genero": rng.choice(ids_generos) if ids_generos else None,
+        "editora": rng.choice(ids_editoras) if ids_editoras else None,
+    } for i in range(livros)]
+    ids_livros = etapa("Livros", "Livros", "ID_livro", """
+        INSERT INTO Livros (Titulo, ISBN, Ano_publicacao, Quantidade_disponivel, Resumo, Autor_id, Genero_id, Editora_id)
+        VALUES (:titulo, :isbn, :ano, :qtd, :resumo, :autor, :genero, :editora)
+    """, dados_livros)
+
+    if not emprestimos or not ids_usuarios or not ids_livros:
+        return
+
+    inicio = time.perf_counter()
+    lote = []
+    total = 0
+    for indice, quantidade in emprestimos_por_livro.items():
+        livro = dados_livros[indice]
+        for _ in range(quantidade):
+            data_emprestimo = hoje - timedelta(days=rng.randint(0, 730))
+            prevista = data_emprestimo + timedelta(days=7)
+            devolvido = prevista < hoje and rng.random() < 0.95
+            lote.append({
+                "uid": rng.choice(ids_usuarios),
+                "lid": ids_livros[indice],
+                "data": data_emprestimo,
+                "prevista": prevista,
+                "real": data_emprestimo + timedelta(days=rng.randint(1, 10)) if devolvido else None,
+                "status": 'devolvido' if devolvido else 'pendente',
+                "gen_id": livro["genero"],
+                "aut_id": livro["autor"],
+            })
+            if len(lote) >= tamanho_lote:
+                total += inserir_emprestimos(db, lote)
+                lote = []
+    if lote:
+        total += inserir_emprestimos(db, lote)
+    log(f"Empréstimos: {total} linhas em {time.perf_counter() - inicio:.1f}s")
+
+
+def inserir_emprestimos(db, lote):
+    db.execute(text("""
+        INSERT INTO Emprestimos (Usuario_id, Livro_id, Data_emprestimo, Data_devolucao_prevista,
+                                 Data_devolucao_real, Status_emprestimo, Livro_genero_id, Livro_autor_id)
+        VALUES (:uid, :lid, :data, :prevista, :real, :status, :gen_id, :aut_id)
+    """), lote)
+    db.commit()
+    return len(lote)
+
+
+@click.command('seed')
+@click.option('--arquivo', default=ARQUIVO_LIVROS_PADRAO, show_default=True,
+              type=click.Path(exists=True, dir_okay=False), help='Arquivo JSON com os livros iniciais.')
+@click.option('--sintetico', is_flag=True, help='Gera um catálogo sintético para testes de carga.')
+@click.option('--autores', default=1000, show_default=True)
+@click.option('--generos', default=50, show_default=True)
+@click.option('--editoras', default=200, show_default=True)
+@click.option('--livros', default=100000, show_default=True)
+@click.option('--usuarios', default=10000, show_default=True)
+@click.option('--emprestimos', default=100000, show_default=True)
+@click.option('--lote', default=5000, show_default=True, help='Linhas por INSERT/transação.')
+@click.option('--semente', default=42, show_default=True)
+def seed(arquivo, sintetico, autores, generos, editoras, livros, usuarios, emprestimos, lote, semente):
+    """Popula o banco com os livros padrão ou com um catálogo sintético."""
+    db = Session()
+    try:
+        if sintetico:
+            gerar_catalogo_sintetico(db, autores, generos, editoras, livros, usuarios, emprestimos,
+                                     tamanho_lote=lote, semente=semente, log=click.echo)
+        else:
+            inseridos = carregar_livros_padrao(db, arquivo, tamanho_lote=lote)
+            click.echo(f"{inseridos} livros inseridos.")
+        incrementar_versoes(db, 'Livros', 'Emprestimos')
+        db.commit()
+    finally:
+        db.close()
@@ -0,0 +1,97 @@
+import click
+from sqlalchemy import text, bindparam, Integer, String
+
+from . import obter_engine
+
+
+# Contadores de dependências mantidos pelos gatilhos da migração 0005. Cada contador é
+# dividido em FATIAS linhas (o gatilho escolhe uma ao acaso) para que empréstimos simultâneos
+# do mesmo gênero/autor não disputem o lock de uma única linha; o total é a soma das fatias.
+FATIAS = 8
+
+# Tipo do contador: (tabela, coluna agrupada) usados na reconstrução
+ORIGENS = {
+    'livros_genero': ('Livros', 'Genero_id'),
+    'livros_autor': ('Livros', 'Autor_id'),
+    'livros_editora': ('Livros', 'Editora_id'),
+    'emprestimos_livro': ('Emprestimos', 'Livro_id'),
+    'emprestimos_genero': ('Emprestimos', 'Livro_genero_id'),
+    'emprestimos_autor': ('Emprestimos', 'Livro_autor_id'),
+}
+
+
+CONTADORES_POR_REFERENCIA = text("""
+    SELECT Tipo, SUM(Total) AS total FROM Contadores
+    WHERE Referencia_id = :id AND Tipo IN :tipos
+    GROUP BY Tipo
+""").bindparams(bindparam("id", type_=Integer), bindparam("tipos", type_=String, expanding=True))
+
+
+# Totais de vários tipos para a mesma referência, numa só consulta: {tipo: total}
+def contadores(db, referencia_id, *tipos):
+    totais = {tipo: 0 for tipo in tipos}
+    for linha in db.execute(CONTADORES_POR_REFERENCIA, {"id": referencia_id, "tipos": list(tipos)}):
+        totais[linha.Tipo] = int(linha.total)
+    return totais
+
+
+def contagens_reais(conn, tipo):
+    tabela, coluna = ORIGENS[tipo]
+    return {linha[0]: linha[1] for linha in conn.execute(text(
+        f"SELECT {coluna}, COUNT(*) FROM {tabela} WHERE {coluna} IS NOT NULL GROUP BY {coluna}"
+    ))}
+
+
+def contagens_mantidas(conn, tipo):
+    return {linha[0]: int(linha[1]) for linha in conn.execute(text("""
+        SELECT Referencia_id, SUM(Total) FROM Contadores WHERE Tipo = :tipo GROUP BY Referencia_id
+    """), {"tipo": tipo}) if linha[1]}
+
+
+# Diferenças entre o contador e a contagem real: [(tipo, referência, mantido, real)]
+def divergencias(conn, tipos=None):
+    encontradas = []
+    for tipo in tipos or ORIGENS:
+        reais = contagens_reais(conn, tipo)
+        mantidas = contagens_mantidas(conn, tipo)
+        for referencia in sorted(set(reais) | set(mantidas)):
+            if reais.get(referencia, 0) != mantidas.get(referencia, 0):
+                encontradas.append((tipo, referencia, mantidas.get(referencia, 0), reais.get(referencia, 0)))
+    return encontradas
+
+
+# Recria os contadores de `tipos` a partir das tabelas, com um INSERT ... SELECT por tipo.
+# As linhas lidas ficam bloqueadas até o commit, então gravações concorrentes esperam.
+def reconstruir(conn, tipos=None):
+    for tipo in tipos or ORIGENS:
+        tabela, coluna = ORIGENS[tipo]
+        conn.execute(text("DELETE FROM Contadores WHERE Tipo = :tipo"), {"tipo": tipo})
+        conn.execute(text(f"""
+            INSERT INTO Contadores (Tipo, Referencia_id, Fatia, Total)
+            SELECT :tipo, {coluna}, 0, COUNT(*) FROM {tabela}
+            WHERE {coluna} IS NOT NULL
+            GROUP BY {coluna}
+        """), {"tipo": tipo})
+
+
+@click.group('contadores')
+def contadores_cli():
+    """Contadores de livros e empréstimos por referência."""
+
+
+@contadores_cli.command('reconciliar')
+@click.option('--corrigir', is_flag=True, help='Reconstrói os contadores dos tipos com divergência.')
+def reconciliar(corrigir):
+    """Compara os contadores com as contagens reais e lista as divergências."""
+    with obter_engine().connect() as conn:
+        encontradas = divergencias(conn)
+        for tipo, referencia, mantido, real in encontradas:
+            click.echo(f"{tipo} {referencia}: contador {mantido}, real {real}")
+        if not encontradas:
+            click.echo("Nenhuma divergência.")
+            return
+        click.echo(f"{len(encontradas)} divergência(s).")
+        if corrigir:
+            reconstruir(conn, sorted({tipo for tipo, *_ in encontradas}))
+            conn.commit()
+            click.echo("Contadores reconstruídos.")
@@ -97,6 +97,21 @@ ALTER TABLE Emprestimos
 ADD CONSTRAINT fk_emprestimos_autor_snapshot
 FOREIGN KEY (Livro_autor_id) REFERENCES Autores(ID_autor);
 
+-- Versões das tabelas usadas para invalidar os caches da aplicação entre processos
+CREATE TABLE Versoes_tabela (
+    Tabela VARCHAR(50) PRIMARY KEY,
+    Versao INT NOT NULL DEFAULT 0
+);
+
+INSERT INTO Versoes_tabela (Tabela, Versao) VALUES ('Autores', 0), ('Generos', 0), ('Editoras', 0), ('Usuarios', 0),
+    ('Livros', 0), ('Emprestimos', 0);
+
+-- Índices da paginação por cursor do catálogo (ordem por título e filtros por gênero/autor/editora)
+CREATE INDEX idx_livros_titulo ON Livros (Titulo, ID_livro);
+CREATE INDEX idx_livros_genero_titulo ON Livros (Genero_id, Titulo, ID_livro);
+CREATE INDEX idx_livros_autor_titulo ON Livros (Autor_id, Titulo, ID_livro);
+CREATE INDEX idx_livros_editora_titulo ON Livros (Editora_id, Titulo, ID_livro);
+
 
 
 -- Triggers de validação : Flauber Sauan
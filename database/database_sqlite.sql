@@ -0,0 +1,262 @@
+-- Schema de database.sql para o SQLite embutido (DATABASE_URL=sqlite:///arquivo.db).
+-- Aplicado por `flask db upgrade` num banco vazio, antes das migrações.
+--
+-- Os gatilhos reproduzem os do MySQL. Diferenças de sintaxe:
+--   * SIGNAL SQLSTATE '45000' vira RAISE(ABORT, mensagem), com a condição no WHEN;
+--   * o SQLite não altera NEW num gatilho BEFORE, então os valores padrão (datas, status,
+--     resumo) são preenchidos por um UPDATE num gatilho AFTER da mesma linha;
+--   * os gatilhos AFTER UPDATE que não devem reagir a esse preenchimento (auditoria,
+--     contadores) usam UPDATE OF com as colunas que de fato acompanham;
+--   * CURDATE() vira date('now', 'localtime') e CONCAT vira ||.
+
+CREATE TABLE Usuarios (
+    ID_usuario INTEGER PRIMARY KEY AUTOINCREMENT,
+    Nome_usuario VARCHAR(255) NOT NULL,
+    Email VARCHAR(255),
+    Numero_telefone VARCHAR(15),
+    Data_inscricao DATE,
+    Multa_atual DECIMAL(10, 2),
+    Senha VARCHAR(300)
+);
+
+CREATE TABLE Autores (
+    ID_autor INTEGER PRIMARY KEY AUTOINCREMENT,
+    Nome_autor VARCHAR(255) NOT NULL,
+    Nacionalidade VARCHAR(255),
+    Data_nascimento DATE,
+    Biografia TEXT,
+    Usuario_id INT REFERENCES Usuarios(ID_usuario)
+);
+
+CREATE TABLE Generos (
+    ID_genero INTEGER PRIMARY KEY AUTOINCREMENT,
+    Nome_genero VARCHAR(255) NOT NULL
+);
+
+CREATE TABLE Editoras (
+    ID_editora INTEGER PRIMARY KEY AUTOINCREMENT,
+    Nome_editora VARCHAR(255) NOT NULL,
+    Endereco_editora TEXT,
+    Usuario_id INT REFERENCES Usuarios(ID_usuario)
+);
+
+CREATE TABLE Livros (
+    ID_livro INTEGER PRIMARY KEY AUTOINCREMENT,
+    Titulo VARCHAR(255) NOT NULL,
+    Autor_id INT REFERENCES Autores(ID_autor),
+    ISBN VARCHAR(13) NOT NULL,
+    Ano_publicacao INT,
+    Genero_id INT REFERENCES Generos(ID_genero),
+    Editora_id INT REFERENCES Editoras(ID_editora),
+    Quantidade_disponivel INT,
+    Resumo TEXT,
+    Usuario_id INT REFERENCES Usuarios(ID_usuario)
+);
+
+CREATE TABLE Emprestimos (
+    ID_emprestimo INTEGER PRIMARY KEY AUTOINCREMENT,
+    Usuario_id INT REFERENCES Usuarios(ID_usuario),
+    Livro_id INT REFERENCES Livros(ID_livro),
+    Data_emprestimo DATE,
+    Data_devolucao_prevista DATE,
+    Data_devolucao_real DATE,
+    Status_emprestimo VARCHAR(10) CHECK (Status_emprestimo IN ('pendente', 'devolvido', 'atrasado')),
+    Livro_genero_id INT REFERENCES Generos(ID_genero),
+    Livro_autor_id INT REFERENCES Autores(ID_autor)
+);
+
+-- data_hora no horário local, como o TIMESTAMP do MySQL (CURRENT_TIMESTAMP do SQLite é UTC)
+CREATE TABLE Auditoria_Log (
+    id_log INTEGER PRIMARY KEY AUTOINCREMENT,
+    tabela_afetada VARCHAR(50),
+    operacao VARCHAR(6) CHECK (operacao IN ('INSERT', 'UPDATE', 'DELETE')),
+    id_registro_afetado INT,
+    valor_antigo TEXT,
+    valor_novo TEXT,
+    data_hora TIMESTAMP NOT NULL DEFAULT (datetime('now', 'localtime'))
+);
+
+-- Versões das tabelas usadas para invalidar os caches da aplicação entre processos
+CREATE TABLE Versoes_tabela (
+    Tabela VARCHAR(50) PRIMARY KEY,
+    Versao INT NOT NULL DEFAULT 0
+);
+
+INSERT INTO Versoes_tabela (Tabela, Versao) VALUES ('Autores', 0), ('Generos', 0), ('Editoras', 0), ('Usuarios', 0),
+    ('Livros', 0), ('Emprestimos', 0);
+
+
+-- Gatilhos de validação
+
+CREATE TRIGGER trg_usuarios_nome_minimo_insert
+BEFORE INSERT ON Usuarios
+FOR EACH ROW WHEN length(NEW.Nome_usuario) < 3
+BEGIN
+    SELECT RAISE(ABORT, 'o nome do usuário deve ter pelo menos 3 caracteres.');
+END;
+
+CREATE TRIGGER trg_usuarios_nome_minimo_update
+BEFORE UPDATE ON Usuarios
+FOR EACH ROW WHEN length(NEW.Nome_usuario) < 3
+BEGIN
+    SELECT RAISE(ABORT, 'o nome do usuário deve ter pelo menos 3 caracteres.');
+END;
+
+CREATE TRIGGER trg_livros_isbn_valido
+BEFORE INSERT ON Livros
+FOR EACH ROW WHEN length(NEW.ISBN) <> 13
+BEGIN
+    SELECT RAISE(ABORT, 'o isbn deve possuir exatamente 13 dígitos.');
+END;
+
+CREATE TRIGGER trg_emprestimos_datas_validas
+BEFORE INSERT ON Emprestimos
+FOR EACH ROW WHEN NEW.Data_devolucao_prevista < NEW.Data_emprestimo
+BEGIN
+    SELECT RAISE(ABORT, 'a data de devolução prevista não pode ser anterior à data de empréstimo.');
+END;
+
+CREATE TRIGGER trg_livros_quantidade_valida
+BEFORE UPDATE ON Livros
+FOR EACH ROW WHEN NEW.Quantidade_disponivel < 0
+BEGIN
+    SELECT RAISE(ABORT, 'a quantidade disponível não pode ser negativa.');
+END;
+
+
+-- Gatilhos de atualização automática pós-evento
+
+-- Empréstimo criado: um exemplar a menos no estoque
+CREATE TRIGGER trg_emprestimo_reduz_quantidade
+AFTER INSERT ON Emprestimos
+FOR EACH ROW
+BEGIN
+    UPDATE Livros
+    SET Quantidade_disponivel = Quantidade_disponivel - 1
+    WHERE ID_livro = NEW.Livro_id;
+END;
+
+-- Empréstimo excluído: o livro volta ao estoque
+CREATE TRIGGER trg_emprestimo_delete_devolve_livro
+AFTER DELETE ON Emprestimos
+FOR EACH ROW
+BEGIN
+    UPDATE Livros
+    SET Quantidade_disponivel = Quantidade_disponivel + 1
+    WHERE ID_livro = OLD.Livro_id;
+END;
+
+-- Status muda para 'devolvido': o livro volta ao estoque
+CREATE TRIGGER trg_emprestimo_devolvido
+AFTER UPDATE OF Status_emprestimo ON Emprestimos
+FOR EACH ROW WHEN OLD.Status_emprestimo <> 'devolvido' AND NEW.Status_emprestimo = 'devolvido'
+BEGIN
+    UPDATE Livros
+    SET Quantidade_disponivel = Quantidade_disponivel + 1
+    WHERE ID_livro = NEW.Livro_id;
+END;
+
+-- Status muda para 'atrasado': multa de 10,00 para o usuário
+CREATE TRIGGER trg_emprestimo_multa_atraso
+AFTER UPDATE OF Status_emprestimo ON Emprestimos
+FOR EACH ROW WHEN NEW.Status_emprestimo = 'atrasado' AND OLD.Status_emprestimo <> 'atrasado'
+BEGIN
+    UPDATE Usuarios
+    SET Multa_atual = IFNULL(Multa_atual, 0) + 10.00
+    WHERE ID_usuario = NEW.Usuario_id;
+END;
+
+-- Usuário removido: limpa a multa associada (limpeza lógica)
+CREATE TRIGGER trg_usuario_delete_limpa_multas
+AFTER DELETE ON Usuarios
+FOR EACH ROW
+BEGIN
+    UPDATE Usuarios
+    SET Multa_atual = 0
+    WHERE ID_usuario = OLD.ID_usuario;
+END;
+
+
+-- Gatilhos de auditoria (valores monetários com duas casas, como o CONCAT de um DECIMAL no MySQL)
+
+CREATE TRIGGER tr_auditoria_usuario_insert
+AFTER INSERT ON Usuarios
+FOR EACH ROW
+BEGIN
+    INSERT INTO Auditoria_Log (tabela_afetada, operacao, id_registro_afetado, valor_novo)
+    VALUES ('usuarios', 'INSERT', NEW.ID_usuario,
+            'nome: ' || NEW.Nome_usuario || ' | email: ' || NEW.Email);
+END;
+
+CREATE TRIGGER tr_auditoria_usuario_update
+AFTER UPDATE OF Nome_usuario, Email, Numero_telefone, Multa_atual, Senha ON Usuarios
+FOR EACH ROW
+BEGIN
+    INSERT INTO Auditoria_Log (tabela_afetada, operacao, id_registro_afetado, valor_antigo, valor_novo)
+    VALUES ('usuarios', 'UPDATE', OLD.ID_usuario,
+            'multa anterior: ' || CASE WHEN OLD.Multa_atual IS NOT NULL THEN printf('%.2f', OLD.Multa_atual) END,
+            'multa nova: ' || CASE WHEN NEW.Multa_atual IS NOT NULL THEN printf('%.2f', NEW.Multa_atual) END);
+END;
+
+CREATE TRIGGER tr_auditoria_livros_delete
+AFTER DELETE ON Livros
+FOR EACH ROW
+BEGIN
+    INSERT INTO Auditoria_Log (tabela_afetada, operacao, id_registro_afetado, valor_antigo)
+    VALUES ('livros', 'DELETE', OLD.ID_livro,
+            'titulo: ' || OLD.Titulo || ' | isbn: ' || OLD.ISBN);
+END;
+
+CREATE TRIGGER tr_auditoria_autores_insert
+AFTER INSERT ON Autores
+FOR EACH ROW
+BEGIN
+    INSERT INTO Auditoria_Log (tabela_afetada, operacao, id_registro_afetado, valor_novo)
+    VALUES ('autores', 'INSERT', NEW.ID_autor, 'nome: ' || NEW.Nome_autor);
+END;
+
+CREATE TRIGGER tr_auditoria_autores_delete
+AFTER DELETE ON Autores
+FOR EACH ROW
+BEGIN
+    INSERT INTO Auditoria_Log (tabela_afetada, operacao, id_registro_afetado, valor_antigo)
+    VALUES ('autores', 'DELETE', OLD.ID_autor, 'nome: ' || OLD.Nome_autor);
+END;
+
+
+-- Gatilhos de geração de valores
+
+CREATE TRIGGER trg_usuarios_data_inscricao_auto
+AFTER INSERT ON Usuarios
+FOR EACH ROW WHEN NEW.Data_inscricao IS NULL
+BEGIN
+    UPDATE Usuarios SET Data_inscricao = date('now', 'localtime') WHERE ID_usuario = NEW.ID_usuario;
+END;
+
+CREATE TRIGGER trg_emprestimos_data_emprestimo_auto
+AFTER INSERT ON Emprestimos
+FOR EACH ROW WHEN NEW.Data_emprestimo IS NULL
+BEGIN
+    UPDATE Emprestimos SET Data_emprestimo = date('now', 'localtime') WHERE ID_emprestimo = NEW.ID_emprestimo;
+END;
+
+CREATE TRIGGER trg_emprestimos_data_devolucao_real_auto
+AFTER UPDATE OF Status_emprestimo ON Emprestimos
+FOR EACH ROW WHEN NEW.Status_emprestimo = 'devolvido' AND OLD.Status_emprestimo <> 'devolvido'
+BEGIN
+    UPDATE Emprestimos SET Data_devolucao_real = date('now', 'localtime') WHERE ID_emprestimo = NEW.ID_emprestimo;
+END;
+
+CREATE TRIGGER trg_livros_resumo_auto
+AFTER INSERT ON Livros
+FOR EACH ROW WHEN NEW.Resumo IS NULL OR NEW.Resumo = ''
+BEGIN
+    UPDATE Livros SET Resumo = 'Resumo gerado automaticamente pelo sistema.' WHERE ID_livro = NEW.ID_livro;
+END;
+
+CREATE TRIGGER trg_emprestimos_status_auto
+AFTER INSERT ON Emprestimos
+FOR EACH ROW WHEN NEW.Status_emprestimo IS NULL
+BEGIN
+    UPDATE Emprestimos SET Status_emprestimo = 'pendente' WHERE ID_emprestimo = NEW.ID_emprestimo;
+END;
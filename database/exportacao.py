@@ -0,0 +1,95 @@
+import csv
+import io
+import json
+
+from sqlalchemy import text
+
+from . import obter_engine
+
+
+LINHAS_POR_LOTE = 1000
+TAMANHO_BLOCO = 64 * 1024
+
+EXPORTACOES = {
+    'emprestimos': {
+        "colunas": ["ID_emprestimo", "Usuario_id", "Livro_id", "Titulo", "Data_emprestimo",
+                    "Data_devolucao_prevista", "Data_devolucao_real", "Status_emprestimo"],
+        "sql": """
+            SELECT e.ID_emprestimo, e.Usuario_id, e.Livro_id, l.Titulo, e.Data_emprestimo,
+                   e.Data_devolucao_prevista, e.Data_devolucao_real, e.Status_emprestimo
+            FROM Emprestimos e
+            JOIN Livros l ON l.ID_livro = e.Livro_id
+            {where}
+            ORDER BY e.ID_emprestimo
+        """,
+        "data": "e.Data_emprestimo",
+        "usuario": "e.Usuario_id = :usuario",
+    },
+    'auditoria': {
+        "colunas": ["id_log", "tabela_afetada", "operacao", "id_registro_afetado",
+                    "valor_antigo", "valor_novo", "data_hora"],
+        "sql": """
+            SELECT id_log, tabela_afetada, operacao, id_registro_afetado, valor_antigo, valor_novo, data_hora
+            FROM Auditoria_Log
+            {where}
+            ORDER BY id_log
+        """,
+        "data": "data_hora",
+        # Auditoria_Log não guarda o autor da alteração: filtra os registros do próprio usuário
+        "usuario": "tabela_afetada = 'usuarios' AND id_registro_afetado = :usuario",
+        # Tem alterações de todos os usuários: só administradores (ADMINS) exportam
+        "somente_admin": True,
+    },
+}
+
+
+def montar_consulta(tipo, inicio=None, fim=None, usuario=None):
+    exportacao = EXPORTACOES[tipo]
+    condicoes, params = [], {}
+    if inicio:
+        condicoes.append(f"{exportacao['data']} >= :inicio")
+        params["inicio"] = inicio
+    if fim:
+        # `fim` é inclusivo: compara com o dia seguinte para cobrir colunas com hora
+        condicoes.append(f"{exportacao['data']} < :fim")
+        params["fim"] = fim
+    if usuario:
+        condicoes.append(exportacao['usuario'])
+        params["usuario"] = usuario
+    where = f"WHERE {' AND '.join(condicoes)}" if condicoes else ""
+    return exportacao['sql'].format(where=where), params
+
+
+# Lê as linhas com cursor do lado do servidor (SSCursor no PyMySQL) em lotes, sem carregar
+# o resultado inteiro na memória, e devolve blocos de texto prontos para a resposta HTTP.
+def gerar_exportacao(tipo, formato, origem=None, **filtros):
+    sql, params = montar_consulta(tipo, **filtros)
+    colunas = EXPORTACOES[tipo]['colunas']
+    buffer = io.StringIO()
+    escritor = csv.writer(buffer)
+    if formato == 'csv':
+        escritor.writerow(colunas)
+
+    conn = (origem or obter_engine()).connect()
+    concluido = False
+    try:
+        resultado = conn.execution_options(stream_results=True, yield_per=LINHAS_POR_LOTE).execute(text(sql), params)
+        for lote in resultado.partitions():
+            for linha in lote:
+                if formato == 'csv':
+                    escritor.writerow(linha)
+                else:
+                    buffer.write(json.dumps(dict(zip(colunas, linha)), default=str, ensure_ascii=False))
+                    buffer.write("\n")
+            if buffer.tell() >= TAMANHO_BLOCO:
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+        if buffer.tell():
+            yield buffer.getvalue()
+        concluido = True
+    finally:
+        if not concluido:
+            # Cliente desconectou no meio: descarta a conexão em vez de ler o resto do resultado
+            conn.invalidate()
+        conn.close()
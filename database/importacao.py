@@ -0,0 +1,314 @@
+import csv
+import io
+import json
+import re
+import time
+
+import click
+from sqlalchemy import text, bindparam
+from sqlalchemy.exc import DBAPIError
+
+from . import Session, repositorio
+from .auditoria import auditar
+from .cache import descartar_apos_commit, marcar_alteracao
+
+
+TAMANHO_LOTE = 1000
+
+# Tabela de referência de cada coluna de nome do arquivo: (tabela, coluna id, coluna nome)
+REFERENCIAS = {
+    'autor': ('Autores', 'ID_autor', 'Nome_autor'),
+    'genero': ('Generos', 'ID_genero', 'Nome_genero'),
+    'editora': ('Editoras', 'ID_editora', 'Nome_editora'),
+}
+
+# Tamanho máximo (caracteres) dos campos de texto do arquivo, das colunas onde são gravados
+TAMANHOS_MAXIMOS = {
+    'titulo': repositorio.livros.c.Titulo.type.length,
+    'autor': repositorio.autores.c.Nome_autor.type.length,
+    'genero': repositorio.generos.c.Nome_genero.type.length,
+    'editora': repositorio.editoras.c.Nome_editora.type.length,
+}
+
+INSERIR_LIVRO = """
+    INSERT INTO Livros (Titulo, ISBN, Ano_publicacao, Quantidade_disponivel, Autor_id, Genero_id, Editora_id, Resumo, Usuario_id)
+    VALUES (:titulo, :isbn, :ano, :qtd, :autor_id, :genero_id, :editora_id, :resumo, :uid)
+"""
+
+
+class RelatorioImportacao:
+    def __init__(self):
+        self.lidas = 0
+        self.inseridas = 0
+        self.erros = []
+        self.duracao = 0.0
+
+    def erro(self, linha, isbn, mensagem):
+        self.erros.append((linha, isbn, mensagem))
+
+
+# Leitores em streaming: devolvem (número da linha, dicionário) sem carregar o arquivo inteiro.
+# Bytes que não são UTF-8 viram caracteres \udc80-\udcff (surrogateescape) em vez de interromper
+# a leitura com UnicodeDecodeError; o registro dessas linhas vem como TEXTO_INVALIDO.
+TEXTO_INVALIDO = object()
+FORA_DO_UTF8 = re.compile('[\udc80-\udcff]')
+
+
+def linhas_verificadas(arquivo_texto, invalidas):
+    for numero, linha in enumerate(arquivo_texto, start=1):
+        if FORA_DO_UTF8.search(linha):
+            invalidas.add(numero)
+        yield linha
+
+
+def ler_csv(arquivo_texto):
+    invalidas = set()
+    leitor = csv.DictReader(linhas_verificadas(arquivo_texto, invalidas))
+    if leitor.fieldnames is None:
+        return
+    anterior = leitor.line_num
+    if invalidas:
+        yield anterior, TEXTO_INVALIDO
+    for registro in leitor:
+        # Um registro pode ocupar várias linhas (campos entre aspas com quebra de linha)
+        primeira, anterior = anterior + 1, leitor.line_num
+        if any(primeira <= numero <= anterior for numero in invalidas):
+            yield anterior, TEXTO_INVALIDO
+            continue
+        yield anterior, {(chave or '').strip().lower(): valor for chave, valor in registro.items()}
+
+
+def ler_jsonl(arquivo_texto):
+    invalidas = set()
+    for numero, linha in enumerate(linhas_verificadas(arquivo_texto, invalidas), start=1):
+        if numero in invalidas:
+            yield numero, TEXTO_INVALIDO
+            continue
+        linha = linha.strip()
+        if not linha:
+            continue
+        try:
+            registro = json.loads(linha)
+        except ValueError:
+            yield numero, None
+            continue
+        yield numero, registro if isinstance(registro, dict) else None
+
+
+def abrir_leitor(fluxo_binario, formato):
+    arquivo_texto = io.TextIOWrapper(fluxo_binario, encoding='utf-8-sig', errors='surrogateescape', newline='')
+    return ler_jsonl(arquivo_texto) if formato == 'jsonl' else ler_csv(arquivo_texto)
+
+
+def _texto(registro, campo):
+    valor = registro.get(campo)
+    if valor is None:
+        return None
+    valor = str(valor).strip()
+    return valor or None
+
+
+def _inteiro(registro, campo):
+    valor = _texto(registro, campo)
+    return int(valor) if valor is not None else None
+
+
+def validar(numero, registro, relatorio):
+    if registro is TEXTO_INVALIDO:
+        relatorio.erro(numero, None, "A linha não está codificada em UTF-8.")
+        return None
+    if registro is None:
+        relatorio.erro(numero, None, "Linha inválida.")
+        return None
+
+    isbn = _texto(registro, 'isbn')
+    titulo = _texto(registro, 'titulo')
+    if not titulo:
+        relatorio.erro(numero, isbn, "Título obrigatório.")
+        return None
+    if not isbn or len(isbn) != 13:
+        relatorio.erro(numero, isbn, "O ISBN deve possuir exatamente 13 dígitos.")
+        return None
+    for campo, tamanho in TAMANHOS_MAXIMOS.items():
+        valor = _texto(registro, campo)
+        if valor is not None and len(valor) > tamanho:
+            relatorio.erro(numero, isbn, f"O campo {campo} deve ter no máximo {tamanho} caracteres.")
+            return None
+    try:
+        ano = _inteiro(registro, 'ano')
+        qtd = _inteiro(registro, 'quantidade') or 0
+    except ValueError:
+        relatorio.erro(numero, isbn, "Ano e quantidade devem ser números inteiros.")
+        return None
+    if qtd < 0:
+        relatorio.erro(numero, isbn, "A quantidade disponível não pode ser negativa.")
+        return None
+
+    return {
+        "linha": numero,
+        "titulo": titulo,
+        "isbn": isbn,
+        "ano": ano,
+        "qtd": qtd,
+        "resumo": _texto(registro, 'resumo'),
+        "autor": _texto(registro, 'autor'),
+        "genero": _texto(registro, 'genero'),
+        "editora": _texto(registro, 'editora'),
+    }
+
+
+# Resolve nomes para IDs com uma consulta por tabela e lote; nomes ainda não cadastrados
+# são inseridos de uma vez e consultados de novo. `ids` guarda o que já foi resolvido.
+def resolver_nomes(db, campo, nomes, ids, usuario_id):
+    tabela, coluna_id, coluna_nome = REFERENCIAS[campo]
+    faltando = sorted({nome for nome in nomes if nome and nome not in ids})
+    if not faltando:
+        return False
+
+    consulta = text(
+        f"SELECT {coluna_id} AS id, {coluna_nome} AS nome FROM {tabela} "
+        f"WHERE {coluna_nome} IN :nomes ORDER BY {coluna_id}"
+    ).bindparams(bindparam("nomes", expanding=True))
+
+    def carregar():
+        for linha in db.execute(consulta, {"nomes": faltando}):
+            ids.setdefault(linha.nome, linha.id)
+
+    carregar()
+    novos = [nome for nome in faltando if nome not in ids]
+    if not novos:
+        return False
+
+    if tabela == 'Generos':
+        db.execute(text("INSERT INTO Generos (Nome_genero) VALUES (:nome)"), [{"nome": n} for n in novos])
+    else:
+        db.execute(
+            text(f"INSERT INTO {tabela} ({coluna_nome}, Usuario_id) VALUES (:nome, :uid)"),
+            [{"nome": n, "uid": usuario_id} for n in novos]
+        )
+    carregar()
+    if tabela == 'Autores':
+        for nome in novos:
+            auditar(db, 'autores', 'INSERT', ids[nome], valor_novo=f"nome: {nome}")
+    return True
+
+
+def parametros_livro(livro, ids_referencias, usuario_id):
+    return {
+        "titulo": livro["titulo"],
+        "isbn": livro["isbn"],
+        "ano": livro["ano"],
+        "qtd": livro["qtd"],
+        "resumo": livro["resumo"],
+        "autor_id": ids_referencias['autor'].get(livro["autor"]),
+        "genero_id": ids_referencias['genero'].get(livro["genero"]),
+        "editora_id": ids_referencias['editora'].get(livro["editora"]),
+        "uid": usuario_id,
+    }
+
+
+def importar_lote(db, lote, relatorio, ids_referencias, usuario_id):
+    # Duplicados já cadastrados: uma consulta por lote
+    existentes = {linha.ISBN for linha in db.execute(
+        text("SELECT ISBN FROM Livros WHERE ISBN IN :isbns").bindparams(bindparam("isbns", expanding=True)),
+        {"isbns": [livro["isbn"] for livro in lote]}
+    )}
+    novos = []
+    for livro in lote:
+        if livro["isbn"] in existentes:
+            relatorio.erro(livro["linha"], livro["isbn"], "ISBN já cadastrado.")
+        else:
+            novos.append(livro)
+    if not novos:
+        return
+
+    try:
+        tabelas_alteradas = set()
+        for campo in REFERENCIAS:
+            if resolver_nomes(db, campo, [livro[campo] for livro in novos], ids_referencias[campo], usuario_id):
+                tabelas_alteradas.add(REFERENCIAS[campo][0])
+        parametros = [parametros_livro(livro, ids_referencias, usuario_id) for livro in novos]
+        db.execute(text(INSERIR_LIVRO), parametros)
+        if tabelas_alteradas:
+            descartar_apos_commit(db, *tabelas_alteradas)
+        marcar_alteracao(db, 'Livros')
+        db.commit()
+        relatorio.inseridas += len(novos)
+    except DBAPIError:
+        # Algum livro ou nome do lote foi recusado (ex.: gatilho de validação): refaz linha a
+        # linha para apontar exatamente quais falharam.
+        db.rollback()
+        for chave in ids_referencias:
+            ids_referencias[chave].clear()
+        importar_linha_a_linha(db, novos, relatorio, ids_referencias, usuario_id)
+
+
+def importar_linha_a_linha(db, livros, relatorio, ids_referencias, usuario_id):
+    for livro in livros:
+        try:
+            alteradas = set()
+            for campo in REFERENCIAS:
+                if resolver_nomes(db, campo, [livro[campo]], ids_referencias[campo], usuario_id):
+                    alteradas.add(REFERENCIAS[campo][0])
+            db.execute(text(INSERIR_LIVRO), parametros_livro(livro, ids_referencias, usuario_id))
+            if alteradas:
+                descartar_apos_commit(db, *alteradas)
+            marcar_alteracao(db, 'Livros')
+            db.commit()
+            relatorio.inseridas += 1
+        except DBAPIError as e:
+            db.rollback()
+            for chave in ids_referencias:
+                ids_referencias[chave].clear()
+            mensagem = str(e.orig).split(",")[-1].replace("'", "").strip(" )")
+            relatorio.erro(livro["linha"], livro["isbn"], mensagem)
+
+
+# Importa os livros lidos de `registros` em lotes de `tamanho_lote`, cada um na sua transação
+def importar_livros(db, registros, usuario_id=None, tamanho_lote=TAMANHO_LOTE):
+    relatorio = RelatorioImportacao()
+    inicio = time.perf_counter()
+    ids_referencias = {campo: {} for campo in REFERENCIAS}
+    isbns_vistos = set()
+    lote = []
+
+    for numero, registro in registros:
+        relatorio.lidas += 1
+        livro = validar(numero, registro, relatorio)
+        if livro is None:
+            continue
+        if livro["isbn"] in isbns_vistos:
+            relatorio.erro(numero, livro["isbn"], "ISBN repetido no arquivo.")
+            continue
+        isbns_vistos.add(livro["isbn"])
+        lote.append(livro)
+        if len(lote) >= tamanho_lote:
+            importar_lote(db, lote, relatorio, ids_referencias, usuario_id)
+            lote = []
+
+    if lote:
+        importar_lote(db, lote, relatorio, ids_referencias, usuario_id)
+
+    relatorio.duracao = time.perf_counter() - inicio
+    return relatorio
+
+
+@click.command('importar')
+@click.argument('arquivo', type=click.Path(exists=True, dir_okay=False))
+@click.option('--formato', type=click.Choice(['csv', 'jsonl']), default=None,
+              help='Formato do arquivo; por padrão, deduzido pela extensão.')
+@click.option('--lote', default=TAMANHO_LOTE, show_default=True, help='Livros por INSERT/transação.')
+def importar(arquivo, formato, lote):
+    """Importa livros de um arquivo CSV ou JSON Lines."""
+    formato = formato or ('jsonl' if arquivo.lower().endswith(('.jsonl', '.json')) else 'csv')
+    db = Session()
+    try:
+        with open(arquivo, 'rb') as fluxo:
+            relatorio = importar_livros(db, abrir_leitor(fluxo, formato), tamanho_lote=lote)
+    finally:
+        db.close()
+
+    for linha, isbn, mensagem in relatorio.erros:
+        click.echo(f"linha {linha} ({isbn or '-'}): {mensagem}", err=True)
+    click.echo(f"{relatorio.inseridas} de {relatorio.lidas} livros importados em {relatorio.duracao:.1f}s "
+               f"({len(relatorio.erros)} erro(s)).")
@@ -0,0 +1,117 @@
+import threading
+
+from . import obter_engine, espera_pool, estatisticas_consultas
+from .replicas import obter_roteador
+
+
+BALDES_LATENCIA = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+BALDES_CONSULTAS = (0, 1, 2, 3, 5, 8, 13, 21, 50, 100)
+
+
+class Histograma:
+    def __init__(self, baldes):
+        self.baldes = baldes
+        self.contagens = [0] * len(baldes)
+        self.soma = 0.0
+        self.total = 0
+
+    def observar(self, valor):
+        for i, limite in enumerate(self.baldes):
+            if valor <= limite:
+                self.contagens[i] += 1
+                break
+        self.soma += valor
+        self.total += 1
+
+    def linhas(self, nome, rotulos):
+        acumulado = 0
+        for limite, contagem in zip(self.baldes, self.contagens):
+            acumulado += contagem
+            yield f'{nome}_bucket{{{rotulos},le="{limite}"}} {acumulado}'
+        yield f'{nome}_bucket{{{rotulos},le="+Inf"}} {self.total}'
+        yield f'{nome}_sum{{{rotulos}}} {self.soma}'
+        yield f'{nome}_count{{{rotulos}}} {self.total}'
+
+
+def _rotulos(**valores):
+    return ",".join(f'{chave}="{valor}"' for chave, valor in valores.items())
+
+
+# Métricas por rota (endpoint do Flask, não o caminho, para não explodir a cardinalidade).
+# Os valores são do processo: com vários workers, o Prometheus agrega as instâncias.
+class Metricas:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latencias = {}
+        self.consultas = {}
+        self.tempo_sql = {}
+        self.respostas = {}
+
+    def registrar(self, rota, metodo, status, segundos, consultas, tempo_sql):
+        chave = (rota or 'desconhecida', metodo)
+        with self._lock:
+            self.latencias.setdefault(chave, Histograma(BALDES_LATENCIA)).observar(segundos)
+            self.consultas.setdefault(chave, Histograma(BALDES_CONSULTAS)).observar(consultas)
+            self.tempo_sql[chave] = self.tempo_sql.get(chave, 0.0) + tempo_sql
+            chave_status = chave + (status,)
+            self.respostas[chave_status] = self.respostas.get(chave_status, 0) + 1
+
+    def exportar(self):
+        linhas = []
+        with self._lock:
+            linhas += ["# HELP biblioteca_requisicao_segundos Latência das requisições por rota.",
+                       "# TYPE biblioteca_requisicao_segundos histogram"]
+            for (rota, metodo), histograma in sorted(self.latencias.items()):
+                linhas += histograma.linhas('biblioteca_requisicao_segundos', _rotulos(rota=rota, metodo=metodo))
+
+            linhas += ["# HELP biblioteca_consultas_por_requisicao Consultas SQL executadas por requisição.",
+                       "# TYPE biblioteca_consultas_por_requisicao histogram"]
+            for (rota, metodo), histograma in sorted(self.consultas.items()):
+                linhas += histograma.linhas('biblioteca_consultas_por_requisicao', _rotulos(rota=rota, metodo=metodo))
+
+            linhas += ["# HELP biblioteca_sql_segundos_total Tempo gasto em SQL por rota.",
+                       "# TYPE biblioteca_sql_segundos_total counter"]
+            for (rota, metodo), segundos in sorted(self.tempo_sql.items()):
+                linhas.append(f'biblioteca_sql_segundos_total{{{_rotulos(rota=rota, metodo=metodo)}}} {segundos}')
+
+            linhas += ["# HELP biblioteca_respostas_total Respostas por rota e status HTTP.",
+                       "# TYPE biblioteca_respostas_total counter"]
+            for (rota, metodo, status), total in sorted(self.respostas.items()):
+                linhas.append(f'biblioteca_respostas_total{{{_rotulos(rota=rota, metodo=metodo, status=status)}}} {total}')
+
+        linhas += [
+            "# TYPE biblioteca_consultas_total counter",
+            f"biblioteca_consultas_total {estatisticas_consultas.consultas}",
+            "# TYPE biblioteca_consultas_lentas_total counter",
+            f"biblioteca_consultas_lentas_total {estatisticas_consultas.lentas}",
+            "# TYPE biblioteca_consultas_segundos_total counter",
+            f"biblioteca_consultas_segundos_total {estatisticas_consultas.total_segundos}",
+            "# TYPE biblioteca_pool_checkouts_total counter",
+            f"biblioteca_pool_checkouts_total {espera_pool.checkouts}",
+            "# TYPE biblioteca_pool_espera_segundos_total counter",
+            f"biblioteca_pool_espera_segundos_total {espera_pool.total_segundos}",
+            "# TYPE biblioteca_pool_espera_maxima_segundos gauge",
+            f"biblioteca_pool_espera_maxima_segundos {espera_pool.maior_segundos}",
+        ]
+
+        # Estado atual do pool (QueuePool); pools sem esses contadores são ignorados
+        pool = obter_engine().pool
+        estados = [('tamanho', 'size'), ('livres', 'checkedin'), ('em_uso', 'checkedout'), ('overflow', 'overflow')]
+        linhas.append("# TYPE biblioteca_pool_conexoes gauge")
+        for estado, metodo in estados:
+            if hasattr(pool, metodo):
+                linhas.append(f'biblioteca_pool_conexoes{{estado="{estado}"}} {getattr(pool, metodo)()}')
+
+        roteador = obter_roteador()
+        if roteador.replicas:
+            linhas += ["# HELP biblioteca_replica_saudavel Réplica no rodízio de leitura (1) ou fora (0).",
+                       "# TYPE biblioteca_replica_saudavel gauge"]
+            linhas += [f"biblioteca_replica_saudavel{{{_rotulos(replica=replica.nome)}}} {int(replica.saudavel)}"
+                       for replica in roteador.replicas]
+            linhas += ["# TYPE biblioteca_replica_atraso_segundos gauge"]
+            linhas += [f"biblioteca_replica_atraso_segundos{{{_rotulos(replica=replica.nome)}}} {replica.atraso}"
+                       for replica in roteador.replicas if replica.atraso is not None]
+        return "\n".join(linhas) + "\n"
+
+
+metricas = Metricas()
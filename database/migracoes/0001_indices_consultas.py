@@ -0,0 +1,34 @@
+from sqlalchemy import text
+
+from . import criar_indice, insert_ignorando
+
+
+# Índices usados pelas consultas mais frequentes da aplicação, e a tabela de versões
+# do cache para bancos criados antes dela existir em database.sql.
+def aplicar(conn):
+    conn.execute(text("""
+        CREATE TABLE IF NOT EXISTS Versoes_tabela (
+            Tabela VARCHAR(50) PRIMARY KEY,
+            Versao INT NOT NULL DEFAULT 0
+        )
+    """))
+    conn.execute(text(f"""
+        {insert_ignorando(conn)} INTO Versoes_tabela (Tabela, Versao)
+        VALUES ('Autores', 0), ('Generos', 0), ('Editoras', 0), ('Usuarios', 0)
+    """))
+
+    # login e cadastro
+    criar_indice(conn, 'Usuarios', 'uq_usuarios_email', ['Email'], unico=True)
+    # add_livro
+    criar_indice(conn, 'Livros', 'uq_livros_isbn', ['ISBN'], unico=True)
+    # paginação do catálogo
+    criar_indice(conn, 'Livros', 'idx_livros_titulo', ['Titulo', 'ID_livro'])
+    criar_indice(conn, 'Livros', 'idx_livros_genero_titulo', ['Genero_id', 'Titulo', 'ID_livro'])
+    criar_indice(conn, 'Livros', 'idx_livros_autor_titulo', ['Autor_id', 'Titulo', 'ID_livro'])
+    criar_indice(conn, 'Livros', 'idx_livros_editora_titulo', ['Editora_id', 'Titulo', 'ID_livro'])
+    # empréstimos do usuário no dashboard
+    criar_indice(conn, 'Emprestimos', 'idx_emprestimos_usuario_data', ['Usuario_id', 'Data_emprestimo'])
+    # verificações dos remover_*
+    criar_indice(conn, 'Emprestimos', 'idx_emprestimos_livro', ['Livro_id'])
+    criar_indice(conn, 'Emprestimos', 'idx_emprestimos_genero_snapshot', ['Livro_genero_id'])
+    criar_indice(conn, 'Emprestimos', 'idx_emprestimos_autor_snapshot', ['Livro_autor_id'])
@@ -0,0 +1,7 @@
+from . import criar_indice
+
+
+# Índices FULLTEXT da busca do catálogo (título/resumo do livro e nome do autor)
+def aplicar(conn):
+    criar_indice(conn, 'Livros', 'ft_livros_titulo_resumo', ['Titulo', 'Resumo'], texto_completo=True)
+    criar_indice(conn, 'Autores', 'ft_autores_nome', ['Nome_autor'], texto_completo=True)
@@ -0,0 +1,7 @@
+from . import criar_indice
+
+
+# Varredura de atrasos e devoluções filtram por Status_emprestimo; o InnoDB acrescenta a chave
+# primária ao índice, então a varredura percorre os pendentes já em ordem de ID_emprestimo.
+def aplicar(conn):
+    criar_indice(conn, 'Emprestimos', 'idx_emprestimos_status', ['Status_emprestimo'])
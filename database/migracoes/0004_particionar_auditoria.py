@@ -0,0 +1,37 @@
+from datetime import date
+
+from sqlalchemy import text
+
+from . import criar_indice
+from ..auditoria import MESES_FUTUROS, definicao_particao, somar_meses, tabela_particionada
+
+
+# Particiona Auditoria_Log por mês em data_hora, para que a retenção remova meses inteiros com
+# DROP PARTITION e consultas por período leiam só as partições do intervalo. O MySQL exige que
+# a coluna de particionamento faça parte de toda chave única, então a PK vira (id_log, data_hora).
+# Outros bancos (SQLite) ficam só com o índice: a retenção apaga os meses antigos em lotes.
+def aplicar(conn):
+    if conn.dialect.name == 'mysql' and not tabela_particionada(conn):
+        conn.execute(text("UPDATE Auditoria_Log SET data_hora = CURRENT_TIMESTAMP WHERE data_hora IS NULL"))
+        conn.execute(text("""
+            ALTER TABLE Auditoria_Log
+                MODIFY data_hora TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+                DROP PRIMARY KEY,
+                ADD PRIMARY KEY (id_log, data_hora)
+        """))
+
+        hoje = date.today()
+        mais_antigo = conn.execute(text("SELECT MIN(data_hora) FROM Auditoria_Log")).scalar() or hoje
+        mes = date(mais_antigo.year, mais_antigo.month, 1)
+        ultimo = somar_meses(date(hoje.year, hoje.month, 1), MESES_FUTUROS)
+        particoes = []
+        while mes <= ultimo:
+            particoes.append(definicao_particao(mes))
+            mes = somar_meses(mes, 1)
+        particoes.append("PARTITION pmax VALUES LESS THAN MAXVALUE")
+
+        conn.execute(text(
+            f"ALTER TABLE Auditoria_Log PARTITION BY RANGE (UNIX_TIMESTAMP(data_hora)) ({', '.join(particoes)})"
+        ))
+
+    criar_indice(conn, 'Auditoria_Log', 'idx_auditoria_data_hora', ['data_hora'])
@@ -0,0 +1,106 @@
+from sqlalchemy import text
+
+from . import eh_sqlite
+from ..contadores import FATIAS, reconstruir
+
+
+# Livros por gênero/autor/editora e empréstimos por livro e por gênero/autor do snapshot,
+# mantidos por gatilhos. As verificações de remover_* consultam estes totais em vez de
+# contar linhas de Livros e Emprestimos.
+
+def ajustar(tipo, referencia, delta):
+    return f"""
+        IF {referencia} IS NOT NULL THEN
+            INSERT INTO Contadores (Tipo, Referencia_id, Fatia, Total)
+            VALUES ('{tipo}', {referencia}, FLOOR(RAND() * {FATIAS}), {delta})
+            ON DUPLICATE KEY UPDATE Total = Total + ({delta});
+        END IF;"""
+
+
+def mover(tipo, coluna):
+    return f"""
+        IF NOT (old.{coluna} <=> new.{coluna}) THEN
+            {ajustar(tipo, 'old.' + coluna, -1)}
+            {ajustar(tipo, 'new.' + coluna, 1)}
+        END IF;"""
+
+
+# SQLite: sem IF nos gatilhos, a condição vai no WHERE do INSERT ... SELECT, e o upsert é
+# ON CONFLICT. Como o SQLite tem um único escritor por vez, não há disputa de lock a dividir
+# e todo contador fica na fatia 0.
+def ajustar_sqlite(tipo, referencia, delta, condicao=None):
+    return f"""
+        INSERT INTO Contadores (Tipo, Referencia_id, Fatia, Total)
+        SELECT '{tipo}', {referencia}, 0, {delta} WHERE {condicao or referencia + ' IS NOT NULL'}
+        ON CONFLICT (Tipo, Referencia_id, Fatia) DO UPDATE SET Total = Total + ({delta});"""
+
+
+def mover_sqlite(tipo, coluna):
+    mudou = f"old.{coluna} IS NOT new.{coluna}"
+    return (ajustar_sqlite(tipo, 'old.' + coluna, -1, f"{mudou} AND old.{coluna} IS NOT NULL")
+            + ajustar_sqlite(tipo, 'new.' + coluna, 1, f"{mudou} AND new.{coluna} IS NOT NULL"))
+
+
+COLUNAS_LIVROS = [('livros_genero', 'Genero_id'), ('livros_autor', 'Autor_id'), ('livros_editora', 'Editora_id')]
+COLUNAS_EMPRESTIMOS = [('emprestimos_livro', 'Livro_id'), ('emprestimos_genero', 'Livro_genero_id'),
+                       ('emprestimos_autor', 'Livro_autor_id')]
+
+GATILHOS = {
+    'trg_contadores_livros_insert': ('AFTER INSERT ON Livros',
+                                     "".join(ajustar(t, 'new.' + c, 1) for t, c in COLUNAS_LIVROS)),
+    'trg_contadores_livros_update': ('AFTER UPDATE ON Livros',
+                                     "".join(mover(t, c) for t, c in COLUNAS_LIVROS)),
+    'trg_contadores_livros_delete': ('AFTER DELETE ON Livros',
+                                     "".join(ajustar(t, 'old.' + c, -1) for t, c in COLUNAS_LIVROS)
+                                     + "\n        DELETE FROM Contadores WHERE Tipo = 'emprestimos_livro'"
+                                       " AND Referencia_id = old.ID_livro;"),
+    'trg_contadores_emprestimos_insert': ('AFTER INSERT ON Emprestimos',
+                                          "".join(ajustar(t, 'new.' + c, 1) for t, c in COLUNAS_EMPRESTIMOS)),
+    'trg_contadores_emprestimos_update': ('AFTER UPDATE ON Emprestimos',
+                                          "".join(mover(t, c) for t, c in COLUNAS_EMPRESTIMOS)),
+    'trg_contadores_emprestimos_delete': ('AFTER DELETE ON Emprestimos',
+                                          "".join(ajustar(t, 'old.' + c, -1) for t, c in COLUNAS_EMPRESTIMOS)),
+}
+
+
+# No SQLite os gatilhos de UPDATE só reagem às colunas contadas, e não aos UPDATE que
+# preenchem valores padrão (ver database_sqlite.sql)
+def colunas(pares):
+    return ', '.join(coluna for _, coluna in pares)
+
+
+GATILHOS_SQLITE = {
+    'trg_contadores_livros_insert': ('AFTER INSERT ON Livros',
+                                     "".join(ajustar_sqlite(t, 'new.' + c, 1) for t, c in COLUNAS_LIVROS)),
+    'trg_contadores_livros_update': (f'AFTER UPDATE OF {colunas(COLUNAS_LIVROS)} ON Livros',
+                                     "".join(mover_sqlite(t, c) for t, c in COLUNAS_LIVROS)),
+    'trg_contadores_livros_delete': ('AFTER DELETE ON Livros',
+                                     "".join(ajustar_sqlite(t, 'old.' + c, -1) for t, c in COLUNAS_LIVROS)
+                                     + "\n        DELETE FROM Contadores WHERE Tipo = 'emprestimos_livro'"
+                                       " AND Referencia_id = old.ID_livro;"),
+    'trg_contadores_emprestimos_insert': ('AFTER INSERT ON Emprestimos',
+                                          "".join(ajustar_sqlite(t, 'new.' + c, 1) for t, c in COLUNAS_EMPRESTIMOS)),
+    'trg_contadores_emprestimos_update': (f'AFTER UPDATE OF {colunas(COLUNAS_EMPRESTIMOS)} ON Emprestimos',
+                                          "".join(mover_sqlite(t, c) for t, c in COLUNAS_EMPRESTIMOS)),
+    'trg_contadores_emprestimos_delete': ('AFTER DELETE ON Emprestimos',
+                                          "".join(ajustar_sqlite(t, 'old.' + c, -1) for t, c in COLUNAS_EMPRESTIMOS)),
+}
+
+
+def aplicar(conn):
+    conn.execute(text("""
+        CREATE TABLE IF NOT EXISTS Contadores (
+            Tipo VARCHAR(30) NOT NULL,
+            Referencia_id INT NOT NULL,
+            Fatia TINYINT NOT NULL DEFAULT 0,
+            Total INT NOT NULL DEFAULT 0,
+            PRIMARY KEY (Tipo, Referencia_id, Fatia)
+        )
+    """))
+
+    for nome, (evento, corpo) in (GATILHOS_SQLITE if eh_sqlite(conn) else GATILHOS).items():
+        conn.execute(text(f"DROP TRIGGER IF EXISTS {nome}"))
+        conn.execute(text(f"CREATE TRIGGER {nome} {evento} FOR EACH ROW BEGIN{corpo}\n    END"))
+
+    # Carga inicial a partir dos dados existentes
+    reconstruir(conn)
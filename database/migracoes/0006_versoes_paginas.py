@@ -0,0 +1,27 @@
+from sqlalchemy import text
+
+from . import insert_ignorando
+
+
+# Versões de Livros e Emprestimos para os ETags das páginas (incrementadas pela aplicação
+# logo após o commit) e gatilhos que incrementam as versões das tabelas de referência em
+# qualquer escrita, inclusive as feitas fora da aplicação. O corpo em BEGIN ... END vale
+# tanto no MySQL quanto no SQLite.
+TABELAS_REFERENCIA = ['Autores', 'Generos', 'Editoras']
+
+
+def aplicar(conn):
+    conn.execute(text(f"""
+        {insert_ignorando(conn)} INTO Versoes_tabela (Tabela, Versao) VALUES ('Livros', 0), ('Emprestimos', 0)
+    """))
+
+    for tabela in TABELAS_REFERENCIA:
+        for operacao in ('insert', 'update', 'delete'):
+            nome = f"trg_versao_{tabela.lower()}_{operacao}"
+            conn.execute(text(f"DROP TRIGGER IF EXISTS {nome}"))
+            conn.execute(text(f"""
+                CREATE TRIGGER {nome} AFTER {operacao.upper()} ON {tabela}
+                FOR EACH ROW BEGIN
+                    UPDATE Versoes_tabela SET Versao = Versao + 1 WHERE Tabela = '{tabela}';
+                END
+            """))
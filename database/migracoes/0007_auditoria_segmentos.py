@@ -0,0 +1,13 @@
+from sqlalchemy import text
+
+
+# Segmentos do spool de auditoria já gravados em Auditoria_Log (AUDITORIA_MODO=aplicacao): o
+# nome entra na mesma transação das linhas, e um segmento que reapareça não é gravado de novo.
+def aplicar(conn):
+    conn.execute(text("""
+        CREATE TABLE IF NOT EXISTS Auditoria_segmentos (
+            Segmento VARCHAR(100) PRIMARY KEY,
+            Registros INT NOT NULL,
+            Gravado_em TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """))
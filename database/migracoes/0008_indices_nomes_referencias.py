@@ -0,0 +1,10 @@
+from . import criar_indice, eh_sqlite
+
+
+# Sugestões por prefixo dos seletores de autor, gênero e editora (LIKE 'prefixo%'). O LIKE do
+# SQLite ignora maiúsculas e só aproveita um índice na collation NOCASE.
+def aplicar(conn):
+    collation = " COLLATE NOCASE" if eh_sqlite(conn) else ""
+    criar_indice(conn, 'Autores', 'idx_autores_nome', ['Nome_autor' + collation])
+    criar_indice(conn, 'Generos', 'idx_generos_nome', ['Nome_genero' + collation])
+    criar_indice(conn, 'Editoras', 'idx_editoras_nome', ['Nome_editora' + collation])
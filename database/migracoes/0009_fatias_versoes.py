@@ -0,0 +1,12 @@
+from sqlalchemy import text
+
+from . import insert_ignorando
+from ..cache import FATIAS_VERSAO, TABELAS_FATIADAS, linha_versao
+
+
+# Fatias 1..FATIAS_VERSAO-1 das versões de Livros e Emprestimos; a fatia 0 é a linha original
+# (migração 0006), e a versão de cada tabela passa a ser a soma das fatias
+def aplicar(conn):
+    conn.execute(text(f"{insert_ignorando(conn)} INTO Versoes_tabela (Tabela, Versao) VALUES (:tabela, 0)"),
+                 [{"tabela": linha_versao(tabela, fatia)}
+                  for tabela in TABELAS_FATIADAS for fatia in range(1, FATIAS_VERSAO)])
@@ -0,0 +1,285 @@
+import importlib.util
+import os
+import re
+
+import click
+from sqlalchemy import text
+
+from .. import obter_engine, repositorio
+from ..contadores import CONTADORES_POR_REFERENCIA
+
+
+DIRETORIO = os.path.dirname(__file__)
+PADRAO_ARQUIVO = re.compile(r'^(\d{4})_(\w+)\.py$')
+# Tabelas e gatilhos de database.sql para o SQLite; no MySQL o schema base vem de database.sql
+SCHEMA_SQLITE = os.path.join(os.path.dirname(DIRETORIO), 'database_sqlite.sql')
+
+
+class ErroMigracao(Exception):
+    pass
+
+
+# Cada migração é um arquivo NNNN_nome.py com uma função aplicar(conn) idempotente
+def listar_migracoes():
+    migracoes = []
+    for arquivo in sorted(os.listdir(DIRETORIO)):
+        encontrado = PADRAO_ARQUIVO.match(arquivo)
+        if not encontrado:
+            continue
+        spec = importlib.util.spec_from_file_location(
+            f"{__name__}.m{encontrado.group(1)}", os.path.join(DIRETORIO, arquivo)
+        )
+        modulo = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(modulo)
+        migracoes.append((int(encontrado.group(1)), encontrado.group(2), modulo))
+    return migracoes
+
+
+def garantir_tabela_controle(conn):
+    conn.execute(text("""
+        CREATE TABLE IF NOT EXISTS Migracoes_schema (
+            Versao INT PRIMARY KEY,
+            Nome VARCHAR(255) NOT NULL,
+            Aplicada_em TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """))
+
+
+# Banco SQLite novo (arquivo vazio): cria tabelas e gatilhos de uma vez. executescript
+# aceita os blocos BEGIN ... END dos gatilhos, que o cursor comum não separa.
+def criar_schema_sqlite(conn):
+    with open(SCHEMA_SQLITE, encoding='utf-8') as arquivo:
+        conn.connection.driver_connection.executescript(arquivo.read())
+
+
+def versoes_aplicadas(conn):
+    return {linha.Versao for linha in conn.execute(text("SELECT Versao FROM Migracoes_schema"))}
+
+
+# Aplica as migrações pendentes em ordem. DDL no MySQL faz commit implícito, por isso
+# cada migração é escrita de forma idempotente e só é registrada depois de concluída:
+# se uma falhar no meio, basta executar o comando de novo.
+def aplicar_pendentes(log=print):
+    aplicadas = []
+    with obter_engine().connect() as conn:
+        if eh_sqlite(conn) and not tabela_existe(conn, 'Livros'):
+            log("Criando o schema SQLite...")
+            criar_schema_sqlite(conn)
+        garantir_tabela_controle(conn)
+        conn.commit()
+        ja_aplicadas = versoes_aplicadas(conn)
+
+        for versao, nome, modulo in listar_migracoes():
+            if versao in ja_aplicadas:
+                continue
+            log(f"Aplicando {versao:04d}_{nome}...")
+            modulo.aplicar(conn)
+            conn.execute(
+                text("INSERT INTO Migracoes_schema (Versao, Nome) VALUES (:versao, :nome)"),
+                {"versao": versao, "nome": nome}
+            )
+            conn.commit()
+            aplicadas.append(versao)
+    return aplicadas
+
+
+# Utilitários para as migrações
+
+def eh_sqlite(conn):
+    return conn.dialect.name == 'sqlite'
+
+
+# INSERT que ignora linhas com chave repetida, na sintaxe do banco
+def insert_ignorando(conn):
+    return "INSERT OR IGNORE" if eh_sqlite(conn) else "INSERT IGNORE"
+
+
+def colunas_dos_indices(conn, tabela):
+    if eh_sqlite(conn):
+        indices = {}
+        for indice in conn.execute(text(f"PRAGMA index_list({tabela})")).fetchall():
+            colunas = conn.execute(text(f"PRAGMA index_info({indice.name})")).fetchall()
+            indices[indice.name] = [coluna.name.lower() for coluna in sorted(colunas, key=lambda c: c.seqno)]
+        return indices
+    linhas = conn.execute(text("""
+        SELECT INDEX_NAME, COLUMN_NAME
+        FROM information_schema.STATISTICS
+        WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = :tabela
+        ORDER BY INDEX_NAME, SEQ_IN_INDEX
+    """), {"tabela": tabela}).fetchall()
+    indices = {}
+    for linha in linhas:
+        indices.setdefault(linha.INDEX_NAME, []).append(linha.COLUMN_NAME.lower())
+    return indices
+
+
+# Cria o índice se ainda não existir um com o mesmo nome ou com as mesmas colunas iniciais
+# (no caso de índice único ou FULLTEXT, só conta um índice com o mesmo nome). O SQLite não
+# tem FULLTEXT: a busca usa LIKE nele, e o índice é ignorado.
+def criar_indice(conn, tabela, nome, colunas, unico=False, texto_completo=False):
+    if texto_completo and eh_sqlite(conn):
+        return False
+    indices = colunas_dos_indices(conn, tabela)
+    if nome in indices:
+        return False
+
+    desejadas = [coluna.lower() for coluna in colunas]
+    if not unico and not texto_completo:
+        # Um índice FULLTEXT com as mesmas colunas não atende comparações nem ordenação
+        texto_completo_existentes = indices_texto_completo(conn, tabela)
+        for nome_existente, existentes in indices.items():
+            if nome_existente not in texto_completo_existentes and existentes[:len(desejadas)] == desejadas:
+                return False
+
+    if unico:
+        duplicados = conn.execute(text(f"""
+            SELECT COUNT(*) FROM (
+                SELECT 1 FROM {tabela}
+                WHERE {' AND '.join(f'{c} IS NOT NULL' for c in colunas)}
+                GROUP BY {', '.join(colunas)}
+                HAVING COUNT(*) > 1
+            ) d
+        """)).scalar()
+        if duplicados:
+            raise ErroMigracao(
+                f"Não é possível criar o índice único {nome}: {duplicados} valor(es) repetido(s) "
+                f"em {tabela}({', '.join(colunas)}). Corrija os dados e execute novamente."
+            )
+
+    tipo = "UNIQUE INDEX" if unico else "FULLTEXT INDEX" if texto_completo else "INDEX"
+    conn.execute(text(f"CREATE {tipo} {nome} ON {tabela} ({', '.join(colunas)})"))
+    return True
+
+
+def indices_texto_completo(conn, tabela):
+    if eh_sqlite(conn):
+        return set()
+    return set(conn.execute(text("""
+        SELECT DISTINCT INDEX_NAME FROM information_schema.STATISTICS
+        WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = :tabela AND INDEX_TYPE = 'FULLTEXT'
+    """), {"tabela": tabela}).scalars())
+
+
+def tabela_existe(conn, tabela):
+    if eh_sqlite(conn):
+        return conn.execute(text("SELECT COUNT(*) FROM sqlite_master WHERE type = 'table' AND name = :tabela"),
+                            {"tabela": tabela}).scalar() > 0
+    return conn.execute(text("""
+        SELECT COUNT(*) FROM information_schema.TABLES
+        WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = :tabela
+    """), {"tabela": tabela}).scalar() > 0
+
+
+# Consultas da aplicação verificadas com EXPLAIN pelo comando `flask db verificar`: as
+# instruções do repositório são as mesmas executadas pelas rotas
+CONSULTAS_VERIFICADAS = [
+    ("load_user", repositorio.USUARIO_POR_ID, {"id": 1}),
+    ("login", repositorio.USUARIO_POR_EMAIL, {"email": "usuario@exemplo.com"}),
+    ("cadastro", repositorio.EMAIL_CADASTRADO, {"email": "usuario@exemplo.com"}),
+    ("add_livro", repositorio.ISBN_CADASTRADO, {"isbn": "9788535914849"}),
+    ("dashboard catálogo", repositorio.consulta_pagina_livros('titulo', (), True, False),
+     {"c0": "M", "c1": 0, "limite": 21}),
+    ("dashboard catálogo por gênero", repositorio.consulta_pagina_livros('titulo', ('genero',), False, False),
+     {"genero": 1, "limite": 21}),
+    ("dashboard empréstimos", repositorio.EMPRESTIMOS_DO_USUARIO, {"uid": 1}),
+    ("emprestar", repositorio.LIVROS_PARA_EMPRESTIMO, {"ids": [1, 2]}),
+    ("devolver", repositorio.EMPRESTIMOS_EM_ABERTO, {"eids": [1, 2], "uid": 1}),
+    ("seletor de autores", lambda conn: repositorio.consulta_sugestoes('autores', conn.dialect.name),
+     {"prefixo": "mach%", "limite": 10}),
+    ("seletor de gêneros", lambda conn: repositorio.consulta_sugestoes('generos', conn.dialect.name),
+     {"prefixo": "rom%", "limite": 10}),
+    ("seletor de editoras", lambda conn: repositorio.consulta_sugestoes('editoras', conn.dialect.name),
+     {"prefixo": "comp%", "limite": 10}),
+    ("remover_* contadores", CONTADORES_POR_REFERENCIA,
+     {"id": 1, "tipos": ['livros_genero', 'emprestimos_genero']}),
+    ("buscar título/resumo", """
+        SELECT ID_livro FROM Livros
+        WHERE MATCH(Titulo, Resumo) AGAINST (:termo IN NATURAL LANGUAGE MODE)
+    """, {"termo": "casmurro"}),
+    ("buscar autor", """
+        SELECT l.ID_livro FROM Autores a JOIN Livros l ON l.Autor_id = a.ID_autor
+        WHERE MATCH(a.Nome_autor) AGAINST (:termo IN NATURAL LANGUAGE MODE)
+    """, {"termo": "machado"}),
+]
+
+
+# SQL de uma instrução do repositório com os parâmetros já no texto, pronto para o EXPLAIN
+def sql_com_parametros(conn, consulta, params):
+    compilada = consulta.params(**params).compile(dialect=conn.dialect, compile_kwargs={"literal_binds": True})
+    return str(compilada)
+
+
+def explicar(conn, consulta, params):
+    prefixo = "EXPLAIN QUERY PLAN " if eh_sqlite(conn) else "EXPLAIN "
+    if isinstance(consulta, str):
+        return conn.execute(text(prefixo + consulta), params)
+    return conn.exec_driver_sql(prefixo + sql_com_parametros(conn, consulta, params))
+
+
+# (tabela, linhas estimadas) de uma linha do plano que lê a tabela inteira, ou None. No SQLite
+# o plano é textual ("SCAN Livros" sem "USING ... INDEX") e não traz estimativa de linhas.
+def full_scan(conn, linha):
+    if eh_sqlite(conn):
+        detalhe = linha['detail']
+        if detalhe.startswith('SCAN ') and ' USING ' not in detalhe:
+            return detalhe.split()[1], '?'
+        return None
+    if linha.get('type') == 'ALL':
+        return linha.get('table'), linha.get('rows')
+    return None
+
+
+# Executa EXPLAIN em cada consulta e devolve (nome, tabela, linhas estimadas) das que fazem full
+# scan. As consultas em texto usam MATCH ... AGAINST, que o SQLite não tem (lá a busca usa LIKE).
+# Uma função recebe a conexão e devolve a instrução montada para o banco dela.
+def verificar_consultas(conn, consultas=CONSULTAS_VERIFICADAS):
+    problemas = []
+    for nome, consulta, params in consultas:
+        if isinstance(consulta, str) and eh_sqlite(conn):
+            continue
+        if callable(consulta):
+            consulta = consulta(conn)
+        for linha in explicar(conn, consulta, params).mappings():
+            encontrado = full_scan(conn, linha)
+            if encontrado:
+                problemas.append((nome, *encontrado))
+    return problemas
+
+
+@click.group('db')
+def db_cli():
+    """Migrações e verificação do schema."""
+
+
+@db_cli.command('upgrade')
+def upgrade():
+    """Aplica as migrações pendentes."""
+    try:
+        aplicadas = aplicar_pendentes(log=click.echo)
+    except ErroMigracao as e:
+        raise click.ClickException(str(e))
+    click.echo(f"{len(aplicadas)} migração(ões) aplicada(s)." if aplicadas else "Schema já está atualizado.")
+
+
+@db_cli.command('status')
+def status():
+    """Lista as migrações e se já foram aplicadas."""
+    with obter_engine().connect() as conn:
+        garantir_tabela_controle(conn)
+        conn.commit()
+        aplicadas = versoes_aplicadas(conn)
+    for versao, nome, _ in listar_migracoes():
+        marcador = "x" if versao in aplicadas else " "
+        click.echo(f"[{marcador}] {versao:04d}_{nome}")
+
+
+@db_cli.command('verificar')
+def verificar():
+    """Executa EXPLAIN nas consultas da aplicação e aponta full table scans."""
+    with obter_engine().connect() as conn:
+        problemas = verificar_consultas(conn)
+    for nome, tabela, linhas in problemas:
+        click.echo(f"FULL SCAN  {nome}: tabela {tabela} (~{linhas} linhas)")
+    if problemas:
+        raise click.ClickException(f"{len(problemas)} consulta(s) com full table scan.")
+    click.echo(f"{len(CONSULTAS_VERIFICADAS)} consultas verificadas, nenhum full scan.")
@@ -0,0 +1,119 @@
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+
+from flask import g, has_app_context
+from sqlalchemy import event, text
+from sqlalchemy.pool import StaticPool
+
+from . import Session, medicao_thread
+
+
+# Threads de consulta compartilhadas pelo processo; 0 desliga o paralelismo
+CONSULTAS_PARALELAS = int(os.environ.get('DB_CONSULTAS_PARALELAS', 4))
+# Limite de cada consulta (ms): no MySQL via max_execution_time, nos demais só na espera
+TIMEOUT_CONSULTA_MS = int(os.environ.get('DB_TIMEOUT_CONSULTA_MS', 5000))
+
+log = logging.getLogger(__name__)
+
+
+def limitar_tempo(conexao, timeout_ms):
+    if conexao.dialect.name == 'mysql':
+        conexao.execute(text(f"SET SESSION max_execution_time = {int(timeout_ms)}"))
+
+
+def restaurar_tempo(conexao):
+    if conexao.dialect.name == 'mysql':
+        conexao.execute(text("SET SESSION max_execution_time = DEFAULT"))
+
+
+class ExecutorConsultas:
+    def __init__(self, trabalhadores):
+        self._executor = None
+        self._livres = threading.BoundedSemaphore(max(trabalhadores, 1))
+        if trabalhadores > 0:
+            self._executor = ThreadPoolExecutor(max_workers=trabalhadores, thread_name_prefix='consultas')
+
+    # Roda `funcao` numa sessão própria (conexão própria do pool, obtida só se a função
+    # realmente consultar o banco) e devolve (resultado, consultas, segundos em SQL).
+    def _executar(self, funcao, timeout_ms, bind):
+        medicao_thread.consultas, medicao_thread.tempo = 0, 0.0
+        db = Session(bind=bind)
+        conexoes = []
+
+        @event.listens_for(db, 'after_begin')
+        def _ao_conectar(sessao, transacao, conexao):
+            limitar_tempo(conexao, timeout_ms)
+            conexoes.append(conexao)
+
+        try:
+            resultado = funcao(db)
+            return resultado, medicao_thread.consultas, medicao_thread.tempo
+        finally:
+            medicao_thread.consultas = None
+            try:
+                for conexao in conexoes:
+                    restaurar_tempo(conexao)
+            finally:
+                db.close()
+
+    # Executa as funções de `tarefas` ({nome: funcao(db)}) ao mesmo tempo e devolve
+    # {nome: resultado}. A primeira roda na sessão da requisição, na própria thread; as
+    # demais vão para o pool, no mesmo banco (primário ou réplica) da sessão da requisição. Sem thread livre, a tarefa roda em série na requisição, para
+    # que picos de acesso não esgotem o pool de conexões. Com StaticPool (SQLite em memória) há
+    # uma única conexão para todas as threads, e tudo roda em série.
+    def consultar(self, db, tarefas, timeout_ms=TIMEOUT_CONSULTA_MS):
+        itens = list(tarefas.items())
+        bind = db.get_bind()
+        paralelo = self._executor is not None and not isinstance(getattr(bind, 'pool', None), StaticPool)
+        futuros = {}
+        em_serie = [itens[0]]
+        for nome, funcao in itens[1:]:
+            if paralelo and self._livres.acquire(blocking=False):
+                futuros[nome] = self._executor.submit(self._executar, funcao, timeout_ms, bind)
+                # Devolve a vaga uma única vez, quando a tarefa termina ou é cancelada ainda na fila
+                futuros[nome].add_done_callback(lambda futuro: self._livres.release())
+            else:
+                em_serie.append((nome, funcao))
+
+        prazo = time.monotonic() + timeout_ms / 1000
+        resultados = {}
+        self._em_serie(db, em_serie, resultados, timeout_ms)
+
+        atrasadas = []
+        for nome, futuro in futuros.items():
+            try:
+                resultado, consultas, segundos = futuro.result(timeout=max(prazo - time.monotonic(), 0))
+            except TimeoutError:
+                # A thread segue até a consulta terminar (ou o banco cortá-la) e o resultado é
+                # descartado; a tarefa roda de novo aqui, com o limite de tempo da requisição
+                futuro.cancel()
+                atrasadas.append((nome, tarefas[nome]))
+                continue
+            resultados[nome] = resultado
+            if has_app_context():
+                g.consultas_sql = g.get('consultas_sql', 0) + consultas
+                g.tempo_sql = g.get('tempo_sql', 0.0) + segundos
+        if atrasadas:
+            log.warning("Consultas paralelas passaram de %d ms; repetidas em série: %s",
+                        timeout_ms, ', '.join(nome for nome, _ in atrasadas))
+            self._em_serie(db, atrasadas, resultados, timeout_ms)
+        return resultados
+
+    def _em_serie(self, db, itens, resultados, timeout_ms):
+        conexao = db.connection()
+        limitar_tempo(conexao, timeout_ms)
+        try:
+            for nome, funcao in itens:
+                resultados[nome] = funcao(db)
+        finally:
+            restaurar_tempo(conexao)
+
+
+executor_consultas = ExecutorConsultas(CONSULTAS_PARALELAS)
+
+
+def consultar_em_paralelo(db, tarefas, timeout_ms=TIMEOUT_CONSULTA_MS):
+    return executor_consultas.consultar(db, tarefas, timeout_ms)
@@ -0,0 +1,186 @@
+import itertools
+import logging
+import os
+import threading
+import time
+
+import click
+from flask import has_request_context, request, session
+from sqlalchemy import event, text
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import DBAPIError
+
+from . import obter_engine, criar_engine, instrumentar
+
+logger = logging.getLogger(__name__)
+
+# Réplicas de leitura: URLs no mesmo formato de DATABASE_URL, separadas por vírgula.
+# Sem réplicas configuradas, tudo vai para o primário.
+REPLICAS_URLS = [url.strip() for url in os.environ.get('DATABASE_REPLICAS', '').split(',') if url.strip()]
+# Segundos em que o usuário lê do primário depois de uma escrita
+JANELA_PRIMARIO = float(os.environ.get('DB_JANELA_PRIMARIO', 5))
+# Réplica com atraso de replicação acima disso (segundos) sai do rodízio até se recuperar
+REPLICA_ATRASO_MAXIMO = float(os.environ.get('DB_REPLICA_ATRASO_MAXIMO', 5))
+# Intervalo entre verificações de saúde e atraso das réplicas (segundos)
+REPLICA_VERIFICACAO = float(os.environ.get('DB_REPLICA_VERIFICACAO', 5))
+
+METODOS_LEITURA = ('GET', 'HEAD')
+CHAVE_PRIMARIO_ATE = '_primario_ate'
+
+
+# Segundos de atraso informados pela réplica; None se a replicação estiver parada ou se o
+# servidor não for réplica. Bancos que não são MySQL (testes locais) contam como sem atraso.
+def atraso_replicacao(conn):
+    if conn.dialect.name != 'mysql':
+        conn.execute(text("SELECT 1"))
+        return 0
+    # SHOW REPLICA STATUS existe a partir do MySQL 8.0.22; antes disso, SHOW SLAVE STATUS
+    for consulta, coluna in (("SHOW REPLICA STATUS", "Seconds_Behind_Source"),
+                             ("SHOW SLAVE STATUS", "Seconds_Behind_Master")):
+        try:
+            linha = conn.execute(text(consulta)).mappings().first()
+        except DBAPIError:
+            continue
+        return None if linha is None else linha[coluna]
+    return None
+
+
+class Replica:
+    def __init__(self, url):
+        self.nome = make_url(url).render_as_string(hide_password=True)
+        self.engine = criar_engine(url)
+        instrumentar(self.engine)
+        event.listen(self.engine, 'handle_error', self._ao_falhar)
+        # Só entra no rodízio depois da primeira verificação
+        self.saudavel = False
+        self.atraso = None
+        self.motivo = 'não verificada'
+
+    def marcar(self, saudavel, atraso=None, motivo=None):
+        if saudavel != self.saudavel:
+            if saudavel:
+                logger.info("Réplica %s de volta ao rodízio (atraso %s s)", self.nome, atraso)
+            else:
+                logger.warning("Réplica %s fora do rodízio: %s", self.nome, motivo)
+        self.saudavel, self.atraso, self.motivo = saudavel, atraso, motivo
+
+    # Conexão perdida durante uma requisição: tira a réplica do rodízio já, sem esperar
+    # a próxima verificação
+    def _ao_falhar(self, contexto):
+        if contexto.is_disconnect:
+            self.marcar(False, motivo=f"conexão perdida: {contexto.original_exception}")
+
+    def verificar(self, atraso_maximo):
+        try:
+            with self.engine.connect() as conn:
+                atraso = atraso_replicacao(conn)
+        except Exception as erro:
+            self.marcar(False, motivo=f"inacessível: {erro}")
+            return
+        if atraso is None:
+            self.marcar(False, motivo="replicação parada")
+        elif atraso > atraso_maximo:
+            self.marcar(False, atraso, f"atraso de {atraso} s")
+        else:
+            self.marcar(True, atraso)
+
+
+# Escolhe a réplica de cada requisição de leitura (rodízio entre as saudáveis) e mantém
+# uma thread por processo verificando saúde e atraso. A thread começa no primeiro uso, e
+# de novo num processo filho após fork, onde a do processo pai não existe.
+class Roteador:
+    def __init__(self, urls, atraso_maximo=REPLICA_ATRASO_MAXIMO, intervalo=REPLICA_VERIFICACAO):
+        self.replicas = [Replica(url) for url in urls]
+        self.atraso_maximo = atraso_maximo
+        self.intervalo = intervalo
+        self._rodizio = itertools.count()
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def verificar(self):
+        for replica in self.replicas:
+            replica.verificar(self.atraso_maximo)
+
+    def _verificar_sempre(self):
+        while True:
+            time.sleep(self.intervalo)
+            try:
+                self.verificar()
+            except Exception:
+                logger.exception("Falha ao verificar as réplicas")
+
+    def _garantir_verificador(self):
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self.verificar()
+            threading.Thread(target=self._verificar_sempre, name='verificador-replicas', daemon=True).start()
+            self._pid = os.getpid()
+
+    def escolher(self):
+        if not self.replicas:
+            return None
+        self._garantir_verificador()
+        saudaveis = [replica for replica in self.replicas if replica.saudavel]
+        if not saudaveis:
+            return None
+        return saudaveis[next(self._rodizio) % len(saudaveis)]
+
+    # Réplica para a requisição atual, ou None para usar o primário: escritas, requisições
+    # fora de um request e usuários dentro da janela após a própria escrita
+    def replica_para_requisicao(self):
+        if not self.replicas or not has_request_context() or request.method not in METODOS_LEITURA:
+            return None
+        if session.get(CHAVE_PRIMARIO_ATE, 0) > time.time():
+            return None
+        return self.escolher()
+
+    def engine_leitura(self):
+        replica = self.replica_para_requisicao()
+        return replica.engine if replica else obter_engine()
+
+
+# Criado no primeiro uso, como o engine do primário (obter_engine): importar o módulo não cria
+# engines. Os engines das réplicas vêm de criar_engine e têm os pools descartados após fork.
+_roteador = None
+_lock_roteador = threading.Lock()
+
+
+def obter_roteador():
+    global _roteador
+    if _roteador is None:
+        with _lock_roteador:
+            if _roteador is None:
+                _roteador = Roteador(REPLICAS_URLS)
+    return _roteador
+
+
+def fixar_no_primario(segundos=JANELA_PRIMARIO):
+    if obter_roteador().replicas and has_request_context():
+        session[CHAVE_PRIMARIO_ATE] = time.time() + segundos
+
+
+def em_replica(db):
+    return db.info.get('replica') is not None
+
+
+@click.group('replicas')
+def replicas_cli():
+    """Réplicas de leitura configuradas em DATABASE_REPLICAS."""
+
+
+@replicas_cli.command('status')
+def status():
+    """Verifica cada réplica e mostra se está no rodízio e o atraso de replicação."""
+    roteador = obter_roteador()
+    if not roteador.replicas:
+        click.echo("Nenhuma réplica configurada (DATABASE_REPLICAS).")
+        return
+    roteador.verificar()
+    for replica in roteador.replicas:
+        if replica.saudavel:
+            click.echo(f"[ok]   {replica.nome}  atraso {replica.atraso} s")
+        else:
+            click.echo(f"[fora] {replica.nome}  {replica.motivo}")
@@ -0,0 +1,543 @@
+from datetime import date, timedelta
+from functools import lru_cache
+
+from sqlalchemy import (MetaData, Table, Column, ForeignKey, Integer, String, Text, Date, Numeric,
+                        select, insert, update, delete, bindparam, case, and_, or_, text, literal)
+
+# Acesso a dados das rotas: tabelas descritas com metadados do SQLAlchemy Core e consultas
+# montadas uma única vez, na importação do módulo. A mesma instrução é reaproveitada em todas
+# as requisições, então o SQL compilado sai do cache do SQLAlchemy em vez de ser refeito a
+# cada chamada. As linhas voltam como registros com __slots__, mais leves que Row.
+# As datas (inscrição, empréstimo, prazo, devolução) são calculadas em Python e enviadas como
+# parâmetros, sem CURDATE()/DATE_ADD, para que as mesmas instruções rodem no MySQL e no SQLite.
+
+metadata = MetaData()
+
+autores = Table(
+    'Autores', metadata,
+    Column('ID_autor', Integer, primary_key=True),
+    Column('Nome_autor', String(255), nullable=False),
+    Column('Nacionalidade', String(255)),
+    Column('Data_nascimento', Date),
+    Column('Biografia', Text),
+    Column('Usuario_id', Integer, ForeignKey('Usuarios.ID_usuario')),
+)
+
+generos = Table(
+    'Generos', metadata,
+    Column('ID_genero', Integer, primary_key=True),
+    Column('Nome_genero', String(255), nullable=False),
+)
+
+editoras = Table(
+    'Editoras', metadata,
+    Column('ID_editora', Integer, primary_key=True),
+    Column('Nome_editora', String(255), nullable=False),
+    Column('Endereco_editora', Text),
+    Column('Usuario_id', Integer, ForeignKey('Usuarios.ID_usuario')),
+)
+
+livros = Table(
+    'Livros', metadata,
+    Column('ID_livro', Integer, primary_key=True),
+    Column('Titulo', String(255), nullable=False),
+    Column('Autor_id', Integer, ForeignKey('Autores.ID_autor')),
+    Column('ISBN', String(13), nullable=False),
+    Column('Ano_publicacao', Integer),
+    Column('Genero_id', Integer, ForeignKey('Generos.ID_genero')),
+    Column('Editora_id', Integer, ForeignKey('Editoras.ID_editora')),
+    Column('Quantidade_disponivel', Integer),
+    Column('Resumo', Text),
+    Column('Usuario_id', Integer, ForeignKey('Usuarios.ID_usuario')),
+)
+
+usuarios = Table(
+    'Usuarios', metadata,
+    Column('ID_usuario', Integer, primary_key=True),
+    Column('Nome_usuario', String(255), nullable=False),
+    Column('Email', String(255)),
+    Column('Numero_telefone', String(15)),
+    Column('Data_inscricao', Date),
+    Column('Multa_atual', Numeric(10, 2)),
+    Column('Senha', String(300)),
+)
+
+emprestimos = Table(
+    'Emprestimos', metadata,
+    Column('ID_emprestimo', Integer, primary_key=True),
+    Column('Usuario_id', Integer, ForeignKey('Usuarios.ID_usuario')),
+    Column('Livro_id', Integer, ForeignKey('Livros.ID_livro')),
+    Column('Data_emprestimo', Date),
+    Column('Data_devolucao_prevista', Date),
+    Column('Data_devolucao_real', Date),
+    # ENUM('pendente', 'devolvido', 'atrasado') no MySQL
+    Column('Status_emprestimo', String(10)),
+    Column('Livro_genero_id', Integer, ForeignKey('Generos.ID_genero')),
+    Column('Livro_autor_id', Integer, ForeignKey('Autores.ID_autor')),
+)
+
+STATUS_EM_ABERTO = ('pendente', 'atrasado')
+PRAZO_EMPRESTIMO_DIAS = 7
+
+
+# Registro com um atributo por coluna da consulta, com os mesmos nomes usados nos templates
+class Registro:
+    __slots__ = ()
+
+    def __init__(self, *valores):
+        for nome, valor in zip(self.__slots__, valores):
+            setattr(self, nome, valor)
+
+    def __repr__(self):
+        campos = ", ".join(f"{nome}={getattr(self, nome)!r}" for nome in self.__slots__)
+        return f"{type(self).__name__}({campos})"
+
+
+def registro(nome, consulta):
+    return type(nome, (Registro,), {'__slots__': tuple(coluna.key for coluna in consulta.selected_columns)})
+
+
+def _todos(db, consulta, classe, params=None):
+    return [classe(*linha) for linha in db.execute(consulta, params)]
+
+
+def _um(db, consulta, classe, params=None):
+    linha = db.execute(consulta, params).first()
+    return classe(*linha) if linha is not None else None
+
+
+# Usuários
+
+USUARIO_POR_ID = select(usuarios.c.ID_usuario, usuarios.c.Nome_usuario, usuarios.c.Email) \
+    .where(usuarios.c.ID_usuario == bindparam('id'))
+Usuario = registro('Usuario', USUARIO_POR_ID)
+
+USUARIO_POR_EMAIL = select(usuarios.c.ID_usuario, usuarios.c.Nome_usuario, usuarios.c.Email, usuarios.c.Senha) \
+    .where(usuarios.c.Email == bindparam('email'))
+UsuarioComSenha = registro('UsuarioComSenha', USUARIO_POR_EMAIL)
+
+EMAIL_CADASTRADO = select(usuarios.c.ID_usuario).where(usuarios.c.Email == bindparam('email')).limit(1)
+
+INSERIR_USUARIO = insert(usuarios).values(
+    Nome_usuario=bindparam('nome'), Email=bindparam('email'), Senha=bindparam('senha'),
+    Data_inscricao=bindparam('hoje'), Multa_atual=0,
+)
+
+ATUALIZAR_SENHA = update(usuarios).where(usuarios.c.ID_usuario == bindparam('id')) \
+    .values(Senha=bindparam('senha'))
+
+
+def buscar_usuario(db, usuario_id):
+    return _um(db, USUARIO_POR_ID, Usuario, {"id": usuario_id})
+
+
+def buscar_usuario_por_email(db, email):
+    return _um(db, USUARIO_POR_EMAIL, UsuarioComSenha, {"email": email})
+
+
+def email_cadastrado(db, email):
+    return db.execute(EMAIL_CADASTRADO, {"email": email}).first() is not None
+
+
+def inserir_usuario(db, nome, email, senha):
+    return db.execute(INSERIR_USUARIO, {"nome": nome, "email": email, "senha": senha,
+                                        "hoje": date.today()}).inserted_primary_key[0]
+
+
+def atualizar_senha(db, usuario_id, senha):
+    db.execute(ATUALIZAR_SENHA, {"id": usuario_id, "senha": senha})
+
+
+# Autores, gêneros e editoras
+
+LISTAR_AUTORES = select(autores.c.ID_autor, autores.c.Nome_autor, autores.c.Nacionalidade, autores.c.Usuario_id) \
+    .order_by(autores.c.Nome_autor)
+AutorResumo = registro('AutorResumo', LISTAR_AUTORES)
+
+AUTOR_POR_ID = select(autores).where(autores.c.ID_autor == bindparam('id'))
+Autor = registro('Autor', AUTOR_POR_ID)
+
+INSERIR_AUTOR = insert(autores).values(
+    Nome_autor=bindparam('nome'), Nacionalidade=bindparam('nacionalidade'),
+    Data_nascimento=bindparam('data_nasc'), Biografia=bindparam('bio'), Usuario_id=bindparam('uid'),
+)
+
+ATUALIZAR_AUTOR = update(autores).where(autores.c.ID_autor == bindparam('id')).values(
+    Nome_autor=bindparam('nome'), Nacionalidade=bindparam('nacionalidade'),
+    Data_nascimento=bindparam('data_nasc'), Biografia=bindparam('bio'),
+)
+
+REMOVER_AUTOR = delete(autores).where(autores.c.ID_autor == bindparam('id'))
+
+LISTAR_GENEROS = select(generos.c.ID_genero, generos.c.Nome_genero).order_by(generos.c.Nome_genero)
+Genero = registro('Genero', LISTAR_GENEROS)
+
+GENERO_POR_ID = select(generos).where(generos.c.ID_genero == bindparam('id'))
+INSERIR_GENERO = insert(generos).values(Nome_genero=bindparam('nome'))
+ATUALIZAR_GENERO = update(generos).where(generos.c.ID_genero == bindparam('id')).values(Nome_genero=bindparam('nome'))
+REMOVER_GENERO = delete(generos).where(generos.c.ID_genero == bindparam('id'))
+
+LISTAR_EDITORAS = select(editoras.c.ID_editora, editoras.c.Nome_editora, editoras.c.Endereco_editora,
+                         editoras.c.Usuario_id).order_by(editoras.c.Nome_editora)
+Editora = registro('Editora', LISTAR_EDITORAS)
+
+EDITORA_POR_ID = select(editoras).where(editoras.c.ID_editora == bindparam('id'))
+INSERIR_EDITORA = insert(editoras).values(
+    Nome_editora=bindparam('nome'), Endereco_editora=bindparam('endereco'), Usuario_id=bindparam('uid'),
+)
+ATUALIZAR_EDITORA = update(editoras).where(editoras.c.ID_editora == bindparam('id')).values(
+    Nome_editora=bindparam('nome'), Endereco_editora=bindparam('endereco'),
+)
+REMOVER_EDITORA = delete(editoras).where(editoras.c.ID_editora == bindparam('id'))
+
+
+def listar_autores(db):
+    return _todos(db, LISTAR_AUTORES, AutorResumo)
+
+
+def buscar_autor(db, autor_id):
+    return _um(db, AUTOR_POR_ID, Autor, {"id": autor_id})
+
+
+def inserir_autor(db, nome, nacionalidade, data_nascimento, biografia, usuario_id):
+    return db.execute(INSERIR_AUTOR, {"nome": nome, "nacionalidade": nacionalidade, "data_nasc": data_nascimento,
+                                      "bio": biografia, "uid": usuario_id}).inserted_primary_key[0]
+
+
+def atualizar_autor(db, autor_id, nome, nacionalidade, data_nascimento, biografia):
+    db.execute(ATUALIZAR_AUTOR, {"id": autor_id, "nome": nome, "nacionalidade": nacionalidade,
+                                 "data_nasc": data_nascimento, "bio": biografia})
+
+
+def remover_autor(db, autor_id):
+    db.execute(REMOVER_AUTOR, {"id": autor_id})
+
+
+def listar_generos(db):
+    return _todos(db, LISTAR_GENEROS, Genero)
+
+
+def buscar_genero(db, genero_id):
+    return _um(db, GENERO_POR_ID, Genero, {"id": genero_id})
+
+
+def inserir_genero(db, nome):
+    db.execute(INSERIR_GENERO, {"nome": nome})
+
+
+def atualizar_genero(db, genero_id, nome):
+    db.execute(ATUALIZAR_GENERO, {"id": genero_id, "nome": nome})
+
+
+def remover_genero(db, genero_id):
+    db.execute(REMOVER_GENERO, {"id": genero_id})
+
+
+def listar_editoras(db):
+    return _todos(db, LISTAR_EDITORAS, Editora)
+
+
+def buscar_editora(db, editora_id):
+    return _um(db, EDITORA_POR_ID, Editora, {"id": editora_id})
+
+
+def inserir_editora(db, nome, endereco, usuario_id):
+    db.execute(INSERIR_EDITORA, {"nome": nome, "endereco": endereco, "uid": usuario_id})
+
+
+def atualizar_editora(db, editora_id, nome, endereco):
+    db.execute(ATUALIZAR_EDITORA, {"id": editora_id, "nome": nome, "endereco": endereco})
+
+
+def remover_editora(db, editora_id):
+    db.execute(REMOVER_EDITORA, {"id": editora_id})
+
+
+# Seletores de autor, gênero e editora dos formulários: sugestões por prefixo do nome e o nome
+# do item já escolhido, sem carregar a tabela inteira (ver /api/<tipo> em app.py)
+REFERENCIAS = {
+    'autores': (autores.c.ID_autor, autores.c.Nome_autor),
+    'generos': (generos.c.ID_genero, generos.c.Nome_genero),
+    'editoras': (editoras.c.ID_editora, editoras.c.Nome_editora),
+}
+
+NOME_REFERENCIA = {
+    tipo: select(nome).where(id_coluna == bindparam('id'))
+    for tipo, (id_coluna, nome) in REFERENCIAS.items()
+}
+
+
+# LIKE 'prefixo%' percorre só o trecho do índice do nome (migração 0008) e o LIMIT para na
+# primeira página. No SQLite o LIKE ignora maiúsculas e só usa um índice COLLATE NOCASE; a
+# ordenação na mesma collation sai pronta do índice, sem ordenar as linhas encontradas.
+@lru_cache(maxsize=None)
+def consulta_sugestoes(tipo, dialeto):
+    id_coluna, nome = REFERENCIAS[tipo]
+    ordem = nome.collate('NOCASE') if dialeto == 'sqlite' else nome
+    return (select(id_coluna.label('id'), nome.label('nome'))
+            .where(nome.like(bindparam('prefixo'), escape='!'))
+            .order_by(ordem, id_coluna)
+            .limit(bindparam('limite', type_=Integer)))
+
+
+Sugestao = registro('Sugestao', consulta_sugestoes('autores', 'mysql'))
+
+
+def sugerir_referencias(db, tipo, prefixo, limite):
+    consulta = consulta_sugestoes(tipo, db.get_bind().dialect.name)
+    # '!' é o caractere de escape do LIKE, como na busca do catálogo
+    padrao = prefixo.replace('!', '!!').replace('%', '!%').replace('_', '!_') + '%'
+    return _todos(db, consulta, Sugestao, {"prefixo": padrao, "limite": limite})
+
+
+def nome_referencia(db, tipo, referencia_id):
+    return db.execute(NOME_REFERENCIA[tipo], {"id": referencia_id}).scalar()
+
+
+# Livros
+
+LIVRO_POR_ID = select(livros).where(livros.c.ID_livro == bindparam('id'))
+Livro = registro('Livro', LIVRO_POR_ID)
+
+ISBN_CADASTRADO = select(livros.c.ID_livro).where(livros.c.ISBN == bindparam('isbn')).limit(1)
+
+DONO_LIVRO = select(livros.c.Usuario_id, livros.c.Titulo, livros.c.ISBN).where(livros.c.ID_livro == bindparam('id'))
+DonoLivro = registro('DonoLivro', DONO_LIVRO)
+
+# Estoque dos livros pedidos numa só consulta, travando as linhas até o commit (ver
+# realizar_emprestimos em app.py). A ordem por ID faz pedidos concorrentes travarem os
+# mesmos livros sempre na mesma sequência, sem deadlock entre si.
+LIVROS_PARA_EMPRESTIMO = select(
+    livros.c.ID_livro, livros.c.Titulo, livros.c.Quantidade_disponivel, livros.c.Autor_id, livros.c.Genero_id,
+).where(livros.c.ID_livro.in_(bindparam('ids', expanding=True))) \
+    .order_by(livros.c.ID_livro).with_for_update()
+LivroEmprestimo = registro('LivroEmprestimo', LIVROS_PARA_EMPRESTIMO)
+
+_VALORES_LIVRO = dict(
+    Titulo=bindparam('titulo'), ISBN=bindparam('isbn'), Ano_publicacao=bindparam('ano'),
+    Quantidade_disponivel=bindparam('qtd'), Resumo=bindparam('resumo'), Autor_id=bindparam('autor_id'),
+    Genero_id=bindparam('genero_id'), Editora_id=bindparam('editora_id'),
+)
+INSERIR_LIVRO = insert(livros).values(Usuario_id=bindparam('uid'), **_VALORES_LIVRO)
+ATUALIZAR_LIVRO = update(livros).where(livros.c.ID_livro == bindparam('id')).values(**_VALORES_LIVRO)
+REMOVER_LIVRO = delete(livros).where(livros.c.ID_livro == bindparam('id'))
+
+
+def buscar_livro(db, livro_id):
+    return _um(db, LIVRO_POR_ID, Livro, {"id": livro_id})
+
+
+def isbn_cadastrado(db, isbn):
+    return db.execute(ISBN_CADASTRADO, {"isbn": isbn}).first() is not None
+
+
+def buscar_dono_livro(db, livro_id):
+    return _um(db, DONO_LIVRO, DonoLivro, {"id": livro_id})
+
+
+def livros_para_emprestimo(db, livros_ids):
+    return _todos(db, LIVROS_PARA_EMPRESTIMO, LivroEmprestimo, {"ids": list(livros_ids)})
+
+
+def _dados_livro(titulo, isbn, ano, quantidade, resumo, autor_id, genero_id, editora_id):
+    return {"titulo": titulo, "isbn": isbn, "ano": ano, "qtd": quantidade, "resumo": resumo,
+            "autor_id": autor_id, "genero_id": genero_id, "editora_id": editora_id}
+
+
+def inserir_livro(db, titulo, isbn, ano, quantidade, resumo, autor_id, genero_id, editora_id, usuario_id):
+    params = _dados_livro(titulo, isbn, ano, quantidade, resumo, autor_id, genero_id, editora_id)
+    db.execute(INSERIR_LIVRO, dict(params, uid=usuario_id))
+
+
+def atualizar_livro(db, livro_id, titulo, isbn, ano, quantidade, resumo, autor_id, genero_id, editora_id):
+    params = _dados_livro(titulo, isbn, ano, quantidade, resumo, autor_id, genero_id, editora_id)
+    db.execute(ATUALIZAR_LIVRO, dict(params, id=livro_id))
+
+
+def remover_livro(db, livro_id):
+    db.execute(REMOVER_LIVRO, {"id": livro_id})
+
+
+# Catálogo paginado por keyset
+
+# Ordenações disponíveis no catálogo: colunas da chave do cursor e se a ordem é decrescente.
+# A última coluna é sempre ID_livro, garantindo uma chave única para a paginação.
+ORDENACOES_LIVROS = {
+    'titulo': (('Titulo', 'ID_livro'), False),
+    'titulo_desc': (('Titulo', 'ID_livro'), True),
+    'recentes': (('ID_livro',), True),
+    'antigos': (('ID_livro',), False),
+}
+
+FILTROS_LIVROS = {
+    'genero': livros.c.Genero_id,
+    'autor': livros.c.Autor_id,
+    'editora': livros.c.Editora_id,
+}
+
+PAGINA_LIVROS = select(livros.c.ID_livro, livros.c.Titulo, livros.c.Ano_publicacao, livros.c.Quantidade_disponivel)
+LivroResumo = registro('LivroResumo', PAGINA_LIVROS)
+
+
+# Uma instrução por formato de consulta (ordem, filtros usados, com ou sem cursor, sentido):
+# montada no primeiro uso e reaproveitada depois, como as demais deste módulo.
+@lru_cache(maxsize=None)
+def consulta_pagina_livros(ordem, filtros, com_cursor, decrescente):
+    colunas = [livros.c[nome] for nome in ORDENACOES_LIVROS[ordem][0]]
+    condicoes = [FILTROS_LIVROS[nome] == bindparam(nome) for nome in filtros if nome in FILTROS_LIVROS]
+    if 'disponiveis' in filtros:
+        condicoes.append(livros.c.Quantidade_disponivel > 0)
+
+    if com_cursor:
+        # (a, b) > (x, y)  =>  a > x OR (a = x AND b > y), forma que o otimizador usa como range
+        alternativas = []
+        for i, coluna in enumerate(colunas):
+            partes = [anterior == bindparam(f"c{j}") for j, anterior in enumerate(colunas[:i])]
+            valor = bindparam(f"c{i}")
+            partes.append(coluna < valor if decrescente else coluna > valor)
+            alternativas.append(and_(*partes))
+        condicoes.append(or_(*alternativas))
+
+    return (PAGINA_LIVROS.where(*condicoes)
+            .order_by(*[coluna.desc() if decrescente else coluna.asc() for coluna in colunas])
+            .limit(bindparam('limite', type_=Integer)))
+
+
+# Livros da página: `filtros` ({nome: valor}) só com os filtros ativos, `valores` é a chave
+# do cursor (ou None na primeira página)
+def pagina_livros(db, ordem, filtros, valores, decrescente, limite):
+    consulta = consulta_pagina_livros(ordem, tuple(sorted(filtros)), valores is not None, decrescente)
+    params = {"limite": limite}
+    params.update({nome: valor for nome, valor in filtros.items() if nome in FILTROS_LIVROS})
+    if valores is not None:
+        params.update({f"c{i}": valor for i, valor in enumerate(valores)})
+    return _todos(db, consulta, LivroResumo, params)
+
+
+# Busca
+
+# Busca por relevância usando os índices FULLTEXT de Livros(Titulo, Resumo) e Autores(Nome_autor).
+# Cada ramo do UNION usa o seu índice; a relevância de um livro é a soma dos dois ramos.
+# MATCH ... AGAINST não tem equivalente no Core: fica como texto, também montado uma vez.
+BUSCA_FULLTEXT = text("""
+    SELECT l.ID_livro, l.Titulo, l.Ano_publicacao, l.Quantidade_disponivel, a.Nome_autor, r.relevancia
+    FROM (
+        SELECT ID_livro, SUM(relevancia) AS relevancia
+        FROM (
+            SELECT ID_livro, MATCH(Titulo, Resumo) AGAINST (:termo IN NATURAL LANGUAGE MODE) AS relevancia
+            FROM Livros
+            WHERE MATCH(Titulo, Resumo) AGAINST (:termo IN NATURAL LANGUAGE MODE)
+            UNION ALL
+            SELECT l.ID_livro, MATCH(a.Nome_autor) AGAINST (:termo IN NATURAL LANGUAGE MODE)
+            FROM Autores a
+            JOIN Livros l ON l.Autor_id = a.ID_autor
+            WHERE MATCH(a.Nome_autor) AGAINST (:termo IN NATURAL LANGUAGE MODE)
+        ) candidatos
+        GROUP BY ID_livro
+        ORDER BY relevancia DESC, ID_livro
+        LIMIT :limite OFFSET :deslocamento
+    ) r
+    JOIN Livros l ON l.ID_livro = r.ID_livro
+    LEFT JOIN Autores a ON a.ID_autor = l.Autor_id
+    ORDER BY r.relevancia DESC, l.ID_livro
+""")
+
+_COLUNAS_BUSCA = (livros.c.ID_livro, livros.c.Titulo, livros.c.Ano_publicacao, livros.c.Quantidade_disponivel,
+                  autores.c.Nome_autor)
+_LIVROS_COM_AUTOR = livros.outerjoin(autores, autores.c.ID_autor == livros.c.Autor_id)
+
+# Alternativa para bancos sem busca FULLTEXT: LIKE com peso maior para título que começa com o termo.
+# '!' é o caractere de escape dos LIKE, igual no MySQL e no SQLite.
+_RELEVANCIA_LIKE = case(
+    (livros.c.Titulo.like(bindparam('prefixo'), escape='!'), 3),
+    (livros.c.Titulo.like(bindparam('contem'), escape='!'), 2),
+    (autores.c.Nome_autor.like(bindparam('contem'), escape='!'), 1.5),
+    else_=1,
+).label('relevancia')
+
+BUSCA_LIKE = select(*_COLUNAS_BUSCA, _RELEVANCIA_LIKE).select_from(_LIVROS_COM_AUTOR).where(or_(
+    livros.c.Titulo.like(bindparam('contem'), escape='!'),
+    livros.c.Resumo.like(bindparam('contem'), escape='!'),
+    autores.c.Nome_autor.like(bindparam('contem'), escape='!'),
+)).order_by(_RELEVANCIA_LIKE.desc(), livros.c.ID_livro) \
+    .limit(bindparam('limite', type_=Integer)).offset(bindparam('deslocamento', type_=Integer))
+
+# Termos menores que innodb_ft_min_token_size (3 por padrão) não estão no índice FULLTEXT:
+# busca apenas títulos que começam com o termo, pelo índice idx_livros_titulo.
+BUSCA_PREFIXO = select(*_COLUNAS_BUSCA, literal(1).label('relevancia')).select_from(_LIVROS_COM_AUTOR) \
+    .where(livros.c.Titulo.like(bindparam('prefixo'), escape='!')) \
+    .order_by(livros.c.Titulo, livros.c.ID_livro) \
+    .limit(bindparam('limite', type_=Integer)).offset(bindparam('deslocamento', type_=Integer))
+ResultadoBusca = registro('ResultadoBusca', BUSCA_LIKE)
+
+
+def buscar_livros_fulltext(db, termo, limite, deslocamento):
+    return _todos(db, BUSCA_FULLTEXT, ResultadoBusca,
+                  {"termo": termo, "limite": limite, "deslocamento": deslocamento})
+
+
+# `termo` já escapado para LIKE
+def buscar_livros_like(db, termo, limite, deslocamento):
+    return _todos(db, BUSCA_LIKE, ResultadoBusca, {
+        "prefixo": f"{termo}%", "contem": f"%{termo}%", "limite": limite, "deslocamento": deslocamento,
+    })
+
+
+def buscar_livros_prefixo(db, termo, limite, deslocamento):
+    return _todos(db, BUSCA_PREFIXO, ResultadoBusca,
+                  {"prefixo": f"{termo}%", "limite": limite, "deslocamento": deslocamento})
+
+
+# Empréstimos
+
+EMPRESTIMOS_DO_USUARIO = select(
+    emprestimos.c.ID_emprestimo, livros.c.Titulo, emprestimos.c.Data_emprestimo,
+    emprestimos.c.Data_devolucao_prevista, emprestimos.c.Status_emprestimo,
+).select_from(emprestimos.join(livros, emprestimos.c.Livro_id == livros.c.ID_livro)) \
+    .where(emprestimos.c.Usuario_id == bindparam('uid')) \
+    .order_by(emprestimos.c.Data_emprestimo.desc())
+EmprestimoUsuario = registro('EmprestimoUsuario', EMPRESTIMOS_DO_USUARIO)
+
+# Cria o empréstimo salvando snapshot de autor e gênero
+INSERIR_EMPRESTIMO = insert(emprestimos).values(
+    Usuario_id=bindparam('uid'), Livro_id=bindparam('lid'),
+    Data_emprestimo=bindparam('hoje'), Data_devolucao_prevista=bindparam('prevista'),
+    Status_emprestimo='pendente',
+    Livro_genero_id=bindparam('gen_id'), Livro_autor_id=bindparam('aut_id'),
+)
+
+# Dos empréstimos pedidos, os que são do usuário e ainda não foram devolvidos
+EMPRESTIMOS_EM_ABERTO = select(emprestimos.c.ID_emprestimo).where(
+    emprestimos.c.ID_emprestimo.in_(bindparam('eids', expanding=True)),
+    emprestimos.c.Usuario_id == bindparam('uid'),
+    emprestimos.c.Status_emprestimo.in_(STATUS_EM_ABERTO),
+).with_for_update()
+
+MARCAR_DEVOLVIDOS = update(emprestimos) \
+    .where(emprestimos.c.ID_emprestimo.in_(bindparam('eids', expanding=True))) \
+    .values(Status_emprestimo='devolvido', Data_devolucao_real=bindparam('hoje'))
+
+
+def emprestimos_do_usuario(db, usuario_id):
+    return _todos(db, EMPRESTIMOS_DO_USUARIO, EmprestimoUsuario, {"uid": usuario_id})
+
+
+# Um empréstimo por livro de `livros` (registros de livros_para_emprestimo), num único
+# executemany: o PyMySQL o reescreve como um INSERT com várias linhas
+def inserir_emprestimos(db, usuario_id, livros):
+    hoje = date.today()
+    prevista = hoje + timedelta(days=PRAZO_EMPRESTIMO_DIAS)
+    db.execute(INSERIR_EMPRESTIMO, [
+        {"uid": usuario_id, "lid": livro.ID_livro, "gen_id": livro.Genero_id, "aut_id": livro.Autor_id,
+         "hoje": hoje, "prevista": prevista}
+        for livro in livros
+    ])
+
+
+def emprestimos_em_aberto(db, emprestimos_ids, usuario_id):
+    return {linha[0] for linha in db.execute(EMPRESTIMOS_EM_ABERTO,
+                                               {"eids": list(emprestimos_ids), "uid": usuario_id})}
+
+
+def marcar_devolvidos(db, emprestimos_ids):
+    db.execute(MARCAR_DEVOLVIDOS, {"eids": list(emprestimos_ids), "hoje": date.today()})
@@ -0,0 +1,103 @@
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as TempoEsgotado
+from concurrent.futures.process import BrokenProcessPool
+
+from werkzeug.security import generate_password_hash, check_password_hash
+
+# Método e custo dos hashes novos, no formato do Werkzeug ("scrypt:N:r:p" ou
+# "pbkdf2:sha256:iterações"). Hashes gravados com outro método são refeitos no login.
+METODO_SENHA = os.environ.get('SENHA_METODO', 'scrypt:32768:8:1')
+# Processos dedicados ao hash; 0 calcula na própria thread da requisição
+SENHA_PROCESSOS = int(os.environ.get('SENHA_PROCESSOS', min(4, os.cpu_count() or 1)))
+# Hashes aguardando ou em cálculo; acima disso a requisição é recusada (503)
+SENHA_FILA_MAXIMA = int(os.environ.get('SENHA_FILA_MAXIMA', 32))
+SENHA_TIMEOUT = float(os.environ.get('SENHA_TIMEOUT', 10))
+
+
+class SobrecargaSenhas(Exception):
+    pass
+
+
+def _contexto_processos():
+    metodos = multiprocessing.get_all_start_methods()
+    return multiprocessing.get_context('forkserver' if 'forkserver' in metodos else 'spawn')
+
+
+# Pool de processos para hash de senha: tira o cálculo (caro de propósito) das threads de
+# requisição e do GIL. O pool é criado no primeiro uso e recriado após um fork do servidor.
+class PoolSenhas:
+    def __init__(self, processos=SENHA_PROCESSOS, fila_maxima=SENHA_FILA_MAXIMA, timeout=SENHA_TIMEOUT):
+        self.processos = processos
+        self.fila_maxima = fila_maxima
+        self.timeout = timeout
+        self._executor = None
+        self._pid = None
+        self._pendentes = 0
+        self._lock = threading.Lock()
+
+    def _obter_executor(self):
+        if self._executor is None or self._pid != os.getpid():
+            self._executor = ProcessPoolExecutor(max_workers=self.processos, mp_context=_contexto_processos())
+            self._pid = os.getpid()
+        return self._executor
+
+    def _concluido(self, _futuro):
+        with self._lock:
+            self._pendentes -= 1
+
+    def executar(self, funcao, *args):
+        with self._lock:
+            if self._pendentes >= self.fila_maxima:
+                raise SobrecargaSenhas()
+            self._pendentes += 1
+
+        if self.processos <= 0:
+            try:
+                return funcao(*args)
+            finally:
+                self._concluido(None)
+
+        try:
+            with self._lock:
+                futuro = self._obter_executor().submit(funcao, *args)
+        except Exception:
+            self._concluido(None)
+            raise
+        futuro.add_done_callback(self._concluido)
+        try:
+            return futuro.result(timeout=self.timeout)
+        except TempoEsgotado:
+            raise SobrecargaSenhas()
+        except BrokenProcessPool:
+            # Um processo morreu (ex.: OOM): o próximo uso cria um pool novo
+            with self._lock:
+                self._executor = None
+            raise
+
+    def pendentes(self):
+        with self._lock:
+            return self._pendentes
+
+    def encerrar(self):
+        with self._lock:
+            if self._executor is not None and self._pid == os.getpid():
+                self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+pool_senhas = PoolSenhas()
+
+
+def gerar_hash(senha):
+    return pool_senhas.executar(generate_password_hash, senha, METODO_SENHA)
+
+
+def verificar_hash(hash_senha, senha):
+    return pool_senhas.executar(check_password_hash, hash_senha, senha)
+
+
+# Hash gravado com método ou custo diferentes do configurado
+def precisa_atualizar(hash_senha):
+    return hash_senha.split('$', 1)[0] != METODO_SENHA
@@ -0,0 +1,124 @@
+import logging
+import os
+import threading
+import time
+from datetime import date
+
+import click
+from sqlalchemy import text, bindparam
+
+from . import obter_engine
+from .auditoria import auditoria_na_aplicacao, registros_multas_atraso, transacao_auditada
+from .cache import incrementar_versoes
+
+logger = logging.getLogger(__name__)
+
+LOTE_ATRASOS = 500
+
+
+class ResultadoVarredura:
+    def __init__(self):
+        self.processados = 0
+        self.lotes = 0
+        self.duracao = 0.0
+
+
+# Marca como 'atrasado' os empréstimos pendentes com devolução prevista anterior a hoje.
+# Percorre os candidatos por ID (keyset) e atualiza cada lote com um único UPDATE em uma
+# transação curta, para não segurar locks em Emprestimos enquanto empréstimos e devoluções
+# continuam. O gatilho trg_emprestimo_multa_atraso aplica a multa de cada empréstimo marcado.
+# Execuções simultâneas (vários processos) são seguras: o UPDATE só altera quem ainda está pendente.
+# Com AUDITORIA_MODO=aplicacao, as multas do lote vão para o spool de auditoria no mesmo commit.
+def marcar_atrasados(lote=LOTE_ATRASOS, pausa=0.0, hoje=None):
+    resultado = ResultadoVarredura()
+    inicio = time.perf_counter()
+    hoje = hoje or date.today()
+    ultimo_id = 0
+
+    selecionar = text("""
+        SELECT ID_emprestimo
+        FROM Emprestimos
+        WHERE Status_emprestimo = 'pendente'
+          AND ID_emprestimo > :ultimo
+          AND Data_devolucao_prevista < :hoje
+        ORDER BY ID_emprestimo
+        LIMIT :lote
+    """)
+    atualizar = text("""
+        UPDATE Emprestimos
+        SET Status_emprestimo = 'atrasado'
+        WHERE ID_emprestimo IN :ids
+          AND Status_emprestimo = 'pendente'
+    """).bindparams(bindparam("ids", expanding=True))
+
+    while True:
+        with transacao_auditada() as (conn, auditoria):
+            ids = [linha[0] for linha in conn.execute(selecionar, {"ultimo": ultimo_id, "hoje": hoje, "lote": lote})]
+            if not ids:
+                break
+            if auditoria_na_aplicacao():
+                auditoria.extend(registros_multas_atraso(conn, ids))
+            resultado.processados += conn.execute(atualizar, {"ids": ids}).rowcount
+        resultado.lotes += 1
+        ultimo_id = ids[-1]
+        if len(ids) < lote:
+            break
+        if pausa:
+            time.sleep(pausa)
+
+    # Uma única vez ao final, para não disputar a linha de versão com os empréstimos
+    if resultado.processados:
+        with obter_engine().begin() as conn:
+            incrementar_versoes(conn, 'Emprestimos')
+
+    resultado.duracao = time.perf_counter() - inicio
+    return resultado
+
+
+# Agendador em processo: executa a varredura a cada `intervalo` segundos em uma thread daemon
+def iniciar_agendador_atrasos(intervalo, lote=LOTE_ATRASOS):
+    def executar():
+        while True:
+            time.sleep(intervalo)
+            try:
+                resultado = marcar_atrasados(lote=lote)
+                logger.info("Varredura de atrasos: %d empréstimo(s) em %d lote(s), %.2fs",
+                            resultado.processados, resultado.lotes, resultado.duracao)
+            except Exception:
+                logger.exception("Falha na varredura de empréstimos atrasados")
+
+    thread = threading.Thread(target=executar, name="varredura-atrasos", daemon=True)
+    thread.start()
+    return thread
+
+
+# O agendador começa na primeira requisição de cada processo: com gunicorn --preload, a
+# aplicação é criada no mestre e uma thread iniciada ali não existiria nos workers.
+_agendador_pid = None
+_lock_agendador = threading.Lock()
+
+
+def garantir_agendador_atrasos(intervalo):
+    global _agendador_pid
+    if _agendador_pid == os.getpid():
+        return
+    with _lock_agendador:
+        if _agendador_pid != os.getpid():
+            iniciar_agendador_atrasos(intervalo)
+            _agendador_pid = os.getpid()
+
+
+def configurar_agendador(app):
+    intervalo = float(os.environ.get('AGENDAR_ATRASOS_SEGUNDOS', 0))
+    if intervalo > 0 and not app.config.get('TESTING'):
+        app.before_request(lambda: garantir_agendador_atrasos(intervalo))
+
+
+@click.command('atrasos')
+@click.option('--lote', default=LOTE_ATRASOS, show_default=True, help='Empréstimos por UPDATE/transação.')
+@click.option('--pausa', default=0.0, show_default=True, help='Pausa entre lotes, em segundos.')
+def atrasos(lote, pausa):
+    """Marca como atrasados os empréstimos pendentes vencidos (aplica as multas)."""
+    resultado = marcar_atrasados(lote=lote, pausa=pausa)
+    click.echo(f"{resultado.processados} empréstimo(s) marcados como atrasados em "
+               f"{resultado.lotes} lote(s), {resultado.duracao:.2f}s.")
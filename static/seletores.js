@@ -0,0 +1,61 @@
+// Seletores de autor, gênero e editora (templates/seletores.html): enquanto o usuário digita,
+// busca sugestões por prefixo em /api/<tipo> e preenche o datalist. O texto precisa ser uma das
+// sugestões (ou o nome já escolhido); o ID correspondente vai no campo oculto do formulário.
+(function () {
+    const ESPERA_MS = 150;
+    const respostas = new Map();
+
+    function buscar(url, prefixo) {
+        const endereco = url + '?q=' + encodeURIComponent(prefixo);
+        if (!respostas.has(endereco)) {
+            const pedido = fetch(endereco, { credentials: 'same-origin', headers: { Accept: 'application/json' } })
+                .then((resposta) => {
+                    if (!resposta.ok) throw new Error(resposta.status);
+                    return resposta.json();
+                })
+                .then((dados) => dados.itens);
+            pedido.catch(() => respostas.delete(endereco));
+            respostas.set(endereco, pedido);
+        }
+        return respostas.get(endereco);
+    }
+
+    function iniciar(seletor) {
+        const texto = seletor.querySelector('input[type=text]');
+        const oculto = seletor.querySelector('input[type=hidden]');
+        const lista = seletor.querySelector('datalist');
+        let escolhido = oculto.value ? { id: oculto.value, nome: texto.value } : null;
+        let itens = [];
+        let espera = null;
+
+        function conferir() {
+            const nome = texto.value.trim().toLowerCase();
+            if (escolhido && escolhido.nome.toLowerCase() !== nome) escolhido = null;
+            if (!escolhido && nome) escolhido = itens.find((item) => item.nome.toLowerCase() === nome) || null;
+            oculto.value = escolhido ? escolhido.id : '';
+            texto.setCustomValidity(nome && !escolhido ? 'Escolha uma das sugestões.' : '');
+        }
+
+        function sugerir() {
+            const prefixo = texto.value.trim();
+            buscar(seletor.dataset.url, prefixo).then((novos) => {
+                if (texto.value.trim() !== prefixo) return;
+                itens = novos;
+                lista.replaceChildren(...novos.map((item) => new Option(item.nome, item.nome)));
+                conferir();
+            }, () => {});
+        }
+
+        texto.addEventListener('input', () => {
+            conferir();
+            clearTimeout(espera);
+            espera = setTimeout(sugerir, ESPERA_MS);
+        });
+        texto.addEventListener('focus', () => {
+            if (!itens.length) sugerir();
+        });
+        conferir();
+    }
+
+    document.querySelectorAll('.seletor').forEach(iniciar);
+})();
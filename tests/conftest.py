@@ -0,0 +1,25 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app
+from database.migracoes import aplicar_pendentes
+
+
+def pytest_configure(config):
+    config.addinivalue_line("markers", "slow: cenários grandes; pule com -m 'not slow'")
+
+
+# Aplicação num banco SQLite em arquivo, novo a cada teste, com todas as migrações aplicadas
+@pytest.fixture
+def app(tmp_path):
+    aplicacao = create_app({
+        'SECRET_KEY': 'teste',
+        'DATABASE_URL': f"sqlite:///{tmp_path / 'biblioteca.db'}",
+    })
+    with aplicacao.app_context():
+        aplicar_pendentes(log=lambda mensagem: None)
+    return aplicacao
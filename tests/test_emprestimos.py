@@ -0,0 +1,68 @@
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+
+import pytest
+from sqlalchemy import text
+
+from database import Session
+
+# Vazão mínima (empréstimos por segundo) exigida no cenário grande; 0 só mede
+VAZAO_MINIMA = float(os.environ.get('TESTE_VAZAO_MINIMA', 50))
+
+
+def preparar(estoque, leitores):
+    db = Session()
+    try:
+        livro_id = db.execute(text("""
+            INSERT INTO Livros (Titulo, ISBN, Ano_publicacao, Quantidade_disponivel, Resumo)
+            VALUES ('Livro disputado', '9780000000001', 2000, :qtd, 'Teste de concorrência')
+        """), {"qtd": estoque}).lastrowid
+        usuarios = [db.execute(text("""
+            INSERT INTO Usuarios (Nome_usuario, Email, Data_inscricao, Multa_atual)
+            VALUES (:nome, :email, :hoje, 0)
+        """), {"nome": f"Leitor {i}", "email": f"leitor{i}@exemplo.com", "hoje": date.today()}).lastrowid
+                    for i in range(leitores)]
+        db.commit()
+        return livro_id, usuarios
+    finally:
+        db.close()
+
+
+# Mais leitores que exemplares pedindo o mesmo livro ao mesmo tempo: o estoque não pode
+# ficar negativo nem sobrar exemplar, e cada exemplar gera um único empréstimo. O cenário
+# grande (marcado slow) também mede a vazão e exige pelo menos VAZAO_MINIMA pedidos/s.
+@pytest.mark.parametrize("estoque, leitores, threads, vazao_minima", [
+    (5, 40, 16, 0),
+    pytest.param(50, 300, 32, VAZAO_MINIMA, marks=pytest.mark.slow),
+])
+def test_emprestimos_simultaneos_nao_passam_do_estoque(app, estoque, leitores, threads, vazao_minima):
+    livro_id, usuarios = preparar(estoque, leitores)
+
+    def emprestar(usuario_id):
+        with app.test_client() as cliente:
+            with cliente.session_transaction() as sessao:
+                sessao['_user_id'] = str(usuario_id)
+            return cliente.post(f'/emprestar/{livro_id}').status_code
+
+    inicio = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        status = list(executor.map(emprestar, usuarios))
+    vazao = leitores / (time.perf_counter() - inicio)
+    print(f"{leitores} pedidos, {threads} threads: {vazao:.0f} pedidos/s")
+
+    db = Session()
+    try:
+        restante = db.execute(text("SELECT Quantidade_disponivel FROM Livros WHERE ID_livro = :id"),
+                             {"id": livro_id}).scalar()
+        emprestimos = db.execute(text("SELECT Usuario_id FROM Emprestimos WHERE Livro_id = :id"),
+                                 {"id": livro_id}).scalars().all()
+    finally:
+        db.close()
+
+    assert status == [302] * leitores
+    assert len(emprestimos) == estoque
+    assert len(set(emprestimos)) == estoque
+    assert restante == 0
+    assert vazao >= vazao_minima